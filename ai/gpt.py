@@ -1,16 +1,78 @@
 from __future__ import annotations
 
 import re
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-from ai.prompt import build_system_prompt
+from ai.prompt import build_chat_messages, build_summary_request
+from ai.request_policy import RequestPolicy
+from ai.sentences import SentenceChunker
+from ai.sync_bridge import run_sync
+
+
+@dataclass
+class PromptCacheStats:
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def observe(self, usage: Any) -> None:
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.calls += 1
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.cached_tokens += (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+
+async def _close_stream(stream: Any) -> None:
+    close = getattr(stream, "close", None)
+    if close is not None:
+        await close()
 
 
 class GPTResponder:
-    def __init__(self, api_key: str, model: str) -> None:
-        self._client = OpenAI(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        base_url: str | None = None,
+        policy: RequestPolicy | None = None,
+    ) -> None:
+        # Retries and hedging are the policy's job.
+        self._async_client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
         self._model = model
+        self.policy = policy or RequestPolicy("gpt", timeout=20.0)
+        self.prompt_cache = PromptCacheStats()
+
+    def _request_kwargs(
+        self,
+        user_name: str,
+        transcript: str,
+        history_lines: list[str],
+        character_prompt: str,
+        permanent_memory_text: str | None,
+        history_summary: str | None = None,
+    ) -> dict[str, Any]:
+        return {
+            "model": self._model,
+            "messages": build_chat_messages(
+                character_prompt=character_prompt,
+                memory_text=permanent_memory_text,
+                history_lines=history_lines,
+                user_name=user_name,
+                transcript=transcript,
+                history_summary=history_summary,
+            ),
+            "temperature": 0.7,
+            "max_tokens": 200,
+        }
 
     def generate_reply(
         self,
@@ -19,22 +81,85 @@ class GPTResponder:
         history_lines: list[str],
         character_prompt: str,
         permanent_memory_text: str | None,
+        history_summary: str | None = None,
     ) -> str:
-        system_prompt = build_system_prompt(character_prompt, permanent_memory_text, history_lines)
-        message = f"{user_name}: {transcript}"
+        return run_sync(
+            self.generate_reply_async(
+                user_name, transcript, history_lines, character_prompt, permanent_memory_text, history_summary
+            )
+        )
 
-        response = self._client.chat.completions.create(
-            model=self._model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message},
-            ],
-            temperature=0.7,
-            max_tokens=200,
+    async def generate_reply_async(
+        self,
+        user_name: str,
+        transcript: str,
+        history_lines: list[str],
+        character_prompt: str,
+        permanent_memory_text: str | None,
+        history_summary: str | None = None,
+    ) -> str:
+        kwargs = self._request_kwargs(
+            user_name, transcript, history_lines, character_prompt, permanent_memory_text, history_summary
         )
+        response = await self.policy.run(
+            lambda timeout: self._async_client.chat.completions.create(**kwargs, timeout=timeout)
+        )
+        self.prompt_cache.observe(getattr(response, "usage", None))
         text = response.choices[0].message.content or ""
         return self._sanitize_reply(text.strip())
 
+    async def stream_reply_async(
+        self,
+        user_name: str,
+        transcript: str,
+        history_lines: list[str],
+        character_prompt: str,
+        permanent_memory_text: str | None,
+        history_summary: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Yield the reply sentence by sentence while tokens are still streaming."""
+        kwargs = self._request_kwargs(
+            user_name, transcript, history_lines, character_prompt, permanent_memory_text, history_summary
+        )
+        # Only the wait for the first response is hedged; the winning stream is read to the end.
+        stream = await self.policy.run(
+            lambda timeout: self._async_client.chat.completions.create(
+                **kwargs, stream=True, stream_options={"include_usage": True}, timeout=timeout
+            ),
+            discard=_close_stream,
+        )
+        chunker = SentenceChunker()
+        first = True
+        async for chunk in stream:
+            if not chunk.choices:
+                # With include_usage the last chunk carries token usage and no choices.
+                self.prompt_cache.observe(getattr(chunk, "usage", None))
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            for sentence in chunker.feed(delta):
+                if first:
+                    sentence = self._sanitize_reply(sentence)
+                    if not sentence:
+                        continue
+                    first = False
+                yield sentence
+        rest = chunker.flush()
+        if first:
+            rest = self._sanitize_reply(rest)
+        if rest:
+            yield rest
+
+    async def summarize_history_async(self, previous_summary: str | None, history_lines: list[str]) -> str:
+        """Fold older history lines into the rolling summary. Runs off the reply path."""
+        response = await self._async_client.chat.completions.create(
+            model=self._model,
+            messages=build_summary_request(previous_summary, history_lines),
+            temperature=0.2,
+            max_tokens=400,
+            timeout=30,
+        )
+        return (response.choices[0].message.content or "").strip()
+
     @staticmethod
     def _sanitize_reply(text: str) -> str:
         cleaned = text.strip()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable
+
+from ai.prompt import history_message
+
+# Per-message framing the chat format adds on top of the content.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate: kana/kanji are ~1 token each, other text ~4 characters per token."""
+    wide = sum(1 for ch in text if ord(ch) >= 0x3000)
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def line_tokens(line: str) -> int:
+    message = history_message(line)
+    return 0 if message is None else estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _fit(costs: list[int], budget: int) -> int:
+    """Index of the oldest entry in the newest run of ``costs`` that fits ``budget`` (at least one)."""
+    used = 0
+    start = len(costs)
+    for index in range(len(costs) - 1, -1, -1):
+        if used + costs[index] > budget and start < len(costs):
+            break
+        used += costs[index]
+        start = index
+    return start
+
+
+class HistoryBudget:
+    """Keeps the history part of one conversation's prompt under ``budget_tokens``.
+
+    Lines not yet summarized are sent verbatim. Once the ones that would not fit next to
+    ``fold_batch_tokens`` of headroom add up to a full batch, they are folded into a
+    rolling summary by ``summarize(previous_summary, lines)`` in a background task, so
+    the reply never waits for it and the summarizer runs once per batch, not per turn.
+    Until a fold finishes the previous summary is used.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str | None, list[str]], Awaitable[str]],
+        *,
+        budget_tokens: int = 1200,
+        fold_batch_tokens: int | None = None,
+    ) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._summarize = summarize
+        self._budget_tokens = budget_tokens
+        self._batch_tokens = fold_batch_tokens if fold_batch_tokens is not None else budget_tokens // 4
+        self._task: asyncio.Task[None] | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the summary, e.g. after the history it was built from was deleted."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.summary: str | None = None
+        # Position of the last line folded into the summary. Positions count every line ever
+        # seen, so they survive the fetched window sliding and repeated identical lines.
+        self._folded_through = -1
+        # The previous window and the position of its first line, to place the next window.
+        self._window: list[str] = []
+        self._window_start = 0
+
+    def select(self, lines: list[str]) -> tuple[str | None, list[str]]:
+        """Return the current summary and the newest unsummarized lines that fit the budget with it."""
+        start = self._place_window(lines)
+        self._window, self._window_start = list(lines), start
+        skip = min(len(lines), max(0, self._folded_through + 1 - start))
+        unfolded = lines[skip:]
+        costs = [line_tokens(line) for line in unfolded]
+        budget = self._budget_tokens - (estimate_tokens(self.summary) if self.summary else 0)
+        kept = _fit(costs, budget - self._batch_tokens)
+        if kept and sum(costs[:kept]) >= self._batch_tokens:
+            self._schedule_fold(unfolded[:kept], start + skip + kept - 1)
+        return self.summary, unfolded[_fit(costs, budget) :]
+
+    def _place_window(self, lines: list[str]) -> int:
+        # History only grows at the end, so the new window starts where the longest suffix
+        # of the previous one lines up with its head.
+        previous = self._window
+        for shift in range(len(previous)):
+            overlap = previous[shift:]
+            if lines[: len(overlap)] == overlap:
+                return self._window_start + shift
+        return self._window_start + len(previous)
+
+    def _schedule_fold(self, lines: list[str], through: int) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._fold(lines, through))
+
+    async def _fold(self, lines: list[str], through: int) -> None:
+        try:
+            text = (await self._summarize(self.summary, lines)).strip()
+        except Exception as exc:
+            self._logger.warning("History summarization failed (%s lines): %s", len(lines), exc)
+            return
+        if text:
+            self.summary = text
+            self._folded_through = through
+            self._logger.debug("Folded %s history lines into the summary", len(lines))
+
+    async def wait_idle(self) -> None:
+        if self._task is not None and not self._task.done():
+            await asyncio.gather(self._task, return_exceptions=True)
@@ -1,6 +1,22 @@
 from __future__ import annotations
 
-from typing import Iterable
+import re
+from functools import lru_cache
+from typing import Any, Iterable
+
+# Speaker name VoiceHandler uses for the bot's own lines in the history channel.
+BOT_SPEAKER = "Bot"
+
+RULES_BLOCK = (
+    "## 応答ルール\n"
+    "- Discord VCで会話しているため、簡潔かつ自然に返答する\n"
+    "- 不明点は断定せず確認する\n"
+    "- 日本語で返答する\n"
+    "- 返答の先頭に「名前:」の形式を付けない"
+)
+
+# "[2024-01-01 12:00:00] name: text"; history lines may wrap one such line in another.
+_HISTORY_LINE = re.compile(r"^\[[^\]]*\]\s*([^:\n]+?):\s*(.*)$", re.S)
 
 
 def build_permanent_memory_block(memory_text: str | None) -> str:
@@ -16,16 +32,87 @@ def build_history_block(history_lines: Iterable[str]) -> str:
     return "## 会話履歴\n" + "\n".join(f"- {row}" for row in rows)
 
 
+def build_character_block(character_prompt: str) -> str:
+    return f"## キャラクター設定\n{character_prompt.strip()}"
+
+
+@lru_cache(maxsize=32)
+def build_stable_system_prompt(character_prompt: str, memory_text: str | None) -> str:
+    """System prompt ordered from most to least stable, so edits invalidate as little prefix as possible.
+
+    Memoized by its inputs: a character or memory edit is a new version; anything else is a hit.
+    """
+    segments = [RULES_BLOCK, build_character_block(character_prompt), build_permanent_memory_block(memory_text)]
+    return "\n\n".join(segment.strip() for segment in segments if segment)
+
+
 def build_system_prompt(character_prompt: str, memory_text: str | None, history_lines: Iterable[str]) -> str:
-    permanent_memory = build_permanent_memory_block(memory_text)
-    return (
-        f"{permanent_memory}\n"
-        "## キャラクター設定\n"
-        f"{character_prompt.strip()}\n\n"
-        "## 応答ルール\n"
-        "- Discord VCで会話しているため、簡潔かつ自然に返答する\n"
-        "- 不明点は断定せず確認する\n"
-        "- 日本語で返答する\n\n"
-        "- 返答の先頭に「名前:」の形式を付けない\n\n"
-        f"{build_history_block(history_lines)}"
-    ).strip()
+    return f"{build_stable_system_prompt(character_prompt, memory_text)}\n\n{build_history_block(history_lines)}"
+
+
+@lru_cache(maxsize=512)
+def history_message(line: str) -> dict[str, str] | None:
+    speaker, text = "", line.strip()
+    while match := _HISTORY_LINE.match(text):
+        speaker, text = match.group(1).strip(), match.group(2).strip()
+    if not text:
+        return None
+    if speaker == BOT_SPEAKER:
+        return {"role": "assistant", "content": text}
+    return {"role": "user", "content": f"{speaker}: {text}" if speaker else text}
+
+
+def build_summary_block(summary: str) -> str:
+    return f"## これまでの会話の要約\n{summary.strip()}"
+
+
+def build_chat_messages(
+    *,
+    character_prompt: str,
+    memory_text: str | None,
+    history_lines: Iterable[str],
+    user_name: str,
+    transcript: str,
+    history_summary: str | None = None,
+) -> list[dict[str, Any]]:
+    """System prompt, then the rolling summary, history as individual turns and the new utterance.
+
+    The system prompt is the only part guaranteed to repeat across turns. History turns
+    only extend the previous request while the window they come from grows: with a
+    HistoryBudget that holds between folds, but a plain sliding window changes the
+    prefix right after the system prompt every turn once it is full.
+    """
+    current = {"role": "user", "content": f"{user_name}: {transcript}"}
+    history = [m for m in map(history_message, history_lines) if m is not None]
+    if history and history[-1] == current:
+        # VoiceHandler logs the utterance to the history channel before fetching it.
+        history.pop()
+    messages: list[dict[str, Any]] = [
+        {"role": "system", "content": build_stable_system_prompt(character_prompt, memory_text)}
+    ]
+    if history_summary:
+        # Its own message, so a new summary leaves the stable system prompt cacheable.
+        messages.append({"role": "system", "content": build_summary_block(history_summary)})
+    messages.extend(dict(m) for m in history)
+    messages.append(current)
+    return messages
+
+
+def build_summary_request(previous_summary: str | None, history_lines: Iterable[str]) -> list[dict[str, str]]:
+    rows = [m for m in map(history_message, history_lines) if m is not None]
+    transcript = "\n".join(
+        f"{BOT_SPEAKER}: {m['content']}" if m["role"] == "assistant" else m["content"] for m in rows
+    )
+    previous = previous_summary.strip() if previous_summary else "（なし）"
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Discord VCの会話ログを、後で会話を続けるための要約に更新する。\n"
+                "- 既存の要約に新しいログの内容を統合する\n"
+                "- 誰が何を話したか、決まったこと、話題の流れを残す\n"
+                "- 日本語の箇条書きで、300文字以内にまとめる"
+            ),
+        },
+        {"role": "user", "content": f"## 既存の要約\n{previous}\n\n## 新しいログ\n{transcript}"},
+    ]
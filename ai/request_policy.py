@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterator, TypeVar
+
+import openai
+
+from perf.histogram import RollingHistogram
+
+T = TypeVar("T")
+
+# Monotonic time by which the current voice turn should have produced its reply.
+_turn_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("turn_deadline", default=None)
+
+
+@contextmanager
+def turn_deadline(expires_at: float) -> Iterator[None]:
+    """Scope every policy-wrapped call inside the block to one end-to-end turn budget."""
+    token = _turn_deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _turn_deadline.reset(token)
+
+
+def remaining_budget() -> float | None:
+    expires_at = _turn_deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def is_retryable_openai_error(exc: BaseException) -> bool:
+    # APITimeoutError is an APIConnectionError.
+    return isinstance(
+        exc,
+        (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError, asyncio.TimeoutError),
+    )
+
+
+@dataclass
+class PolicyStats:
+    calls: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    retries: int = 0
+    budget_exhausted: int = 0
+    # Estimated against the p99 the slow primary was heading for.
+    saved_seconds: float = 0.0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedges / self.calls if self.calls else 0.0
+
+
+class RequestPolicy:
+    """Hedged, retried and deadline-aware execution of one kind of API call.
+
+    ``fn(timeout)`` issues a single attempt. Once ``min_samples`` latencies are known, an
+    attempt still running after the ``hedge_percentile`` latency gets a duplicate; the
+    first success wins and the other is cancelled. Failed attempts are retried up to
+    ``retries`` times with jittered exponential backoff. The turn budget (see
+    :func:`turn_deadline`) caps attempt timeouts and suppresses retries and hedges once
+    spent, but never drops the first attempt.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        timeout: float = 10.0,
+        min_timeout: float = 2.0,
+        retries: int = 2,
+        backoff_seconds: float = 0.25,
+        hedge_percentile: float = 95.0,
+        min_hedge_delay: float = 0.3,
+        min_samples: int = 20,
+        hedge: bool = True,
+        retryable: Callable[[BaseException], bool] = is_retryable_openai_error,
+    ) -> None:
+        self._logger = logging.getLogger(__name__)
+        self.name = name
+        self._timeout = timeout
+        self._min_timeout = min_timeout
+        self._retries = retries
+        self._backoff_seconds = backoff_seconds
+        self._hedge_percentile = hedge_percentile
+        self._min_hedge_delay = min_hedge_delay
+        self._min_samples = min_samples
+        self._hedge = hedge
+        self._retryable = retryable
+        self._latency = RollingHistogram()
+        self.stats = PolicyStats()
+
+    def hedge_delay(self) -> float | None:
+        if not self._hedge or self._latency.count < self._min_samples:
+            return None
+        return max(self._min_hedge_delay, self._latency.percentile(self._hedge_percentile))
+
+    def _attempt_timeout(self) -> float:
+        remaining = remaining_budget()
+        if remaining is None:
+            return self._timeout
+        return min(self._timeout, max(self._min_timeout, remaining))
+
+    async def run(
+        self,
+        fn: Callable[[float], Awaitable[T]],
+        *,
+        discard: Callable[[T], Awaitable[object]] | None = None,
+    ) -> T:
+        """Run ``fn`` under the policy. ``discard`` releases a result that lost a hedge race."""
+        self.stats.calls += 1
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged(fn, self._attempt_timeout(), discard)
+            except Exception as exc:
+                if attempt >= self._retries or not self._retryable(exc):
+                    raise
+                attempt += 1
+                pause = self._backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                remaining = remaining_budget()
+                if remaining is not None and remaining - pause < self._min_timeout:
+                    self.stats.budget_exhausted += 1
+                    raise
+                self.stats.retries += 1
+                self._logger.info("%s attempt failed (%s); retry %s in %.2fs", self.name, exc, attempt, pause)
+                await asyncio.sleep(pause)
+
+    async def _hedged(
+        self,
+        fn: Callable[[float], Awaitable[T]],
+        timeout: float,
+        discard: Callable[[T], Awaitable[object]] | None,
+    ) -> T:
+        started = time.monotonic()
+        primary = asyncio.ensure_future(fn(timeout))
+        attempts = [primary]
+        winner: asyncio.Future[T] | None = None
+        try:
+            delay = self.hedge_delay()
+            remaining = remaining_budget()
+            if delay is not None and delay < timeout and (remaining is None or remaining > delay + self._min_timeout):
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    self.stats.hedges += 1
+                    attempts.append(asyncio.ensure_future(fn(timeout - delay)))
+            pending = set(attempts)
+            error: BaseException | None = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, started + timeout - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError(f"{self.name} timed out after {timeout:.1f}s")
+                for task in attempts:
+                    if task in done and task.exception() is None:
+                        winner = task
+                        break
+                    if task in done:
+                        error = error or task.exception()
+            if winner is None:
+                assert error is not None
+                raise error
+            elapsed = time.monotonic() - started
+            self._latency.add(elapsed)
+            if winner is not primary:
+                self.stats.hedge_wins += 1
+                self.stats.saved_seconds += max(0.0, self._latency.percentile(99) - elapsed)
+            return winner.result()
+        finally:
+            for task in attempts:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None and discard is not None:
+                    # Both attempts finished together: release the loser (e.g. close its stream).
+                    await discard(task.result())
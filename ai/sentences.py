@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+SENTENCE_ENDINGS = "。！？!?\n"
+# Closing brackets/quotes that belong to the sentence that just ended.
+TRAILING_CLOSERS = "」』）)\"'”"
+
+
+class SentenceChunker:
+    """Accumulate streamed text and cut it at Japanese sentence boundaries."""
+
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        self._buffer += text
+        sentences: list[str] = []
+        start = 0
+        i = 0
+        length = len(self._buffer)
+        while i < length:
+            if self._buffer[i] in SENTENCE_ENDINGS:
+                end = i + 1
+                while end < length and self._buffer[end] in SENTENCE_ENDINGS + TRAILING_CLOSERS:
+                    end += 1
+                if end == length:
+                    # A following "！" or "」" may still arrive in the next token.
+                    break
+                sentence = self._buffer[start:end].strip()
+                if sentence:
+                    sentences.append(sentence)
+                start = end
+                i = end
+                continue
+            i += 1
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return rest
+
+
+def split_sentences(text: str) -> list[str]:
+    chunker = SentenceChunker()
+    sentences = chunker.feed(text)
+    rest = chunker.flush()
+    if rest:
+        sentences.append(rest)
+    return sentences
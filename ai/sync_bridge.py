@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+_local = threading.local()
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run ``coro`` to completion for a synchronous caller.
+
+    Calls from one thread share a loop, so async clients that pool connections per loop
+    keep them from one call to the next instead of leaving them on a closed loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError("synchronous API called from a running event loop; await the *_async method instead")
+    runner = getattr(_local, "runner", None)
+    if runner is None:
+        runner = _local.runner = asyncio.Runner()
+    return runner.run(coro)
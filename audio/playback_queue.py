@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable
+
+import discord
+
+from audio.player import VoicePlayer
+
+
+class QueuedReply:
+    """The clips of one reply. They share a single queue slot, so backlog limits and
+    expiry apply to the whole reply and never cut sentences out of the middle of it."""
+
+    def __init__(self, queue: PlaybackQueue) -> None:
+        self._queue = queue
+        self.clips: list[bytes] = []
+        self.enqueued_at = 0.0
+        self.closed = False
+        self.discarded = False
+        self.updated = asyncio.Event()
+
+    def add(self, wav: bytes) -> None:
+        if not wav or self.closed or self.discarded:
+            return
+        if not self.clips:
+            # The reply takes its queue slot (and starts ageing) with its first clip.
+            self.enqueued_at = time.monotonic()
+            self._queue._put(self)
+        self.clips.append(wav)
+        self.updated.set()
+
+    def close(self) -> None:
+        """No more clips will follow."""
+        self.closed = True
+        self.updated.set()
+
+    def discard(self) -> None:
+        self.discarded = True
+        self.updated.set()
+
+
+class PlaybackQueue:
+    """Play synthesized clips for one guild back to back instead of dropping them."""
+
+    def __init__(
+        self,
+        player: VoicePlayer,
+        voice_client: Callable[[], discord.VoiceClient | None],
+        *,
+        max_backlog: int = 8,
+        max_age_seconds: float = 30.0,
+        on_playback_start: Callable[[float], None] | None = None,
+    ) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._player = player
+        self._voice_client = voice_client
+        self._max_backlog = max(1, max_backlog)
+        self._max_age_seconds = max_age_seconds
+        self._on_playback_start = on_playback_start
+        self._replies: asyncio.Queue[QueuedReply] = asyncio.Queue()
+        self._current: QueuedReply | None = None
+        self._worker: asyncio.Task[None] | None = None
+        self.played = 0
+        self.dropped = 0
+        self.expired = 0
+
+    @property
+    def depth(self) -> int:
+        return self._replies.qsize()
+
+    def open_reply(self) -> QueuedReply:
+        """Start a reply whose clips arrive one by one; ``close`` it once the last clip is added."""
+        return QueuedReply(self)
+
+    def enqueue(self, wav: bytes) -> None:
+        reply = self.open_reply()
+        reply.add(wav)
+        reply.close()
+
+    def _put(self, reply: QueuedReply) -> None:
+        if self._replies.qsize() >= self._max_backlog:
+            self._discard_next()
+            self.dropped += 1
+            self._logger.warning("Playback backlog full; dropped oldest reply (max=%s)", self._max_backlog)
+        self._replies.put_nowait(reply)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._play_loop())
+
+    def clear(self) -> int:
+        """Discard every queued reply and the rest of the one playing now."""
+        cleared = 0
+        if self._current is not None:
+            self._current.discard()
+        while not self._replies.empty():
+            self._discard_next()
+            cleared += 1
+        return cleared
+
+    async def drain(self) -> None:
+        await self._replies.join()
+
+    async def close(self) -> None:
+        self.clear()
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def _discard_next(self) -> None:
+        self._replies.get_nowait().discard()
+        self._replies.task_done()
+
+    async def _play_loop(self) -> None:
+        while True:
+            reply = await self._replies.get()
+            self._current = reply
+            try:
+                await self._play_reply(reply)
+            except Exception as exc:
+                self._logger.exception("Failed to play queued reply: %s", exc)
+            finally:
+                self._current = None
+                self._replies.task_done()
+
+    async def _play_reply(self, reply: QueuedReply) -> None:
+        age = time.monotonic() - reply.enqueued_at
+        if age > self._max_age_seconds:
+            reply.discard()
+            self.expired += 1
+            self._logger.info("Queued reply expired after %.1fs; skipped", age)
+            return
+        if self._on_playback_start:
+            self._on_playback_start(age)
+        played = 0
+        while not reply.discarded:
+            if played == len(reply.clips):
+                if reply.closed:
+                    return
+                reply.updated.clear()
+                await reply.updated.wait()
+                continue
+            wav = reply.clips[played]
+            played += 1
+            voice_client = self._voice_client()
+            if voice_client is None:
+                self.dropped += 1
+                continue
+            await self._player.play_wav_bytes_async(voice_client, wav)
+            self.played += 1
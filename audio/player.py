@@ -1,20 +1,81 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import tempfile
+import wave
 from pathlib import Path
+from typing import Callable
 
 import discord
 
+from audio.wav import wav_to_pcm48k_stereo
+
+
+class MemoryPCMSource(discord.AudioSource):
+    """Serves 48 kHz stereo s16le from memory in 20 ms frames; the last frame is zero padded."""
+
+    def __init__(self, pcm48_stereo: bytes) -> None:
+        self._pcm = memoryview(pcm48_stereo)
+        self._offset = 0
+
+    def read(self) -> bytes:
+        frame = self._pcm[self._offset : self._offset + discord.opus.Encoder.FRAME_SIZE]
+        if not frame:
+            return b""
+        self._offset += len(frame)
+        if len(frame) < discord.opus.Encoder.FRAME_SIZE:
+            return bytes(frame) + bytes(discord.opus.Encoder.FRAME_SIZE - len(frame))
+        return bytes(frame)
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self) -> None:
+        self._pcm.release()
+
 
 class VoicePlayer:
-    """Small helper that plays WAV bytes via FFmpegPCMAudio."""
+    """Small helper that plays WAV bytes.
 
-    def __init__(self) -> None:
+    WAV is decoded and resampled in process; anything it cannot parse falls back to
+    FFmpegPCMAudio over a temp file.
+    """
+
+    def __init__(self, *, in_process: bool = True) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._in_process = in_process
         self._temp_files: list[Path] = []
 
-    def play_wav_bytes(self, voice_client: discord.VoiceClient, wav_data: bytes) -> None:
+    def play_wav_bytes(
+        self,
+        voice_client: discord.VoiceClient,
+        wav_data: bytes,
+        after: Callable[[Exception | None], None] | None = None,
+    ) -> None:
         if not wav_data:
             return
+        pcm = self._decode(wav_data)
+        if pcm is not None:
+            voice_client.play(MemoryPCMSource(pcm), after=after)
+            return
+        self._play_with_ffmpeg(voice_client, wav_data, after)
+
+    def _decode(self, wav_data: bytes) -> bytes | None:
+        if not self._in_process:
+            return None
+        try:
+            return wav_to_pcm48k_stereo(wav_data)
+        except (wave.Error, ValueError, EOFError) as exc:
+            self._logger.warning("In-process WAV decode failed, using ffmpeg: %s", exc)
+            return None
+
+    def _play_with_ffmpeg(
+        self,
+        voice_client: discord.VoiceClient,
+        wav_data: bytes,
+        after: Callable[[Exception | None], None] | None,
+    ) -> None:
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
         temp_file.write(wav_data)
         temp_file.flush()
@@ -22,12 +83,41 @@ class VoicePlayer:
         temp_file.close()
         self._temp_files.append(temp_path)
 
-        def _after_playback(_: Exception | None) -> None:
+        def _after_playback(error: Exception | None) -> None:
             try:
                 temp_path.unlink(missing_ok=True)
             finally:
                 if temp_path in self._temp_files:
                     self._temp_files.remove(temp_path)
+                if after is not None:
+                    after(error)
 
         source = discord.FFmpegPCMAudio(str(temp_path))
         voice_client.play(source, after=_after_playback)
+
+    async def play_wav_bytes_async(self, voice_client: discord.VoiceClient, wav_data: bytes) -> None:
+        """Play WAV bytes and wait until playback has finished."""
+        if not wav_data:
+            return
+        loop = asyncio.get_running_loop()
+        done: asyncio.Future[None] = loop.create_future()
+
+        def _after(error: Exception | None) -> None:
+            # discord.py invokes the callback from its audio thread.
+            loop.call_soon_threadsafe(_resolve, error)
+
+        def _resolve(error: Exception | None) -> None:
+            if done.done():
+                return
+            if error is not None:
+                done.set_exception(error)
+            else:
+                done.set_result(None)
+
+        # Resample off the event loop, then start playback from memory.
+        pcm = await asyncio.to_thread(self._decode, wav_data)
+        if pcm is not None:
+            voice_client.play(MemoryPCMSource(pcm), after=_after)
+        else:
+            self._play_with_ffmpeg(voice_client, wav_data, _after)
+        await done
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Protocol
+
+import numpy as np
+
+from ai.request_policy import RequestPolicy
+from audio.whisper import WhisperTranscriber
+
+try:
+    import faster_whisper
+except ImportError:  # optional: in-process transcription
+    faster_whisper = None
+
+STT_BACKENDS = ("openai", "local")
+
+
+class TranscriptionBackend(Protocol):
+    """What VoiceHandler needs from a speech-to-text engine (Japanese, 16 kHz mono input)."""
+
+    name: str
+
+    async def transcribe_ja_async(self, wav_bytes: bytes) -> str: ...
+
+    async def transcribe_pcm16_ja_async(self, pcm16_mono: bytes) -> str: ...
+
+
+class LocalWhisperTranscriber:
+    """Runs a CTranslate2 Whisper model (faster-whisper) in process on a small worker pool.
+
+    The model is loaded on first use. ``workers`` transcriptions run at once; each
+    call is CPU bound, so keep ``workers * cpu_threads`` at or below the core count.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model: str = "small",
+        *,
+        device: str = "cpu",
+        compute_type: str = "int8",
+        workers: int = 2,
+        cpu_threads: int = 0,
+        beam_size: int = 1,
+        model_factory: Callable[[], Any] | None = None,
+    ) -> None:
+        if model_factory is None and faster_whisper is None:
+            raise RuntimeError("faster-whisper is not installed (pip install faster-whisper)")
+        self._logger = logging.getLogger(__name__)
+        self._model_name = model
+        self._device = device
+        self._compute_type = compute_type
+        self._workers = max(1, workers)
+        self._cpu_threads = cpu_threads
+        self._beam_size = beam_size
+        self._model_factory = model_factory or self._load_model
+        self._model: Any = None
+        self._model_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="stt")
+
+    def _load_model(self) -> Any:
+        assert faster_whisper is not None
+        return faster_whisper.WhisperModel(
+            self._model_name,
+            device=self._device,
+            compute_type=self._compute_type,
+            cpu_threads=self._cpu_threads,
+            num_workers=self._workers,
+        )
+
+    def _get_model(self) -> Any:
+        with self._model_lock:
+            if self._model is None:
+                self._model = self._model_factory()
+            return self._model
+
+    def _transcribe(self, pcm16_mono: bytes) -> str:
+        samples = np.frombuffer(pcm16_mono, dtype="<i2", count=len(pcm16_mono) // 2).astype(np.float32) / 32768.0
+        segments, _info = self._get_model().transcribe(
+            samples,
+            language="ja",
+            beam_size=self._beam_size,
+            condition_on_previous_text=False,
+        )
+        # Segments are a lazy generator; decoding happens while iterating.
+        return "".join(segment.text for segment in segments).strip()
+
+    async def transcribe_pcm16_ja_async(self, pcm16_mono: bytes) -> str:
+        if not pcm16_mono:
+            return ""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._transcribe, bytes(pcm16_mono))
+
+    async def transcribe_ja_async(self, wav_bytes: bytes) -> str:
+        if not wav_bytes:
+            return ""
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+            if (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()) != (1, 2, 16000):
+                raise ValueError("local transcription expects 16 kHz mono 16-bit WAV")
+            pcm = wf.readframes(wf.getnframes())
+        return await self.transcribe_pcm16_ja_async(pcm)
+
+    async def warm_up(self) -> None:
+        """Load the model off the event loop so the first utterance does not pay for it."""
+        await asyncio.get_running_loop().run_in_executor(self._pool, self._get_model)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_transcriber(
+    backend: str,
+    *,
+    api_key: str,
+    base_url: str | None = None,
+    upload_format: str = "auto",
+    local_model: str = "small",
+    local_compute_type: str = "int8",
+    local_workers: int = 2,
+    policy: RequestPolicy | None = None,
+) -> TranscriptionBackend:
+    if backend == "local":
+        return LocalWhisperTranscriber(local_model, compute_type=local_compute_type, workers=local_workers)
+    if backend == "openai":
+        return WhisperTranscriber(api_key, base_url=base_url, upload_format=upload_format, policy=policy)
+    raise ValueError(f"unknown STT backend: {backend}")
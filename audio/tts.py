@@ -1,26 +1,245 @@
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Sequence
+
 import httpx
 
+from ai.sentences import split_sentences
+from ai.sync_bridge import run_sync
+from audio.tts_cache import TTSCache, cache_key, normalize_text
+from audio.voicevox_pool import VoiceVoxBackend, VoiceVoxPool
+from audio.wav import concat_wavs
+
+# Request lifecycle events reported by httpcore's "trace" extension.
+_NEW_CONNECTION_EVENT = "connection.connect_tcp.complete"
+_REQUEST_EVENTS = ("http11.send_request_headers.started", "http2.send_request_headers.started")
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    new_connections: int = 0
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.new_connections)
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+    def observe(self, event_name: str) -> None:
+        if event_name == _NEW_CONNECTION_EVENT:
+            self.new_connections += 1
+        elif event_name in _REQUEST_EVENTS:
+            self.requests += 1
+
 
 class VoiceVoxTTS:
-    def __init__(self, base_url: str, speaker_id: int) -> None:
-        self._base_url = base_url.rstrip("/")
+    """VOICEVOX client that keeps one pooled, keep-alive HTTP client for its lifetime; call ``aclose`` on shutdown.
+
+    ``base_url`` may list several engines; requests then go to the least-loaded healthy one.
+    Multi-sentence text is synthesized per sentence, up to ``sentence_fanout`` at a time.
+    """
+
+    def __init__(
+        self,
+        base_url: str | Sequence[str],
+        speaker_id: int,
+        *,
+        output_48k_stereo: bool = False,
+        max_connections: int = 10,
+        keepalive_seconds: float = 30.0,
+        timeout: float = 20.0,
+        cache: TTSCache | None = None,
+        health_interval: float = 15.0,
+        sentence_fanout: int = 1,
+        sentence_gap_seconds: float = 0.1,
+    ) -> None:
+        self._logger = logging.getLogger(__name__)
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.pool = VoiceVoxPool(urls, health_interval=health_interval)
         self._speaker_id = speaker_id
+        # Ask VOICEVOX for Discord's native format so playback needs no resampling.
+        self._output_48k_stereo = output_48k_stereo
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self._timeout = timeout
+        # HTTP/2 needs the optional h2 package; only negotiated on https:// engines.
+        self._http2 = importlib.util.find_spec("h2") is not None
+        self._async_client: httpx.AsyncClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+        self.stats = ConnectionStats()
+        self.cache = cache
+        self._engine_version: str | None = None
+        self._sentence_fanout = max(1, sentence_fanout)
+        self._sentence_gap_seconds = sentence_gap_seconds
+
+    def _synthesis_query(self, query: dict) -> dict:
+        if self._output_48k_stereo:
+            query["outputSamplingRate"] = 48000
+            query["outputStereo"] = True
+        return query
+
+    def _pooled_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # Pooled connections belong to the loop that opened them.
+        if self._async_client is None or self._async_client.is_closed or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits, http2=self._http2)
+            self._async_loop = loop
+        return self._async_client
+
+    @property
+    def backends(self) -> list[VoiceVoxBackend]:
+        return self.pool.backends
+
+    async def _trace(self, event_name: str, info: dict[str, Any]) -> None:
+        self.stats.observe(event_name)
 
     def synthesize(self, text: str) -> bytes:
+        return run_sync(self.synthesize_async(text))
+
+    async def synthesize_async(self, text: str) -> bytes:
         if not text.strip():
             return b""
-        with httpx.Client(timeout=20.0) as client:
-            query_res = client.post(
-                f"{self._base_url}/audio_query",
-                params={"text": text, "speaker": self._speaker_id},
-            )
-            query_res.raise_for_status()
-            synthesis_res = client.post(
-                f"{self._base_url}/synthesis",
-                params={"speaker": self._speaker_id},
-                json=query_res.json(),
+        sentences = self._split(text)
+        if len(sentences) <= 1:
+            return await self._synthesize_one(text)
+        clips = [clip async for clip in self._synthesize_each(sentences)]
+        return await asyncio.to_thread(concat_wavs, clips, gap_seconds=self._sentence_gap_seconds)
+
+    async def synthesize_sentences(self, text: str) -> AsyncIterator[bytes]:
+        """Yield one clip per sentence in order, as soon as each is ready.
+
+        Clips after the first lead with the inter-sentence gap, so playing them back to
+        back sounds like :meth:`synthesize_async`.
+        """
+        sentences = self._split(text) if text.strip() else []
+        index = 0
+        async for clip in self._synthesize_each(sentences):
+            if index and self._sentence_gap_seconds > 0:
+                clip = await asyncio.to_thread(concat_wavs, [clip], lead_seconds=self._sentence_gap_seconds)
+            index += 1
+            yield clip
+
+    def _split(self, text: str) -> list[str]:
+        if self._sentence_fanout <= 1:
+            return [text]
+        return split_sentences(text) or [text]
+
+    async def _synthesize_each(self, sentences: list[str]) -> AsyncIterator[bytes]:
+        semaphore = asyncio.Semaphore(self._sentence_fanout)
+
+        async def _one(sentence: str) -> bytes:
+            async with semaphore:
+                return await self._synthesize_one(sentence)
+
+        # Tasks are created in order, so the semaphore admits the earliest sentences first.
+        tasks = [asyncio.create_task(_one(sentence)) for sentence in sentences]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _synthesize_one(self, text: str) -> bytes:
+        if len(self.pool.backends) > 1:
+            self.pool.start_health_checks(self._pooled_client)
+        if self.cache is None:
+            # Keep the query and its synthesis on one engine.
+            return await self.pool.call(lambda url: self._query_and_synthesis(url, text))
+
+        # Only the key is normalized; VOICEVOX still reads the text exactly as written.
+        key_text = normalize_text(text)
+        engine = await self._engine()
+        query_key = cache_key(text=key_text, speaker=self._speaker_id, engine=engine)
+        wav_key = cache_key(text=key_text, speaker=self._speaker_id, engine=engine, params=self._synthesis_query({}))
+        wav = await asyncio.to_thread(self.cache.get, "wav", wav_key)
+        if wav is not None:
+            return wav
+        # A cached accent/mora query lets a partial hit skip straight to /synthesis.
+        cached_query = await asyncio.to_thread(self.cache.get, "query", query_key)
+        if cached_query is not None:
+            query = json.loads(cached_query)
+        else:
+            query = await self.pool.call(lambda url: self._audio_query(url, text))
+            await asyncio.to_thread(self.cache.put, "query", query_key, json.dumps(query, ensure_ascii=False).encode())
+        wav = await self.pool.call(lambda url: self._synthesis(url, query))
+        await asyncio.to_thread(self.cache.put, "wav", wav_key, wav)
+        return wav
+
+    async def _query_and_synthesis(self, base_url: str, text: str) -> bytes:
+        return await self._synthesis(base_url, await self._audio_query(base_url, text))
+
+    async def _audio_query(self, base_url: str, text: str) -> dict[str, Any]:
+        query_res = await self._pooled_client().post(
+            f"{base_url}/audio_query",
+            params={"text": text, "speaker": self._speaker_id},
+            extensions={"trace": self._trace},
+        )
+        query_res.raise_for_status()
+        return query_res.json()
+
+    async def _synthesis(self, base_url: str, query: dict[str, Any]) -> bytes:
+        synthesis_res = await self._pooled_client().post(
+            f"{base_url}/synthesis",
+            params={"speaker": self._speaker_id},
+            json=self._synthesis_query(query),
+            extensions={"trace": self._trace},
+        )
+        synthesis_res.raise_for_status()
+        return synthesis_res.content
+
+    async def _engine(self) -> str:
+        """Engine version for cache keys, so an engine upgrade never serves stale audio."""
+        if self._engine_version is None:
+            try:
+                self._engine_version = await self.pool.call(self._version)
+            except (httpx.HTTPError, ValueError) as exc:
+                self._logger.warning("VOICEVOX /version failed, cache keyed as unknown engine: %s", exc)
+                return "unknown"
+        return self._engine_version
+
+    async def warm_up(self, phrases: Sequence[str] = ()) -> None:
+        """Load the speaker model and run a throwaway synthesis on every engine, then prefill the cache."""
+
+        async def _backend(base_url: str) -> None:
+            res = await self._pooled_client().post(
+                f"{base_url}/initialize_speaker",
+                params={"speaker": self._speaker_id, "skip_reinit": "true"},
+                extensions={"trace": self._trace},
             )
-            synthesis_res.raise_for_status()
-            return synthesis_res.content
+            res.raise_for_status()
+            await self._query_and_synthesis(base_url, "あ")
+
+        results = await asyncio.gather(*(_backend(b.url) for b in self.pool.backends), return_exceptions=True)
+        for backend, result in zip(self.pool.backends, results):
+            if isinstance(result, Exception):
+                self._logger.warning("VOICEVOX warm-up failed for %s: %s", backend.url, result)
+        if self.cache is None:
+            return
+        for phrase in phrases:
+            try:
+                await self.synthesize_async(phrase)
+            except httpx.HTTPError as exc:
+                self._logger.warning("VOICEVOX cache prefill failed for %r: %s", phrase, exc)
+
+    async def _version(self, base_url: str) -> str:
+        res = await self._pooled_client().get(f"{base_url}/version", extensions={"trace": self._trace})
+        res.raise_for_status()
+        return str(res.json())
+
+    async def aclose(self) -> None:
+        await self.pool.stop_health_checks()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+def normalize_text(text: str) -> str:
+    """Cache-key form of a reply: NFKC, trimmed, inner whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(**parts: Any) -> str:
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.memory_hits + self.disk_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.memory_hits + self.disk_hits) / self.lookups if self.lookups else 0.0
+
+
+class TTSCache:
+    """Content-addressed store for VOICEVOX output: a byte-bounded memory LRU in front of a disk tier.
+
+    Entries are grouped by ``kind`` ("query" for /audio_query JSON, "wav" for audio) and
+    keyed by :func:`cache_key`. The disk tier evicts least-recently-used files once it
+    grows past ``disk_max_bytes``. Disk access is blocking; call from a worker thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        memory_max_bytes: int = 32 * 1024 * 1024,
+        disk_dir: str | Path | None = None,
+        disk_max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._memory: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_max_bytes = memory_max_bytes
+        self._disk_dir = Path(disk_dir) if disk_dir else None
+        self._disk_max_bytes = disk_max_bytes
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats: dict[str, CacheStats] = {}
+        if self._disk_dir:
+            self._disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self._disk_dir.glob("*/*") if p.is_file())
+
+    def get(self, kind: str, key: str) -> bytes | None:
+        stats = self._stats(kind)
+        with self._lock:
+            data = self._memory.get((kind, key))
+            if data is not None:
+                self._memory.move_to_end((kind, key))
+                stats.memory_hits += 1
+                return data
+        data = self._read_disk(kind, key)
+        if data is None:
+            with self._lock:
+                stats.misses += 1
+            return None
+        with self._lock:
+            stats.disk_hits += 1
+            self._remember(kind, key, data)
+        return data
+
+    def put(self, kind: str, key: str, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            self._remember(kind, key, data)
+        self._write_disk(kind, key, data)
+
+    def _stats(self, kind: str) -> CacheStats:
+        with self._lock:
+            return self.stats.setdefault(kind, CacheStats())
+
+    def _remember(self, kind: str, key: str, data: bytes) -> None:
+        # Caller holds self._lock.
+        if len(data) > self._memory_max_bytes:
+            return
+        old = self._memory.pop((kind, key), None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[(kind, key)] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self._memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _path(self, kind: str, key: str) -> Path:
+        assert self._disk_dir is not None
+        return self._disk_dir / kind / key
+
+    def _read_disk(self, kind: str, key: str) -> bytes | None:
+        if not self._disk_dir:
+            return None
+        path = self._path(kind, key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # mtime doubles as the LRU clock
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            self._logger.warning("TTS cache read failed (%s): %s", path, exc)
+            return None
+
+    def _write_disk(self, kind: str, key: str, data: bytes) -> None:
+        if not self._disk_dir or len(data) > self._disk_max_bytes:
+            return
+        path = self._path(kind, key)
+        tmp: Path | None = None
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # A unique temp name per writer, so concurrent puts of one key never share a file.
+            with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{key}.", suffix=".tmp", delete=False) as f:
+                tmp = Path(f.name)
+                f.write(data)
+            with self._lock:
+                try:
+                    replaced = path.stat().st_size
+                except FileNotFoundError:
+                    replaced = 0
+                os.replace(tmp, path)
+                tmp = None
+                self._disk_bytes += len(data) - replaced
+                over = self._disk_bytes > self._disk_max_bytes
+        except OSError as exc:
+            self._logger.warning("TTS cache write failed (%s): %s", path, exc)
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+            return
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        assert self._disk_dir is not None
+        files = sorted((p for p in self._disk_dir.glob("*/*") if p.is_file()), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        # Trim to 90% so eviction does not run on every write.
+        target = int(self._disk_max_bytes * 0.9)
+        for path in files:
+            if total <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                total -= size
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_bytes = total
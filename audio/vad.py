@@ -1,12 +1,44 @@
 from __future__ import annotations
 
-import audioop
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class VADResult:
+    has_speech: bool
+    speech_ratio: float
+    # Speech regions as [start, end) sample offsets into the analysed PCM.
+    spans: list[tuple[int, int]] = field(default_factory=list)
+    level: float = 0.0
+
+    @property
+    def speech_samples(self) -> int:
+        return sum(end - start for start, end in self.spans)
 
 
 class VADSegmenter:
-    """Simple RMS-based VAD for phase development/testing."""
+    """Frame-level energy + zero-crossing VAD with an adaptive noise floor.
+
+    PCM is cut into 20 ms frames. A frame counts as speech when its RMS clears both
+    half the configured threshold and ``snr`` times the tracked noise floor; very
+    noisy frames (high zero-crossing rate) additionally need a clearly loud level.
+    """
 
-    def __init__(self, threshold: float = 0.5) -> None:
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        *,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        snr: float = 3.0,
+        max_zcr: float = 0.5,
+        min_speech_ms: int = 100,
+        min_speech_ratio: float = 0.1,
+        hangover_frames: int = 3,
+        noise_hold_ms: int = 5000,
+    ) -> None:
         raw = max(0.0, min(1.0, threshold))
         # In the design doc, threshold=0.5 is for Silero probability scale.
         # Convert that value to a practical RMS amplitude threshold for PCM.
@@ -14,17 +46,90 @@ class VADSegmenter:
             self.threshold = max(0.0015, raw * 0.01)
         else:
             self.threshold = raw
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.snr = snr
+        self.max_zcr = max_zcr
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.min_speech_ratio = min_speech_ratio
+        self.hangover_frames = hangover_frames
+        self.noise_hold_frames = max(1, noise_hold_ms // frame_ms)
+        self.noise_floor = self.threshold * 0.2
+        # Frames in a row without a single quiet one, and their lowest level.
+        self._voiced_run = 0
+        self._voiced_run_min = float("inf")
         self.last_normalized = 0.0
 
+    def frame_features(self, pcm16_mono: bytes) -> tuple[np.ndarray, np.ndarray]:
+        """Per-frame normalised RMS and zero-crossing rate. A partial last frame is zero padded."""
+        samples = np.frombuffer(pcm16_mono, dtype="<i2", count=len(pcm16_mono) // 2).astype(np.float32)
+        samples /= 32768.0
+        frames = -(-samples.size // self.frame_samples)
+        padded = np.zeros(frames * self.frame_samples, dtype=np.float32)
+        padded[: samples.size] = samples
+        framed = padded.reshape(frames, self.frame_samples)
+        rms = np.sqrt(np.mean(framed * framed, axis=1))
+        signs = np.signbit(framed)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_samples - 1)
+        return rms, zcr
+
+    def speech_mask(self, rms: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+        gate = max(self.threshold * 0.5, self.noise_floor * self.snr)
+        voiced = rms >= gate
+        # Hiss-like frames only count when they are clearly loud (e.g. strong fricatives).
+        noisy = zcr > self.max_zcr
+        return voiced & (~noisy | (rms >= self.threshold * 2.0))
+
+    def analyze(self, pcm16_mono: bytes) -> VADResult:
+        if len(pcm16_mono) < 2:
+            return VADResult(has_speech=False, speech_ratio=0.0)
+        rms, zcr = self.frame_features(pcm16_mono)
+        mask = self.speech_mask(rms, zcr)
+        self._update_noise_floor(rms, mask)
+        self.last_normalized = float(rms.max())
+
+        speech_frames = int(np.count_nonzero(mask))
+        ratio = speech_frames / mask.size
+        spans = self._spans(mask, total_samples=len(pcm16_mono) // 2)
+        has_speech = speech_frames >= min(self.min_speech_frames, mask.size) and ratio >= self.min_speech_ratio
+        return VADResult(has_speech=has_speech, speech_ratio=ratio, spans=spans, level=self.last_normalized)
+
     def has_speech(self, pcm16_mono: bytes) -> bool:
-        if not pcm16_mono:
-            return False
-        rms = audioop.rms(pcm16_mono, 2)
-        normalized = min(1.0, rms / 32768.0)
-        self.last_normalized = normalized
-        if normalized >= self.threshold:
-            return True
-        # Long chunks that are close to threshold are treated as speech to avoid over-filtering.
-        if len(pcm16_mono) >= 32000 and normalized >= (self.threshold * 0.5):
-            return True
-        return False
+        return self.analyze(pcm16_mono).has_speech
+
+    def _update_noise_floor(self, rms: np.ndarray, mask: np.ndarray) -> None:
+        quiet = rms[~mask]
+        if not quiet.size:
+            # Speech frames must not drag the floor up (packet-level input is often all speech).
+            # Only a stretch with no pause at all, i.e. a steady noise louder than the gate,
+            # raises it, and then only to the quietest level seen in that stretch.
+            self._voiced_run += rms.size
+            self._voiced_run_min = min(self._voiced_run_min, float(rms.min()))
+            if self._voiced_run < self.noise_hold_frames:
+                return
+            quiet = np.array([self._voiced_run_min], dtype=np.float32)
+        self._voiced_run = 0
+        self._voiced_run_min = float("inf")
+        # 10th percentile via partition; np.percentile is several times slower on packet-sized input.
+        candidate = float(np.partition(quiet, quiet.size // 10)[quiet.size // 10])
+        if candidate < self.noise_floor:
+            # Follow quieter rooms quickly, louder ones slowly.
+            self.noise_floor = 0.5 * self.noise_floor + 0.5 * candidate
+        else:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * candidate
+        self.noise_floor = min(self.noise_floor, self.threshold)
+
+    def _spans(self, mask: np.ndarray, total_samples: int) -> list[tuple[int, int]]:
+        if not mask.any():
+            return []
+        padded = np.concatenate(([False], mask, [False]))
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        starts, ends = edges[0::2], edges[1::2]
+        spans: list[tuple[int, int]] = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            # Bridge short dips so a word is not split into several spans.
+            if spans and start - spans[-1][1] <= self.hangover_frames:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+        return [(s * self.frame_samples, min(e * self.frame_samples, total_samples)) for s, e in spans]
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+
+@dataclass
+class VoiceVoxBackend:
+    url: str
+    healthy: bool = True
+    in_flight: int = 0
+    # Exponentially weighted request latency in seconds; 0 until the first success.
+    ewma_seconds: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    version: str | None = None
+
+    def load(self, default_seconds: float) -> float:
+        """Expected wait for one more request: queue depth times typical latency."""
+        return (self.in_flight + 1) * (self.ewma_seconds or default_seconds)
+
+
+class VoiceVoxPool:
+    """Routes VOICEVOX requests to the least-loaded healthy engine and fails over on errors.
+
+    A backend is marked unhealthy on a transport error or 5xx and comes back once a
+    periodic ``/version`` probe succeeds again.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        *,
+        ewma_alpha: float = 0.3,
+        health_interval: float = 15.0,
+        probe_timeout: float = 5.0,
+    ) -> None:
+        if not urls:
+            raise ValueError("at least one VOICEVOX URL is required")
+        self._logger = logging.getLogger(__name__)
+        self.backends = [VoiceVoxBackend(url.rstrip("/")) for url in urls]
+        self._ewma_alpha = ewma_alpha
+        self._health_interval = health_interval
+        self._probe_timeout = probe_timeout
+        self._health_task: asyncio.Task[None] | None = None
+
+    def pick(self, exclude: set[str] | frozenset[str] = frozenset()) -> VoiceVoxBackend | None:
+        candidates = [b for b in self.backends if b.url not in exclude]
+        healthy = [b for b in candidates if b.healthy] or candidates
+        if not healthy:
+            return None
+        known = [b.ewma_seconds for b in self.backends if b.ewma_seconds]
+        default = sum(known) / len(known) if known else 1.0
+        # Ties go to the less used engine so every backend gets a latency estimate.
+        return min(healthy, key=lambda b: (b.load(default), b.requests))
+
+    async def call(self, fn: Callable[[str], Awaitable[T]]) -> T:
+        """Run ``fn(base_url)`` on the best backend, retrying the next one on transport errors or 5xx."""
+        tried: set[str] = set()
+        last_error: Exception | None = None
+        while (backend := self.pick(tried)) is not None:
+            tried.add(backend.url)
+            backend.in_flight += 1
+            backend.requests += 1
+            started = time.monotonic()
+            try:
+                result = await fn(backend.url)
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code < 500:
+                    raise
+                last_error = exc
+                self._mark_failed(backend, exc)
+                continue
+            except httpx.TransportError as exc:
+                last_error = exc
+                self._mark_failed(backend, exc)
+                continue
+            finally:
+                backend.in_flight -= 1
+            elapsed = time.monotonic() - started
+            if backend.ewma_seconds:
+                backend.ewma_seconds += self._ewma_alpha * (elapsed - backend.ewma_seconds)
+            else:
+                backend.ewma_seconds = elapsed
+            backend.healthy = True
+            return result
+        assert last_error is not None
+        raise last_error
+
+    def _mark_failed(self, backend: VoiceVoxBackend, exc: Exception) -> None:
+        backend.failures += 1
+        if backend.healthy:
+            self._logger.warning("VOICEVOX backend %s marked unhealthy: %s", backend.url, exc)
+        backend.healthy = False
+
+    async def probe(self, client: httpx.AsyncClient, backend: VoiceVoxBackend) -> bool:
+        try:
+            res = await client.get(f"{backend.url}/version", timeout=self._probe_timeout)
+            res.raise_for_status()
+            backend.version = str(res.json())
+            ok = True
+        except (httpx.HTTPError, ValueError) as exc:
+            self._logger.debug("VOICEVOX probe failed for %s: %s", backend.url, exc)
+            ok = False
+        if ok and not backend.healthy:
+            self._logger.info("VOICEVOX backend %s is healthy again", backend.url)
+        backend.healthy = ok
+        return ok
+
+    async def probe_all(self, client: httpx.AsyncClient) -> None:
+        await asyncio.gather(*(self.probe(client, backend) for backend in self.backends))
+
+    def start_health_checks(self, client_getter: Callable[[], httpx.AsyncClient]) -> None:
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop(client_getter))
+
+    async def stop_health_checks(self) -> None:
+        task, self._health_task = self._health_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _health_loop(self, client_getter: Callable[[], httpx.AsyncClient]) -> None:
+        while True:
+            await self.probe_all(client_getter())
+            await asyncio.sleep(self._health_interval)
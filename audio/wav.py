@@ -1,16 +1,189 @@
 from __future__ import annotations
 
-import audioop
 import io
+import logging
+import struct
 import wave
+from typing import Callable
+
+import discord.opus
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+try:
+    import soundfile
+except ImportError:  # optional: FLAC uploads
+    soundfile = None
+
+logger = logging.getLogger(__name__)
+
+# Whisper upload containers, smallest first.
+UPLOAD_FORMATS = ("ogg", "flac", "wav")
+
+
+def _lowpass_taps(num_taps: int, cutoff: float) -> np.ndarray:
+    """Hann-windowed sinc low-pass; ``cutoff`` is a fraction of the input sample rate."""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class StereoToMonoResampler:
+    """Streaming 48 kHz stereo -> 16 kHz mono s16le converter.
+
+    Downmixes, low-pass filters and decimates by 3 with a polyphase FIR, keeping the
+    filter history between calls so packets can be converted as they arrive. The
+    output of ``process`` for every chunk followed by ``flush`` equals converting the
+    whole stream at once.
+    """
+
+    FACTOR = 3
+    # Pass band up to ~7 kHz at 16 kHz output, which covers speech.
+    TAPS = _lowpass_taps(47, 0.145)
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        # Half a filter of leading zeros centres output n on input sample 3n.
+        self._history = np.zeros(self.TAPS.size // 2, dtype=np.float32)
+        self._pending = b""
+
+    def process(self, pcm48_stereo: bytes) -> bytes:
+        data = self._pending + pcm48_stereo if self._pending else pcm48_stereo
+        usable = len(data) - len(data) % 4
+        self._pending = bytes(data[usable:])
+        if not usable:
+            return b""
+        stereo = np.frombuffer(data, dtype="<i2", count=usable // 2)
+        mono = (stereo[0::2].astype(np.float32) + stereo[1::2]) * 0.5
+        return self._filter(np.concatenate((self._history, mono)))
+
+    def flush(self) -> bytes:
+        """Emit the samples still held back by the filter delay and reset the state."""
+        tail = np.zeros(self.TAPS.size // 2, dtype=np.float32)
+        out = self._filter(np.concatenate((self._history, tail)))
+        self.reset()
+        return out
+
+    def _filter(self, signal: np.ndarray) -> bytes:
+        count = (signal.size - self.TAPS.size) // self.FACTOR + 1
+        if count <= 0:
+            self._history = signal
+            return b""
+        # One row per output sample: TAPS.size inputs starting every FACTOR samples.
+        step = signal.strides[0]
+        windows = as_strided(signal, shape=(count, self.TAPS.size), strides=(step * self.FACTOR, step), writeable=False)
+        out = windows @ self.TAPS
+        self._history = signal[count * self.FACTOR :]
+        return np.clip(np.rint(out), -32768, 32767).astype("<i2").tobytes()
 
 
 def pcm48k_stereo_to_pcm16k_mono(pcm_bytes: bytes) -> bytes:
     if not pcm_bytes:
         return b""
-    mono = audioop.tomono(pcm_bytes, 2, 0.5, 0.5)
-    converted, _ = audioop.ratecv(mono, 2, 1, 48000, 16000, None)
-    return converted
+    resampler = StereoToMonoResampler()
+    return resampler.process(pcm_bytes) + resampler.flush()
+
+
+def trim_silence(
+    pcm16_mono: bytes,
+    spans: list[tuple[int, int]],
+    *,
+    sample_rate: int = 16000,
+    pad_ms: int = 200,
+    max_pause_ms: int = 400,
+) -> tuple[bytes, float]:
+    """Keep only the speech spans (plus ``pad_ms`` margin) and shorten pauses longer than ``max_pause_ms``.
+
+    Returns the trimmed PCM and the number of seconds removed. Without spans the input is returned unchanged.
+    """
+    total = len(pcm16_mono) // 2
+    if not spans or not total:
+        return pcm16_mono, 0.0
+    pad = sample_rate * pad_ms // 1000
+    keep = sample_rate * max_pause_ms // 2000  # kept on each side of a collapsed pause
+
+    segments: list[tuple[int, int]] = []
+    seg_start = max(0, spans[0][0] - pad)
+    prev_end = spans[0][1]
+    for start, end in spans[1:]:
+        if start - prev_end > 2 * keep:
+            segments.append((seg_start, prev_end + keep))
+            seg_start = start - keep
+        prev_end = end
+    segments.append((seg_start, min(total, prev_end + pad)))
+
+    samples = np.frombuffer(pcm16_mono, dtype="<i2", count=total)
+    kept = sum(end - start for start, end in segments)
+    if kept >= total:
+        return pcm16_mono, 0.0
+    trimmed = np.concatenate([samples[start:end] for start, end in segments])
+    return trimmed.tobytes(), (total - kept) / sample_rate
+
+
+def wav_to_pcm48k_stereo(wav_bytes: bytes) -> bytes:
+    """Decode a 16-bit PCM WAV (e.g. from VOICEVOX) into Discord's 48 kHz stereo s16le."""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() not in (1, 2):
+            raise ValueError("only 16-bit mono/stereo WAV is supported")
+        channels, rate = wf.getnchannels(), wf.getframerate()
+        frames = wf.readframes(wf.getnframes())
+    samples = np.frombuffer(frames, dtype="<i2", count=len(frames) // 2).reshape(-1, channels)
+    if rate == 48000 and channels == 2:
+        return samples.tobytes()
+    signal = samples.astype(np.float32)
+    if rate != 48000:
+        signal = np.stack([_upsample_to_48k(signal[:, ch], rate) for ch in range(channels)], axis=1)
+    if channels == 1:
+        signal = np.repeat(signal, 2, axis=1)
+    return np.clip(np.rint(signal), -32768, 32767).astype("<i2").tobytes()
+
+
+def _upsample_to_48k(signal: np.ndarray, rate: int) -> np.ndarray:
+    if 48000 % rate:
+        # Odd rates: linear interpolation is good enough for TTS playback.
+        positions = np.arange(signal.size * 48000 // rate) * (rate / 48000)
+        return np.interp(positions, np.arange(signal.size), signal).astype(np.float32)
+    factor = 48000 // rate
+    # Zero-stuff, then low-pass at the source Nyquist (gain ``factor`` restores the level).
+    stuffed = np.zeros(signal.size * factor, dtype=np.float32)
+    stuffed[::factor] = signal
+    taps = _lowpass_taps(16 * factor + 1, 0.5 / factor) * factor
+    return np.convolve(stuffed, taps, mode="same").astype(np.float32)
+
+
+def concat_wavs(wavs: list[bytes], *, gap_seconds: float = 0.0, lead_seconds: float = 0.0) -> bytes:
+    """Join 16-bit PCM WAVs of one format in order, with ``gap_seconds`` of silence between them.
+
+    ``lead_seconds`` of silence goes in front of the first clip.
+    """
+    wavs = [w for w in wavs if w]
+    if not wavs:
+        return b""
+    if len(wavs) == 1 and lead_seconds <= 0:
+        return wavs[0]
+    params = None
+    chunks: list[bytes] = []
+    for index, wav in enumerate(wavs):
+        with wave.open(io.BytesIO(wav), "rb") as wf:
+            fmt = (wf.getnchannels(), wf.getsampwidth(), wf.getframerate())
+            if params is None:
+                params = fmt
+            elif fmt != params:
+                raise ValueError(f"WAV format mismatch: {fmt} != {params}")
+            silence = gap_seconds if index else lead_seconds
+            if silence > 0:
+                chunks.append(bytes(int(fmt[2] * silence) * fmt[0] * fmt[1]))
+            chunks.append(wf.readframes(wf.getnframes()))
+    assert params is not None
+    with io.BytesIO() as buff:
+        with wave.open(buff, "wb") as wf:
+            wf.setnchannels(params[0])
+            wf.setsampwidth(params[1])
+            wf.setframerate(params[2])
+            wf.writeframes(b"".join(chunks))
+        return buff.getvalue()
 
 
 def pcm16k_mono_to_wav(pcm_bytes: bytes) -> bytes:
@@ -28,3 +201,143 @@ def pcm16k_mono_to_wav(pcm_bytes: bytes) -> bytes:
 
 def pcm48k_stereo_to_wav16k_mono(pcm_bytes: bytes) -> bytes:
     return pcm16k_mono_to_wav(pcm48k_stereo_to_pcm16k_mono(pcm_bytes))
+
+
+def _ogg_crc_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    """CRC-32 as used by Ogg pages (poly 0x04C11DB7, no reflection, init 0)."""
+    crc = 0
+    table = _OGG_CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+    return crc
+
+
+def _ogg_page(packets: list[bytes], *, header_type: int, granule: int, serial: int, sequence: int) -> bytes:
+    lacing = bytearray()
+    for packet in packets:
+        lacing += b"\xff" * (len(packet) // 255) + bytes((len(packet) % 255,))
+    header = struct.pack("<4sBBqIIIB", b"OggS", 0, header_type, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + lacing + b"".join(packets))
+    struct.pack_into("<I", page, 22, ogg_crc(bytes(page)))
+    return bytes(page)
+
+
+def ogg_opus_container(
+    packets: list[bytes], *, input_sample_rate: int, total_samples: int, pre_skip: int = 312, serial: int = 0x7A6B
+) -> bytes:
+    """Wrap 20 ms Opus packets of mono audio in an Ogg stream (RFC 7845)."""
+    head = struct.pack("<8sBBHIhB", b"OpusHead", 1, 1, pre_skip, input_sample_rate, 0, 0)
+    vendor = b"talkbot"
+    tags = struct.pack("<8sI", b"OpusTags", len(vendor)) + vendor + struct.pack("<I", 0)
+    pages = [
+        _ogg_page([head], header_type=0x02, granule=0, serial=serial, sequence=0),
+        _ogg_page([tags], header_type=0x00, granule=0, serial=serial, sequence=1),
+    ]
+    # Granule positions are always in 48 kHz samples.
+    end_granule = pre_skip + total_samples * 48000 // input_sample_rate
+    granule = pre_skip
+    sequence = 2
+    batch: list[bytes] = []
+    segments = 0
+    for index, packet in enumerate(packets):
+        needed = len(packet) // 255 + 1
+        if batch and segments + needed > 255:
+            pages.append(_ogg_page(batch, header_type=0, granule=granule, serial=serial, sequence=sequence))
+            sequence += 1
+            batch, segments = [], 0
+        batch.append(packet)
+        segments += needed
+        granule += 960
+    pages.append(
+        _ogg_page(batch, header_type=0x04, granule=min(granule, end_granule), serial=serial, sequence=sequence)
+    )
+    return b"".join(pages)
+
+
+class _SpeechOpusEncoder(discord.opus.Encoder):
+    SAMPLING_RATE = 16000
+    CHANNELS = 1
+    SAMPLE_SIZE = 2
+    SAMPLES_PER_FRAME = 320
+    FRAME_SIZE = SAMPLES_PER_FRAME * SAMPLE_SIZE
+
+
+def pcm16k_mono_to_ogg_opus(
+    pcm_bytes: bytes, *, bitrate_kbps: int = 24, encoder_factory: Callable[[], discord.opus.Encoder] | None = None
+) -> bytes:
+    if not pcm_bytes:
+        return b""
+    encoder = (encoder_factory or _default_speech_encoder(bitrate_kbps))()
+    frame = _SpeechOpusEncoder.FRAME_SIZE
+    total_samples = len(pcm_bytes) // 2
+    packets = []
+    for offset in range(0, len(pcm_bytes), frame):
+        # Encoder.encode ctypes-casts its input, which only works on bytes (not memoryview slices).
+        chunk = bytes(pcm_bytes[offset : offset + frame])
+        if len(chunk) < frame:
+            chunk += bytes(frame - len(chunk))
+        packets.append(encoder.encode(chunk, _SpeechOpusEncoder.SAMPLES_PER_FRAME))
+    return ogg_opus_container(packets, input_sample_rate=16000, total_samples=total_samples)
+
+
+def _default_speech_encoder(bitrate_kbps: int) -> Callable[[], discord.opus.Encoder]:
+    def _make() -> discord.opus.Encoder:
+        return _SpeechOpusEncoder(application="voip", bitrate=bitrate_kbps, fec=False, bandwidth="wide")
+
+    return _make
+
+
+def pcm16k_mono_to_flac(pcm_bytes: bytes) -> bytes:
+    if soundfile is None:
+        raise RuntimeError("soundfile is not installed")
+    if not pcm_bytes:
+        return b""
+    samples = np.frombuffer(pcm_bytes, dtype="<i2", count=len(pcm_bytes) // 2)
+    with io.BytesIO() as buff:
+        soundfile.write(buff, samples, 16000, format="FLAC", subtype="PCM_16")
+        return buff.getvalue()
+
+
+def available_upload_formats() -> list[str]:
+    formats = []
+    try:
+        discord.opus.Encoder.get_opus_version()
+        formats.append("ogg")
+    except discord.opus.OpusNotLoaded:
+        pass
+    if soundfile is not None:
+        formats.append("flac")
+    formats.append("wav")
+    return formats
+
+
+def resolve_upload_format(requested: str) -> str:
+    """Map ``auto`` (or an encoder that is not installed) to the smallest format available here."""
+    available = available_upload_formats()
+    if requested in available:
+        return requested
+    if requested != "auto":
+        logger.warning("Upload format %s is unavailable; falling back to %s", requested, available[0])
+    return available[0]
+
+
+def encode_upload(pcm16_mono: bytes, fmt: str) -> tuple[bytes, str]:
+    """Encode 16 kHz mono PCM for the transcription API. Returns the payload and its file name."""
+    if fmt == "ogg":
+        return pcm16k_mono_to_ogg_opus(pcm16_mono), "audio.ogg"
+    if fmt == "flac":
+        return pcm16k_mono_to_flac(pcm16_mono), "audio.flac"
+    return pcm16k_mono_to_wav(pcm16_mono), "audio.wav"
@@ -1,23 +1,63 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 from io import BytesIO
+from typing import Any
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from ai.request_policy import RequestPolicy
+from ai.sync_bridge import run_sync
+from audio.wav import encode_upload, pcm16k_mono_to_wav, resolve_upload_format
 
 
 class WhisperTranscriber:
-    def __init__(self, api_key: str) -> None:
-        self._client = OpenAI(api_key=api_key)
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str | None = None,
+        upload_format: str = "auto",
+        policy: RequestPolicy | None = None,
+    ) -> None:
+        self._logger = logging.getLogger(__name__)
+        # Retries and hedging are the policy's job.
+        self._async_client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.upload_format = resolve_upload_format(upload_format)
+        self.policy = policy or RequestPolicy("whisper", timeout=10.0)
+
+    @staticmethod
+    def _request_kwargs(audio_bytes: bytes, filename: str = "audio.wav", timeout: float = 10.0) -> dict[str, Any]:
+        file_like = BytesIO(audio_bytes)
+        file_like.name = filename
+        return {"model": "whisper-1", "file": file_like, "language": "ja", "timeout": timeout}
+
+    async def _transcribe_async(self, audio: bytes, filename: str) -> str:
+        async def _attempt(timeout: float) -> str:
+            result = await self._async_client.audio.transcriptions.create(
+                **self._request_kwargs(audio, filename, timeout)
+            )
+            return (result.text or "").strip()
+
+        return await self.policy.run(_attempt)
 
     def transcribe_ja(self, wav_bytes: bytes) -> str:
+        return run_sync(self.transcribe_ja_async(wav_bytes))
+
+    async def transcribe_ja_async(self, wav_bytes: bytes) -> str:
         if not wav_bytes:
             return ""
-        file_like = BytesIO(wav_bytes)
-        file_like.name = "audio.wav"
-        result = self._client.audio.transcriptions.create(
-            model="whisper-1",
-            file=file_like,
-            language="ja",
-            timeout=10,
-        )
-        return (result.text or "").strip()
+        return await self._transcribe_async(wav_bytes, "audio.wav")
+
+    async def transcribe_pcm16_ja_async(self, pcm16_mono: bytes) -> str:
+        """Encode 16 kHz mono PCM in ``upload_format`` (WAV if encoding fails) and transcribe it."""
+        if not pcm16_mono:
+            return ""
+        try:
+            audio, filename = await asyncio.to_thread(encode_upload, pcm16_mono, self.upload_format)
+        except Exception as exc:
+            self._logger.warning("Failed to encode %s upload, sending WAV: %s", self.upload_format, exc)
+            audio, filename = pcm16k_mono_to_wav(pcm16_mono), "audio.wav"
+        return await self._transcribe_async(audio, filename)
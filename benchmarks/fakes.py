@@ -0,0 +1,390 @@
+"""Local stand-ins for OpenAI, VOICEVOX and Discord used by the pipeline benchmark."""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import random
+import threading
+import time
+import types
+import wave
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlparse
+
+import discord.ext.voice_recv as voice_recv
+
+
+@dataclass
+class LatencyProfile:
+    """Injected server-side latency in seconds per endpoint, plus uniform jitter and a slow tail."""
+
+    whisper: float = 0.3
+    chat: float = 0.4
+    chat_token: float = 0.01
+    audio_query: float = 0.05
+    synthesis: float = 0.3
+    jitter: float = 0.0
+    # Share of requests that stall for an extra ``tail_seconds`` (models p99 outliers).
+    tail_probability: float = 0.0
+    tail_seconds: float = 0.0
+    # Simulated client uplink for request bodies; 0 means unlimited.
+    uplink_bytes_per_second: float = 0.0
+
+    def sleep(self, base: float) -> None:
+        delay = base + (random.uniform(0.0, self.jitter) if self.jitter > 0 else 0.0)
+        if self.tail_probability > 0 and random.random() < self.tail_probability:
+            delay += self.tail_seconds
+        if delay > 0:
+            time.sleep(delay)
+
+    def upload(self, size: int) -> float:
+        if self.uplink_bytes_per_second <= 0:
+            return 0.0
+        seconds = size / self.uplink_bytes_per_second
+        time.sleep(seconds)
+        return seconds
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    upload_seconds: float = 0.0
+
+
+class _FakeServer:
+    """Threaded HTTP server on 127.0.0.1 with a random port."""
+
+    def __init__(self, latency: LatencyProfile) -> None:
+        self.latency = latency
+        self.stats: dict[str, EndpointStats] = {}
+        self._stats_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_FakeServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "_FakeServer":
+        return self.start()
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+    def count(self, endpoint: str, bytes_in: int, bytes_out: int, upload_seconds: float = 0.0) -> None:
+        with self._stats_lock:
+            stats = self.stats.setdefault(endpoint, EndpointStats())
+            stats.requests += 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.upload_seconds += upload_seconds
+
+    def route(self, handler: BaseHTTPRequestHandler, method: str, path: str, query: dict[str, list[str]], body: bytes) -> None:
+        raise NotImplementedError
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                parsed = urlparse(self.path)
+                try:
+                    server.route(self, method, parsed.path, parse_qs(parsed.query), body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client hung up, e.g. a hedged request that lost the race.
+                    self.close_connection = True
+
+            def do_GET(self) -> None:  # noqa: N802
+                self._dispatch("GET")
+
+            def do_POST(self) -> None:  # noqa: N802
+                self._dispatch("POST")
+
+            def log_message(self, *_: Any) -> None:
+                pass
+
+        return _Handler
+
+
+def _send(handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str) -> None:
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def _send_json(handler: BaseHTTPRequestHandler, payload: Any, status: int = 200) -> int:
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    _send(handler, status, body, "application/json")
+    return len(body)
+
+
+class FakeOpenAIServer(_FakeServer):
+    """Serves /v1/audio/transcriptions and /v1/chat/completions (plain and SSE streaming)."""
+
+    def __init__(
+        self,
+        latency: LatencyProfile,
+        *,
+        transcript: str = "こんにちは、今日はいい天気だね。",
+        reply: str = "うん、本当にいい天気だね！どこか出かける？",
+    ) -> None:
+        super().__init__(latency)
+        self.transcript = transcript
+        self.reply = reply
+        self._last_prompt = ""
+        self._prompt_lock = threading.Lock()
+
+    def _usage(self, request: dict[str, Any], completion: str) -> dict[str, Any]:
+        """Token usage with prefix caching modelled like OpenAI's: 128-token blocks past the first 1024."""
+        prompt = json.dumps(request.get("messages", []), ensure_ascii=False)
+        with self._prompt_lock:
+            shared = 0
+            for a, b in zip(prompt, self._last_prompt):
+                if a != b:
+                    break
+                shared += 1
+            self._last_prompt = prompt
+        # Roughly one token per Japanese character.
+        prompt_tokens = len(prompt)
+        cached = shared // 128 * 128 if shared >= 1024 else 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(completion),
+            "total_tokens": prompt_tokens + len(completion),
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    def route(self, handler, method, path, query, body):
+        if method == "POST" and path.endswith("/audio/transcriptions"):
+            uploaded = self.latency.upload(len(body))
+            self.latency.sleep(self.latency.whisper)
+            sent = _send_json(handler, {"text": self.transcript})
+            self.count("transcriptions", len(body), sent, uploaded)
+            return
+        if method == "POST" and path.endswith("/chat/completions"):
+            request = json.loads(body or b"{}")
+            if request.get("stream"):
+                self._stream_chat(handler, request, len(body))
+                return
+            self.latency.sleep(self.latency.chat)
+            sent = _send_json(handler, self._completion(request, self.reply))
+            self.count("chat", len(body), sent)
+            return
+        _send_json(handler, {"error": {"message": f"not found: {path}"}}, status=404)
+
+    def _completion(self, request: dict[str, Any], content: str) -> dict[str, Any]:
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            ],
+            "usage": self._usage(request, content),
+        }
+
+    def _stream_chat(self, handler: BaseHTTPRequestHandler, request: dict[str, Any], bytes_in: int) -> None:
+        self.latency.sleep(self.latency.chat)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        sent = 0
+        for i in range(0, len(self.reply), 2):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": {"content": self.reply[i : i + 2]}, "finish_reason": None}],
+            }
+            line = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode()
+            handler.wfile.write(line)
+            handler.wfile.flush()
+            sent += len(line)
+            self.latency.sleep(self.latency.chat_token)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [],
+                "usage": self._usage(request, self.reply),
+            }
+            line = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode()
+            handler.wfile.write(line)
+            sent += len(line)
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+        handler.close_connection = True
+        self.count("chat", bytes_in, sent)
+
+
+def silent_wav(seconds: float, sample_rate: int = 24000, channels: int = 1) -> bytes:
+    frames = int(seconds * sample_rate)
+    with io.BytesIO() as buff:
+        with wave.open(buff, "wb") as wf:
+            wf.setnchannels(channels)
+            wf.setsampwidth(2)
+            wf.setframerate(sample_rate)
+            wf.writeframes(b"\0\0" * channels * frames)
+        return buff.getvalue()
+
+
+class FakeVoiceVoxServer(_FakeServer):
+    """Serves /version, /audio_query and /synthesis like a VOICEVOX engine."""
+
+    # Roughly how long VOICEVOX speech lasts per character.
+    SECONDS_PER_CHAR = 0.12
+
+    def route(self, handler, method, path, query, body):
+        if method == "GET" and path == "/version":
+            _send_json(handler, "0.0.0-bench")
+            return
+        if method == "POST" and path == "/initialize_speaker":
+            _send(handler, 204, b"", "text/plain")
+            self.count("initialize_speaker", len(body), 0)
+            return
+        if method == "POST" and path == "/audio_query":
+            self.latency.sleep(self.latency.audio_query)
+            text = (query.get("text") or [""])[0]
+            payload = {
+                "accent_phrases": [],
+                "speedScale": 1.0,
+                "pitchScale": 0.0,
+                "intonationScale": 1.0,
+                "volumeScale": 1.0,
+                "prePhonemeLength": 0.1,
+                "postPhonemeLength": 0.1,
+                "outputSamplingRate": 24000,
+                "outputStereo": False,
+                "kana": text,
+            }
+            sent = _send_json(handler, payload)
+            self.count("audio_query", len(body), sent)
+            return
+        if method == "POST" and path == "/synthesis":
+            self.latency.sleep(self.latency.synthesis)
+            request = json.loads(body or b"{}")
+            seconds = max(0.2, len(request.get("kana", "")) * self.SECONDS_PER_CHAR)
+            wav = silent_wav(
+                seconds,
+                sample_rate=int(request.get("outputSamplingRate", 24000)),
+                channels=2 if request.get("outputStereo") else 1,
+            )
+            _send(handler, 200, wav, "audio/wav")
+            self.count("synthesis", len(body), len(wav))
+            return
+        _send_json(handler, {"detail": "Not Found"}, status=404)
+
+
+@dataclass
+class FakeMessage:
+    content: str
+    author: Any
+    created_at: datetime = field(default_factory=datetime.now)
+
+
+class FakeTextChannel:
+    """In-memory replacement for the Discord history channel."""
+
+    def __init__(self, channel_id: int = 1, send_latency: float = 0.0) -> None:
+        self.id = channel_id
+        self.send_latency = send_latency
+        self.messages: list[FakeMessage] = []
+        self._author = types.SimpleNamespace(display_name="Bot", bot=True)
+
+    async def send(self, content: str) -> FakeMessage:
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        message = FakeMessage(content=content, author=self._author)
+        self.messages.append(message)
+        return message
+
+    async def history(self, limit: int | None = 100):
+        rows = self.messages[::-1]
+        for message in rows[:limit] if limit else rows:
+            yield message
+
+
+class FakeVoiceClient(voice_recv.VoiceRecvClient):
+    """VoiceRecvClient stand-in: keeps the sink so the benchmark can push packets into it."""
+
+    def __init__(self) -> None:  # noqa: D401 - intentionally skips the real connection setup
+        self.receiver: voice_recv.AudioSink | None = None
+        self._playing = False
+        self.played: list[float] = []
+
+    def listen(self, sink: voice_recv.AudioSink, *, after: Callable[..., Any] | None = None) -> None:
+        self.receiver = sink
+
+    def is_listening(self) -> bool:
+        return self.receiver is not None
+
+    def stop_listening(self) -> None:
+        self.receiver = None
+
+    def is_playing(self) -> bool:
+        return self._playing
+
+    def play(self, source: Any, *, after: Callable[[Exception | None], Any] | None = None, **_: Any) -> None:
+        self._playing = True
+        self.played.append(time.monotonic())
+
+        def _drain() -> None:
+            error: Exception | None = None
+            try:
+                read = getattr(source, "read", None)
+                while read is not None and read():
+                    pass
+            except Exception as exc:  # pragma: no cover - surfaced through after()
+                error = exc
+            finally:
+                self._playing = False
+                cleanup = getattr(source, "cleanup", None)
+                if cleanup:
+                    cleanup()
+                if after:
+                    after(error)
+
+        threading.Thread(target=_drain, daemon=True).start()
+
+    def stop(self) -> None:
+        self._playing = False
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, voice_client: FakeVoiceClient) -> None:
+        self.id = guild_id
+        self.voice_client = voice_client
+
+    def get_member(self, user_id: int) -> None:
+        return None
+
+
+def fake_user(user_id: int) -> Any:
+    return types.SimpleNamespace(id=user_id, bot=False, display_name=f"speaker-{user_id}", name=f"speaker-{user_id}")
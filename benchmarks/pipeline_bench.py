@@ -0,0 +1,331 @@
+"""Offline end-to-end benchmark of the voice pipeline.
+
+Replays PCM utterances through VoiceReceiveSession and VoiceHandler against local
+fake OpenAI / VOICEVOX servers and an in-memory history channel. No network needed.
+
+    python benchmarks/pipeline_bench.py --speakers 3 --utterances 5
+"""
+from __future__ import annotations
+
+import argparse
+import array
+import asyncio
+import contextlib
+import json
+import math
+import sys
+import time
+import types
+import wave
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from ai.gpt import GPTResponder, PromptCacheStats
+from audio.player import VoicePlayer
+from audio.tts import VoiceVoxTTS
+from audio.tts_cache import TTSCache
+from audio.vad import VADSegmenter
+from audio.stt import STT_BACKENDS, create_transcriber
+from benchmarks.fakes import (
+    FakeGuild,
+    FakeOpenAIServer,
+    FakeTextChannel,
+    FakeVoiceClient,
+    FakeVoiceVoxServer,
+    LatencyProfile,
+    fake_user,
+)
+from bot.voice_handler import VoiceHandler
+from history.discord_history import DiscordHistoryStore
+from history.permanent_memory import PermanentMemoryStore
+
+FRAME_BYTES = 3840  # 20 ms of 48 kHz stereo s16le
+
+
+@dataclass
+class BenchmarkConfig:
+    speakers: int = 2
+    utterances: int = 3
+    utterance_seconds: float = 1.5
+    gap_seconds: float = 1.0
+    end_of_utterance_seconds: float = 0.8
+    stream_replies: bool = False
+    upload_format: str = "auto"
+    voicevox_48k: bool = False
+    tts_cache: bool = False
+    voicevox_backends: int = 1
+    sentence_fanout: int = 1
+    stt_backend: str = "openai"
+    stt_local_model: str = "tiny"
+    history_token_budget: int = 0
+    realtime: bool = False
+    history_send_latency: float = 0.02
+    timeout_seconds: float = 120.0
+    corpus_dir: Path | None = None
+    latency: LatencyProfile = field(default_factory=LatencyProfile)
+
+
+@dataclass
+class BenchmarkResult:
+    utterances_fed: int
+    replies: int
+    wall_seconds: float
+    throughput_per_second: float
+    stages_ms: dict[str, tuple[float, float, float, int]]
+    endpoints: dict[str, dict[str, float]]
+    upload_format: str = "wav"
+    stt_backend: str = "openai"
+    tts_connections: dict[str, int] = field(default_factory=dict)
+    request_policies: dict[str, dict[str, float]] = field(default_factory=dict)
+    prompt_cache: dict[str, int] = field(default_factory=dict)
+
+    def format_report(self) -> str:
+        lines = [
+            f"utterances fed : {self.utterances_fed}",
+            f"replies        : {self.replies}",
+            f"wall time      : {self.wall_seconds:.2f}s",
+            f"throughput     : {self.throughput_per_second:.2f} replies/s",
+            f"stt backend    : {self.stt_backend}",
+            f"upload format  : {self.upload_format}",
+            f"tts connections: {self.tts_connections.get('new_connections', 0)} new"
+            f" for {self.tts_connections.get('requests', 0)} requests",
+        ]
+        for name, stats in self.request_policies.items():
+            lines.append(
+                f"{name + ' hedges':<15}: {stats['hedges']}/{stats['calls']} (wins {stats['hedge_wins']},"
+                f" retries {stats['retries']}, ~{stats['saved_seconds'] * 1000:.0f} ms saved)"
+            )
+        if self.prompt_cache.get("prompt_tokens"):
+            lines.append(
+                f"prompt cache   : {self.prompt_cache['cached_tokens']}/{self.prompt_cache['prompt_tokens']}"
+                f" tokens ({self.prompt_cache['cached_tokens'] / self.prompt_cache['prompt_tokens']:.0%})"
+            )
+        lines += [
+            "",
+            f"{'stage (ms)':<15}{'p50':>8}{'p95':>8}{'p99':>8}{'n':>6}",
+        ]
+        for stage, (p50, p95, p99, count) in self.stages_ms.items():
+            lines.append(f"{stage:<15}{p50:>8.0f}{p95:>8.0f}{p99:>8.0f}{count:>6}")
+        lines.append("")
+        lines.append(f"{'endpoint':<15}{'requests':>9}{'bytes/req in':>14}{'bytes/req out':>15}{'upload ms':>11}")
+        for name, stats in self.endpoints.items():
+            requests = max(1, stats["requests"])
+            lines.append(
+                f"{name:<15}{stats['requests']:>9}{stats['bytes_in'] // requests:>14}"
+                f"{stats['bytes_out'] // requests:>15}{stats['upload_seconds'] * 1000 / requests:>11.0f}"
+            )
+        return "\n".join(lines)
+
+
+def synthetic_utterance(seconds: float, seed: int = 0) -> bytes:
+    """Voiced-speech-like 48 kHz stereo PCM: harmonics under a syllable-rate envelope."""
+    rate = 48000
+    f0 = 120.0 + 15.0 * (seed % 5)
+    samples = array.array("h")
+    for n in range(int(seconds * rate)):
+        t = n / rate
+        envelope = 0.5 * (1.0 - math.cos(2.0 * math.pi * 4.0 * t))
+        value = sum(math.sin(2.0 * math.pi * f0 * k * t) / k for k in (1, 2, 3))
+        sample = int(5000 * envelope * value)
+        samples.append(sample)
+        samples.append(sample)
+    return samples.tobytes()
+
+
+def load_corpus(corpus_dir: Path) -> list[bytes]:
+    """Load ``*.pcm`` (raw 48 kHz stereo s16le) and 48 kHz stereo ``*.wav`` files."""
+    clips: list[bytes] = []
+    for path in sorted(corpus_dir.iterdir()):
+        if path.suffix == ".pcm":
+            clips.append(path.read_bytes())
+        elif path.suffix == ".wav":
+            with wave.open(str(path), "rb") as wf:
+                if (wf.getframerate(), wf.getnchannels(), wf.getsampwidth()) != (48000, 2, 2):
+                    raise ValueError(f"{path} must be 48 kHz stereo 16-bit PCM")
+                clips.append(wf.readframes(wf.getnframes()))
+    if not clips:
+        raise ValueError(f"No .pcm/.wav utterances found in {corpus_dir}")
+    return clips
+
+
+async def _feed_speaker(vc: FakeVoiceClient, user_id: int, clips: list[bytes], config: BenchmarkConfig) -> None:
+    user = fake_user(user_id)
+    for clip in clips:
+        for offset in range(0, len(clip), FRAME_BYTES):
+            if vc.receiver is None:
+                return
+            vc.receiver.write(user, types.SimpleNamespace(pcm=clip[offset : offset + FRAME_BYTES]))
+            if config.realtime:
+                await asyncio.sleep(0.02)
+        await asyncio.sleep(config.end_of_utterance_seconds + config.gap_seconds)
+
+
+async def run_benchmark(config: BenchmarkConfig) -> BenchmarkResult:
+    if config.corpus_dir:
+        corpus = load_corpus(config.corpus_dir)
+    else:
+        corpus = [synthetic_utterance(config.utterance_seconds, seed=i) for i in range(4)]
+
+    with contextlib.ExitStack() as stack:
+        openai_server = stack.enter_context(FakeOpenAIServer(config.latency))
+        voicevox_servers = [
+            stack.enter_context(FakeVoiceVoxServer(config.latency)) for _ in range(max(1, config.voicevox_backends))
+        ]
+        vc = FakeVoiceClient()
+        guild = FakeGuild(1, vc)
+        channel = FakeTextChannel(send_latency=config.history_send_latency)
+        tts = VoiceVoxTTS(
+            [server.url for server in voicevox_servers],
+            3,
+            output_48k_stereo=config.voicevox_48k,
+            cache=TTSCache() if config.tts_cache else None,
+            sentence_fanout=config.sentence_fanout,
+        )
+        whisper = create_transcriber(
+            config.stt_backend,
+            api_key="bench",
+            base_url=f"{openai_server.url}/v1",
+            upload_format=config.upload_format,
+            local_model=config.stt_local_model,
+        )
+        handler = VoiceHandler(
+            vad_factory=lambda: VADSegmenter(0.5),
+            whisper=whisper,
+            gpt=GPTResponder("bench", "gpt-4o-mini", base_url=f"{openai_server.url}/v1"),
+            tts=tts,
+            player=VoicePlayer(),
+            history=DiscordHistoryStore(limit=50),
+            memory_factory=PermanentMemoryStore,
+            stream_replies=config.stream_replies,
+            barge_in=False,
+            end_of_utterance_seconds=config.end_of_utterance_seconds,
+            pipeline_sentences=config.sentence_fanout > 1,
+            history_token_budget=config.history_token_budget,
+        )
+        await handler.start_listening(guild, channel, vc)
+        state = handler.session_for(guild)
+
+        started = time.monotonic()
+        await asyncio.gather(
+            *(
+                _feed_speaker(
+                    vc,
+                    user_id,
+                    [corpus[(user_id + i) % len(corpus)] for i in range(config.utterances)],
+                    config,
+                )
+                for user_id in range(1, config.speakers + 1)
+            )
+        )
+        deadline = started + config.timeout_seconds
+        while time.monotonic() < deadline:
+            utterances = state.utterances
+            if (utterances is None or utterances.idle) and state.playback.depth == 0 and not vc.is_playing():
+                break
+            await asyncio.sleep(0.05)
+        wall = time.monotonic() - started
+        await handler.stop_listening(guild)
+        await tts.aclose()
+        if hasattr(whisper, "close"):
+            whisper.close()
+
+        replies = sum(1 for m in channel.messages if "] Bot: " in m.content)
+        endpoints = {name: asdict(stats) for name, stats in openai_server.stats.items()}
+        for index, server in enumerate(voicevox_servers):
+            suffix = f"#{index + 1}" if len(voicevox_servers) > 1 else ""
+            endpoints.update({f"{name}{suffix}": asdict(stats) for name, stats in server.stats.items()})
+    return BenchmarkResult(
+        utterances_fed=config.speakers * config.utterances,
+        replies=replies,
+        wall_seconds=wall,
+        throughput_per_second=replies / wall if wall > 0 else 0.0,
+        stages_ms=state.perf.summary(),
+        endpoints=endpoints,
+        upload_format=getattr(whisper, "upload_format", "pcm"),
+        stt_backend=whisper.name,
+        tts_connections=asdict(tts.stats),
+        prompt_cache=asdict(handler.prompt_cache_stats() or PromptCacheStats()),
+        request_policies={name: asdict(stats) for name, stats in handler.request_policy_stats().items()},
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--speakers", type=int, default=2)
+    parser.add_argument("--utterances", type=int, default=3, help="utterances per speaker")
+    parser.add_argument("--utterance-seconds", type=float, default=1.5)
+    parser.add_argument("--gap-seconds", type=float, default=1.0)
+    parser.add_argument("--end-of-utterance", type=float, default=0.8)
+    parser.add_argument("--stream", action="store_true", help="enable streaming replies")
+    parser.add_argument("--voicevox-48k", action="store_true", help="request 48 kHz stereo WAV from VOICEVOX")
+    parser.add_argument("--tts-cache", action="store_true", help="enable the in-memory TTS cache")
+    parser.add_argument("--voicevox-backends", type=int, default=1, help="number of fake VOICEVOX engines to balance across")
+    parser.add_argument("--sentence-fanout", type=int, default=1, help="synthesize reply sentences N at a time")
+    parser.add_argument(
+        "--stt-backend",
+        nargs="+",
+        choices=STT_BACKENDS,
+        default=["openai"],
+        help="transcription backend(s); several run one after another on the same utterances",
+    )
+    parser.add_argument("--stt-local-model", default="tiny", help="faster-whisper model for --stt-backend local")
+    parser.add_argument("--history-budget", type=int, default=0, help="history token budget (0 = send every line)")
+    parser.add_argument("--upload-format", choices=("auto", "ogg", "flac", "wav"), default="auto")
+    parser.add_argument("--uplink-kbps", type=float, default=0.0, help="simulated upload bandwidth (0 = unlimited)")
+    parser.add_argument("--realtime", action="store_true", help="feed packets every 20 ms instead of in bursts")
+    parser.add_argument("--corpus", type=Path, default=None, help="directory of .pcm/.wav utterances")
+    parser.add_argument("--whisper-latency", type=float, default=0.3)
+    parser.add_argument("--chat-latency", type=float, default=0.4)
+    parser.add_argument("--audio-query-latency", type=float, default=0.05)
+    parser.add_argument("--synthesis-latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tail-probability", type=float, default=0.0, help="share of requests that stall")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="extra seconds a stalled request takes")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(
+        speakers=args.speakers,
+        utterances=args.utterances,
+        utterance_seconds=args.utterance_seconds,
+        gap_seconds=args.gap_seconds,
+        end_of_utterance_seconds=args.end_of_utterance,
+        stream_replies=args.stream,
+        upload_format=args.upload_format,
+        voicevox_48k=args.voicevox_48k,
+        tts_cache=args.tts_cache,
+        voicevox_backends=args.voicevox_backends,
+        sentence_fanout=args.sentence_fanout,
+        stt_local_model=args.stt_local_model,
+        history_token_budget=args.history_budget,
+        realtime=args.realtime,
+        corpus_dir=args.corpus,
+        latency=LatencyProfile(
+            whisper=args.whisper_latency,
+            chat=args.chat_latency,
+            audio_query=args.audio_query_latency,
+            synthesis=args.synthesis_latency,
+            jitter=args.jitter,
+            tail_probability=args.tail_probability,
+            tail_seconds=args.tail_latency,
+            uplink_bytes_per_second=args.uplink_kbps * 1000 / 8,
+        ),
+    )
+    try:
+        results = [asyncio.run(run_benchmark(replace(config, stt_backend=backend))) for backend in args.stt_backend]
+    except RuntimeError as exc:
+        parser.error(str(exc))
+    if args.json:
+        payload = [asdict(result) for result in results]
+        print(json.dumps(payload[0] if len(payload) == 1 else payload, ensure_ascii=False, indent=2))
+    else:
+        print("\n\n".join(result.format_report() for result in results))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 
 import discord
 from discord.errors import Forbidden, HTTPException
 from discord.ext import commands
 
 from ai.gpt import GPTResponder
+from ai.request_policy import RequestPolicy
 from audio.player import VoicePlayer
+from audio.stt import LocalWhisperTranscriber, create_transcriber
 from audio.tts import VoiceVoxTTS
+from audio.tts_cache import TTSCache
 from audio.vad import VADSegmenter
-from audio.whisper import WhisperTranscriber
 from bot.commands import ControlCommands
 from bot.voice_handler import VoiceHandler
 from config import Settings
@@ -31,27 +35,83 @@ class DiscordAIBot(commands.Bot):
         self.settings = settings
 
         history_store = DiscordHistoryStore(limit=settings.history_limit)
-        permanent_memory_store = PermanentMemoryStore()
+        self.tts = VoiceVoxTTS(
+            list(settings.voicevox_urls),
+            settings.voicevox_speaker_id,
+            output_48k_stereo=settings.voicevox_output_48k,
+            max_connections=settings.voicevox_max_connections,
+            keepalive_seconds=settings.voicevox_keepalive_seconds,
+            health_interval=settings.voicevox_health_interval_seconds,
+            sentence_fanout=settings.tts_sentence_fanout,
+            sentence_gap_seconds=settings.tts_sentence_gap_seconds,
+            cache=(
+                TTSCache(
+                    memory_max_bytes=settings.tts_cache_memory_mb * 1024 * 1024,
+                    disk_dir=settings.tts_cache_dir or None,
+                    disk_max_bytes=settings.tts_cache_disk_mb * 1024 * 1024,
+                )
+                if settings.tts_cache
+                else None
+            ),
+        )
+        self.transcriber = create_transcriber(
+            settings.stt_backend,
+            api_key=settings.openai_api_key,
+            upload_format=settings.whisper_upload_format,
+            local_model=settings.stt_local_model,
+            local_compute_type=settings.stt_local_compute_type,
+            local_workers=settings.stt_local_workers,
+            policy=RequestPolicy(
+                "whisper", timeout=10.0, retries=settings.request_retries, hedge=settings.request_hedging
+            ),
+        )
         voice_handler = VoiceHandler(
-            vad=VADSegmenter(settings.vad_threshold),
-            whisper=WhisperTranscriber(settings.openai_api_key),
-            gpt=GPTResponder(settings.openai_api_key, settings.gpt_model),
-            tts=VoiceVoxTTS(settings.voicevox_url, settings.voicevox_speaker_id),
+            vad_factory=lambda: VADSegmenter(settings.vad_threshold),
+            whisper=self.transcriber,
+            gpt=GPTResponder(
+                settings.openai_api_key,
+                settings.gpt_model,
+                policy=RequestPolicy("gpt", timeout=20.0, retries=settings.request_retries, hedge=settings.request_hedging),
+            ),
+            tts=self.tts,
             player=VoicePlayer(),
             history=history_store,
-            permanent_memory=permanent_memory_store,
+            memory_factory=PermanentMemoryStore,
+            stream_replies=settings.stream_replies,
+            queue_max_depth=settings.utterance_queue_max,
+            queue_policy=settings.utterance_queue_policy,
+            stt_concurrency=settings.stt_concurrency,
+            reply_concurrency=settings.reply_concurrency,
+            barge_in=settings.barge_in,
+            barge_in_min_speech_ms=settings.barge_in_min_speech_ms,
+            playback_max_backlog=settings.playback_max_backlog,
+            playback_max_age_seconds=settings.playback_max_age_seconds,
+            end_of_utterance_seconds=settings.end_of_utterance_seconds,
+            end_of_utterance_min_seconds=settings.end_of_utterance_min_seconds,
+            end_of_utterance_max_seconds=settings.end_of_utterance_max_seconds,
+            adaptive_endpointing=settings.adaptive_endpointing,
+            max_utterance_seconds=settings.max_utterance_seconds,
+            lazy_opus_decode=settings.lazy_opus_decode,
+            trim_silence=settings.trim_silence,
+            pipeline_sentences=settings.tts_sentence_fanout > 1,
+            turn_deadline_seconds=settings.turn_deadline_seconds,
+            history_token_budget=settings.history_token_budget,
         )
         self.voice_handler = voice_handler
         self.history_store = history_store
-        self.permanent_memory_store = permanent_memory_store
+        self._warmup_tasks: list[asyncio.Task[None]] = []
 
     async def setup_hook(self) -> None:
+        if self.settings.tts_warmup:
+            # Runs alongside login; the first reply of the day should not pay for a cold engine.
+            self._warmup_tasks.append(asyncio.create_task(self._warm_up_tts()))
+        if isinstance(self.transcriber, LocalWhisperTranscriber):
+            self._warmup_tasks.append(asyncio.create_task(self._warm_up_stt(self.transcriber)))
         await self.add_cog(
             ControlCommands(
                 self,
                 self.voice_handler,
                 self.history_store,
-                self.permanent_memory_store,
                 self.settings.history_channel_id,
                 self.settings.permanent_memory_channel_id,
             )
@@ -83,6 +143,37 @@ class DiscordAIBot(commands.Bot):
             global_synced = await self.tree.sync()
             logger.info("Application commands synced globally (count=%s).", len(global_synced))
 
+    async def _warm_up_tts(self) -> None:
+        started = time.monotonic()
+        try:
+            await self.tts.warm_up(self.settings.tts_warmup_phrases)
+        except Exception as exc:
+            logger.warning("VOICEVOX warm-up failed: %s", exc)
+            return
+        logger.info(
+            "VOICEVOX warm-up finished in %.2fs (speaker=%s, phrases=%s)",
+            time.monotonic() - started,
+            self.settings.voicevox_speaker_id,
+            len(self.settings.tts_warmup_phrases),
+        )
+
+    async def _warm_up_stt(self, transcriber: LocalWhisperTranscriber) -> None:
+        started = time.monotonic()
+        try:
+            await transcriber.warm_up()
+        except Exception as exc:
+            logger.warning("Local STT model load failed: %s", exc)
+            return
+        logger.info("Local STT model %s loaded in %.2fs", self.settings.stt_local_model, time.monotonic() - started)
+
+    async def close(self) -> None:
+        for task in self._warmup_tasks:
+            task.cancel()
+        await self.tts.aclose()
+        if isinstance(self.transcriber, LocalWhisperTranscriber):
+            self.transcriber.close()
+        await super().close()
+
     async def on_ready(self) -> None:
         logger.info("Logged in as %s", self.user)
         if self.settings.discord_guild_id > 0:
@@ -92,21 +183,20 @@ class DiscordAIBot(commands.Bot):
                     "DISCORD_GUILD_ID=%s is not found. Check bot invite target guild.",
                     self.settings.discord_guild_id,
                 )
-        # 起動時に永続記憶をロード
+        # 起動時に永続記憶をサーバーごとにロード
         if self.settings.permanent_memory_channel_id:
             for guild in self.guilds:
                 channel = guild.get_channel(self.settings.permanent_memory_channel_id)
                 if isinstance(channel, discord.TextChannel):
                     try:
-                        await self.permanent_memory_store.load_from_channel(channel)
-                        logger.info("Permanent memory loaded from channel: %s", channel.id)
+                        await self.voice_handler.session_for(guild).memory.load_from_channel(channel)
+                        logger.info("Permanent memory loaded from channel: %s (guild=%s)", channel.id, guild.id)
                     except (Forbidden, HTTPException) as exc:
                         logger.warning(
                             "Permanent memory load skipped due to channel access/API issue: %s (channel=%s)",
                             exc,
                             channel.id,
                         )
-                    break
 
     async def on_message(self, message: discord.Message) -> None:
         if message.author.bot:
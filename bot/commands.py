@@ -8,7 +8,6 @@ from discord.ext import commands
 
 from bot.voice_handler import VoiceHandler
 from history.discord_history import DiscordHistoryStore
-from history.permanent_memory import PermanentMemoryStore
 
 
 class ControlCommands(commands.Cog):
@@ -21,14 +20,12 @@ class ControlCommands(commands.Cog):
         bot: commands.Bot,
         voice_handler: VoiceHandler,
         history_store: DiscordHistoryStore,
-        permanent_memory_store: PermanentMemoryStore,
         history_channel_id: int,
         permanent_memory_channel_id: int,
     ) -> None:
         self.bot = bot
         self.voice_handler = voice_handler
         self.history_store = history_store
-        self.permanent_memory_store = permanent_memory_store
         self.history_channel_id = history_channel_id
         self.permanent_memory_channel_id = permanent_memory_channel_id
 
@@ -70,6 +67,54 @@ class ControlCommands(commands.Cog):
             f"HISTORY_CHANNEL_ID={self.history_channel_id}\n"
             f"PERMANENT_MEMORY_CHANNEL_ID={self.permanent_memory_channel_id}"
         )
+        if interaction.guild:
+            text += (
+                f"\n発話キュー: {self.voice_handler.queue_depth(interaction.guild.id)}件"
+                f"\n再生キュー: {self.voice_handler.playback_depth(interaction.guild.id)}件"
+            )
+        await interaction.response.send_message(text, ephemeral=True)
+
+    @app_commands.command(name="perf", description="音声パイプラインの段階別レイテンシを表示する")
+    async def perf(self, interaction: discord.Interaction) -> None:
+        if interaction.guild is None:
+            await interaction.response.send_message("サーバー内で実行してください。", ephemeral=True)
+            return
+        table = self.voice_handler.perf_table(interaction.guild.id)
+        if not table:
+            await interaction.response.send_message("まだ計測データがありません。", ephemeral=True)
+            return
+        text = f"レイテンシ (ms)\n```\n{table}\n```"
+        stats = self.voice_handler.tts_connection_stats()
+        if stats and stats.requests:
+            text += (
+                f"\nVOICEVOX 接続: リクエスト {stats.requests} / 新規接続 {stats.new_connections}"
+                f" (再利用率 {stats.reuse_ratio:.0%})"
+            )
+        backends = self.voice_handler.tts_backends()
+        if len(backends) > 1:
+            for backend in backends:
+                text += (
+                    f"\nVOICEVOX {backend.url}: {'正常' if backend.healthy else '停止'}"
+                    f" / 処理中 {backend.in_flight} / 平均 {backend.ewma_seconds * 1000:.0f}ms"
+                    f" / 失敗 {backend.failures}"
+                )
+        for name, policy in self.voice_handler.request_policy_stats().items():
+            if policy.calls:
+                text += (
+                    f"\n{name}: ヘッジ率 {policy.hedge_rate:.0%} (勝ち {policy.hedge_wins})"
+                    f" / リトライ {policy.retries} / 短縮推定 {policy.saved_seconds * 1000:.0f}ms"
+                )
+        prompt_cache = self.voice_handler.prompt_cache_stats()
+        if prompt_cache and prompt_cache.calls:
+            text += (
+                f"\nGPT プロンプトキャッシュ: {prompt_cache.cached_tokens}/{prompt_cache.prompt_tokens} トークン"
+                f" ({prompt_cache.cached_ratio:.0%})"
+            )
+        for kind, cache in self.voice_handler.tts_cache_stats().items():
+            text += (
+                f"\nTTSキャッシュ[{kind}]: ヒット率 {cache.hit_rate:.0%}"
+                f" (メモリ {cache.memory_hits} / ディスク {cache.disk_hits} / ミス {cache.misses})"
+            )
         await interaction.response.send_message(text, ephemeral=True)
 
     @app_commands.command(name="setup_check", description="設定状態と権限を確認する")
@@ -115,7 +160,10 @@ class ControlCommands(commands.Cog):
     @app_commands.command(name="character", description="キャラクター設定を変更する")
     @app_commands.describe(name="キャラクター設定テキスト")
     async def character(self, interaction: discord.Interaction, name: str) -> None:
-        self.voice_handler.character_prompt = name.strip()
+        if interaction.guild is None:
+            await interaction.response.send_message("サーバー内で実行してください。", ephemeral=True)
+            return
+        self.voice_handler.session_for(interaction.guild).character_prompt = name.strip()
         await interaction.response.send_message("キャラクター設定を更新しました。", ephemeral=True)
 
     @app_commands.command(name="talk", description="テキスト入力で応答パイプラインを確認する")
@@ -151,6 +199,7 @@ class ControlCommands(commands.Cog):
         async for message in channel.history(limit=200):
             await message.delete()
             deleted += 1
+        self.voice_handler.reset_history_summary(channel.guild.id)
         await interaction.response.send_message(f"履歴を{deleted}件削除しました。", ephemeral=True)
 
     @remember.command(name="name", description="Botの名前を記憶させる")
@@ -160,7 +209,7 @@ class ControlCommands(commands.Cog):
         if channel is None:
             await interaction.response.send_message("永続記憶チャンネルが見つかりません。", ephemeral=True)
             return
-        await self.permanent_memory_store.remember_name(channel, name)
+        await self.voice_handler.session_for(channel.guild).memory.remember_name(channel, name)
         await interaction.response.send_message("Bot名を更新しました。", ephemeral=True)
 
     @remember.command(name="member", description="メンバーの読み方を記憶させる")
@@ -170,7 +219,7 @@ class ControlCommands(commands.Cog):
         if channel is None:
             await interaction.response.send_message("永続記憶チャンネルが見つかりません。", ephemeral=True)
             return
-        await self.permanent_memory_store.remember_member(channel, member.id, member.display_name, reading)
+        await self.voice_handler.session_for(channel.guild).memory.remember_member(channel, member.id, member.display_name, reading)
         await interaction.response.send_message("メンバー情報を更新しました。", ephemeral=True)
 
     @remember.command(name="note", description="自由メモを記憶させる")
@@ -180,12 +229,16 @@ class ControlCommands(commands.Cog):
         if channel is None:
             await interaction.response.send_message("永続記憶チャンネルが見つかりません。", ephemeral=True)
             return
-        await self.permanent_memory_store.remember_note(channel, note)
+        await self.voice_handler.session_for(channel.guild).memory.remember_note(channel, note)
         await interaction.response.send_message("メモを追加しました。", ephemeral=True)
 
     @memory.command(name="show", description="永続記憶を表示する")
     async def memory_show(self, interaction: discord.Interaction) -> None:
-        payload = json.dumps(self.permanent_memory_store.cache.to_dict(), ensure_ascii=False, indent=2)
+        if interaction.guild is None:
+            await interaction.response.send_message("サーバー内で実行してください。", ephemeral=True)
+            return
+        memory = self.voice_handler.session_for(interaction.guild).memory
+        payload = json.dumps(memory.cache.to_dict(), ensure_ascii=False, indent=2)
         await interaction.response.send_message(
             f"```json\n{payload}\n```",
             ephemeral=True,
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+
+from ai.history_budget import HistoryBudget
+from audio.playback_queue import PlaybackQueue
+from audio.vad import VADSegmenter
+from bot.perf import PerfRecorder
+from bot.utterance_queue import UtteranceQueue
+from bot.voice_receive import VoiceReceiveSession
+from history.permanent_memory import PermanentMemoryStore
+
+DEFAULT_CHARACTER_PROMPT = "タメ口でフレンドリーに話す。"
+
+
+@dataclass
+class GuildSession:
+    """Everything the voice pipeline keeps for one guild, so guilds never share state."""
+
+    guild_id: int
+    vad: VADSegmenter
+    memory: PermanentMemoryStore
+    playback: PlaybackQueue
+    character_prompt: str = DEFAULT_CHARACTER_PROMPT
+    playback_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    perf: PerfRecorder = field(default_factory=PerfRecorder)
+    receive: VoiceReceiveSession | None = None
+    utterances: UtteranceQueue | None = None
+    history_budget: HistoryBudget | None = None
+
+    @property
+    def listening(self) -> bool:
+        return self.receive is not None
+
+    async def stop(self) -> None:
+        if self.utterances:
+            await self.utterances.close()
+            self.utterances = None
+        await self.playback.close()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from perf.histogram import RollingHistogram
+
+# Stages of one voice turn, in pipeline order.
+STAGES = (
+    "capture",
+    "resample",
+    "vad",
+    "whisper",
+    "history_append",
+    "history_fetch",
+    "gpt",
+    "tts",
+    "playback_start",
+    "end_to_end",
+)
+
+
+class PerfRecorder:
+    """Per-guild stage latencies in milliseconds, plus running totals for non-latency counters."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._window = window
+        self._stages: dict[str, RollingHistogram] = {}
+        self.counters: dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        hist = self._stages.get(stage)
+        if hist is None:
+            hist = self._stages[stage] = RollingHistogram(self._window)
+        hist.add(max(0.0, seconds) * 1000.0)
+
+    def count(self, name: str, value: float = 1.0) -> None:
+        self.counters[name] = self.counters.get(name, 0.0) + value
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def summary(self) -> dict[str, tuple[float, float, float, int]]:
+        ordered = [s for s in STAGES if s in self._stages] + sorted(s for s in self._stages if s not in STAGES)
+        return {
+            stage: (
+                self._stages[stage].percentile(50),
+                self._stages[stage].percentile(95),
+                self._stages[stage].percentile(99),
+                self._stages[stage].count,
+            )
+            for stage in ordered
+        }
+
+    def format_table(self) -> str:
+        rows = self.summary()
+        if not rows:
+            return ""
+        lines = [f"{'stage':<15}{'p50':>8}{'p95':>8}{'p99':>8}{'n':>6}"]
+        for stage, (p50, p95, p99, count) in rows.items():
+            lines.append(f"{stage:<15}{p50:>8.0f}{p95:>8.0f}{p99:>8.0f}{count:>6}")
+        if self.counters:
+            lines.append("")
+            for name, value in self.counters.items():
+                lines.append(f"{name:<23}{value:>16.1f}")
+        return "\n".join(lines)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable
+
+from bot.voice_receive import CapturedUtterance
+
+QUEUE_POLICIES = ("drop_oldest", "drop_newest", "merge")
+
+
+@dataclass
+class _UtteranceJob:
+    utterance: CapturedUtterance
+    task: asyncio.Task[str] | None = None
+    started: bool = False
+
+
+class UtteranceQueue:
+    """Bounded per-guild work queue for captured utterances.
+
+    Transcription runs with ``stt_concurrency`` workers, transcripts are committed
+    strictly in capture order, and replies run with ``reply_concurrency`` slots.
+    ``reply(utterance, transcript, history_captured)`` calls ``history_captured()`` once
+    it has read the history it needs; the next transcript is committed only after that
+    (or once the reply ends), so a reply never sees the utterance that follows it.
+    """
+
+    def __init__(
+        self,
+        *,
+        transcribe: Callable[[CapturedUtterance], Awaitable[str]],
+        commit: Callable[[CapturedUtterance, str], Awaitable[None]],
+        reply: Callable[[CapturedUtterance, str, Callable[[], None]], Awaitable[object]],
+        max_depth: int = 8,
+        policy: str = "drop_oldest",
+        stt_concurrency: int = 2,
+        reply_concurrency: int = 1,
+    ) -> None:
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown utterance queue policy: {policy}")
+        self._logger = logging.getLogger(__name__)
+        self._transcribe = transcribe
+        self._commit = commit
+        self._reply = reply
+        self._max_depth = max(1, max_depth)
+        self._policy = policy
+        self._stt_slots = asyncio.Semaphore(max(1, stt_concurrency))
+        self._reply_slots = asyncio.Semaphore(max(1, reply_concurrency))
+        self._jobs: deque[_UtteranceJob] = deque()
+        self._reply_tasks: set[asyncio.Task[None]] = set()
+        self._has_jobs = asyncio.Event()
+        self._committing = False
+        self._worker: asyncio.Task[None] | None = None
+        self.dropped = 0
+        self.merged = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._jobs)
+
+    @property
+    def idle(self) -> bool:
+        return not self._jobs and not self._reply_tasks and not self._committing
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._commit_loop())
+
+    async def close(self) -> None:
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._jobs:
+            job = self._jobs.popleft()
+            if job.task:
+                job.task.cancel()
+        for task in list(self._reply_tasks):
+            task.cancel()
+        if self._reply_tasks:
+            await asyncio.gather(*self._reply_tasks, return_exceptions=True)
+
+    def cancel_replies(self) -> int:
+        """Cancel replies that are still generating or playing. Returns how many were cancelled."""
+        cancelled = 0
+        for task in list(self._reply_tasks):
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    def submit(self, utterance: CapturedUtterance) -> bool:
+        """Enqueue an utterance. Returns False when the overflow policy dropped it."""
+        if len(self._jobs) >= self._max_depth:
+            if self._policy == "merge" and self._merge(utterance):
+                return True
+            if self._policy == "drop_newest":
+                self.dropped += 1
+                self._logger.warning("Utterance queue full; dropped newest (user=%s)", utterance.display_name)
+                return False
+            self._drop_oldest()
+        job = _UtteranceJob(utterance=utterance)
+        job.task = asyncio.create_task(self._run_transcription(job))
+        self._jobs.append(job)
+        self._has_jobs.set()
+        return True
+
+    def _merge(self, utterance: CapturedUtterance) -> bool:
+        # Only jobs whose transcription has not started can still absorb more audio.
+        for job in reversed(self._jobs):
+            if job.utterance.user_id == utterance.user_id and not job.started:
+                both16 = bool(job.utterance.pcm16) and bool(utterance.pcm16)
+                job.utterance = replace(
+                    utterance,
+                    display_name=job.utterance.display_name,
+                    pcm=b"".join((job.utterance.pcm, utterance.pcm)),
+                    # A partial 16 kHz copy would not match pcm; let the handler convert instead.
+                    pcm16=b"".join((job.utterance.pcm16, utterance.pcm16)) if both16 else b"",
+                )
+                self.merged += 1
+                self._logger.info("Utterance merged into queued job (user=%s)", utterance.display_name)
+                return True
+        return False
+
+    def _drop_oldest(self) -> None:
+        oldest = self._jobs.popleft()
+        if oldest.task:
+            oldest.task.cancel()
+        self.dropped += 1
+        self._logger.warning("Utterance queue full; dropped oldest (user=%s)", oldest.utterance.display_name)
+
+    async def _run_transcription(self, job: _UtteranceJob) -> str:
+        async with self._stt_slots:
+            job.started = True
+            return await self._transcribe(job.utterance)
+
+    async def _commit_loop(self) -> None:
+        while True:
+            if not self._jobs:
+                self._has_jobs.clear()
+                await self._has_jobs.wait()
+                continue
+            self._committing = True
+            try:
+                await self._commit_next()
+            finally:
+                self._committing = False
+
+    async def _commit_next(self) -> None:
+        job = self._jobs[0]
+        assert job.task is not None
+        try:
+            transcript = await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            if not job.task.cancelled():
+                raise
+            transcript = ""
+        except Exception as exc:
+            self._logger.exception("Failed to transcribe utterance: %s", exc)
+            transcript = ""
+        # The job may already have been dropped by the overflow policy.
+        if self._jobs and self._jobs[0] is job:
+            self._jobs.popleft()
+        if not transcript:
+            return
+        try:
+            await self._commit(job.utterance, transcript)
+        except Exception as exc:
+            self._logger.exception("Failed to commit transcript: %s", exc)
+            return
+        await self._reply_slots.acquire()
+        captured = asyncio.Event()
+        task = asyncio.create_task(self._run_reply(job.utterance, transcript, captured.set))
+        self._reply_tasks.add(task)
+        task.add_done_callback(self._on_reply_done)
+        task.add_done_callback(lambda _: captured.set())
+        await captured.wait()
+
+    def _on_reply_done(self, task: asyncio.Task[None]) -> None:
+        # Released from the callback so a reply cancelled before it starts still frees its slot.
+        self._reply_tasks.discard(task)
+        self._reply_slots.release()
+
+    async def _run_reply(self, utterance: CapturedUtterance, transcript: str, captured: Callable[[], None]) -> None:
+        try:
+            await self._reply(utterance, transcript, captured)
+        except Exception as exc:
+            self._logger.exception("Failed to reply to utterance: %s", exc)
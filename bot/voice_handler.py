@@ -2,17 +2,29 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
+from contextlib import nullcontext
+from typing import Callable, ContextManager
 
 import discord
 import discord.ext.voice_recv as voice_recv
 
-from ai.gpt import GPTResponder
+from ai.gpt import GPTResponder, PromptCacheStats
+from ai.history_budget import HistoryBudget
+from ai.prompt import BOT_SPEAKER
+from ai.request_policy import PolicyStats, RequestPolicy, turn_deadline
+from audio.playback_queue import PlaybackQueue
 from audio.player import VoicePlayer
-from audio.tts import VoiceVoxTTS
+from audio.tts import ConnectionStats, VoiceVoxTTS
+from audio.tts_cache import CacheStats
 from audio.vad import VADSegmenter
-from audio.wav import pcm16k_mono_to_wav, pcm48k_stereo_to_pcm16k_mono
-from audio.whisper import WhisperTranscriber
-from bot.voice_receive import VoiceReceiveSession
+from audio.voicevox_pool import VoiceVoxBackend
+from audio.wav import pcm48k_stereo_to_pcm16k_mono, trim_silence
+from audio.stt import TranscriptionBackend
+from bot.guild_session import GuildSession
+from bot.perf import PerfRecorder
+from bot.utterance_queue import UtteranceQueue
+from bot.voice_receive import CapturedUtterance, VoiceReceiveSession
 from history.discord_history import DiscordHistoryStore
 from history.permanent_memory import PermanentMemoryStore
 
@@ -20,25 +32,87 @@ from history.permanent_memory import PermanentMemoryStore
 class VoiceHandler:
     def __init__(
         self,
-        vad: VADSegmenter,
-        whisper: WhisperTranscriber,
+        vad_factory: Callable[[], VADSegmenter],
+        whisper: TranscriptionBackend,
         gpt: GPTResponder,
         tts: VoiceVoxTTS,
         player: VoicePlayer,
         history: DiscordHistoryStore,
-        permanent_memory: PermanentMemoryStore,
+        memory_factory: Callable[[], PermanentMemoryStore],
+        *,
+        stream_replies: bool = False,
+        queue_max_depth: int = 8,
+        queue_policy: str = "drop_oldest",
+        stt_concurrency: int = 2,
+        reply_concurrency: int = 1,
+        barge_in: bool = True,
+        barge_in_min_speech_ms: int = 200,
+        playback_max_backlog: int = 8,
+        playback_max_age_seconds: float = 30.0,
+        end_of_utterance_seconds: float = 0.8,
+        end_of_utterance_min_seconds: float = 0.35,
+        end_of_utterance_max_seconds: float = 1.5,
+        adaptive_endpointing: bool = True,
+        max_utterance_seconds: float = 30.0,
+        lazy_opus_decode: bool = False,
+        trim_silence: bool = True,
+        pipeline_sentences: bool = False,
+        turn_deadline_seconds: float | None = None,
+        history_token_budget: int = 0,
     ) -> None:
         self._logger = logging.getLogger(__name__)
-        self._vad = vad
+        self._vad_factory = vad_factory
         self._whisper = whisper
         self._gpt = gpt
         self._tts = tts
         self._player = player
         self._history = history
-        self._permanent_memory = permanent_memory
-        self.character_prompt = "タメ口でフレンドリーに話す。"
-        self._playback_lock = asyncio.Lock()
-        self._sessions: dict[int, VoiceReceiveSession] = {}
+        self._memory_factory = memory_factory
+        self._stream_replies = stream_replies
+        self._queue_max_depth = queue_max_depth
+        self._queue_policy = queue_policy
+        self._stt_concurrency = stt_concurrency
+        self._reply_concurrency = reply_concurrency
+        self._barge_in = barge_in
+        self._barge_in_min_speech_ms = barge_in_min_speech_ms
+        self._playback_max_backlog = playback_max_backlog
+        self._playback_max_age_seconds = playback_max_age_seconds
+        self._end_of_utterance_seconds = end_of_utterance_seconds
+        self._end_of_utterance_min_seconds = end_of_utterance_min_seconds
+        self._end_of_utterance_max_seconds = end_of_utterance_max_seconds
+        self._adaptive_endpointing = adaptive_endpointing
+        self._max_utterance_seconds = max_utterance_seconds
+        self._lazy_opus_decode = lazy_opus_decode
+        self._trim_silence = trim_silence
+        self._pipeline_sentences = pipeline_sentences
+        self._turn_deadline_seconds = turn_deadline_seconds
+        self._history_token_budget = history_token_budget
+        self._guilds: dict[int, GuildSession] = {}
+
+    def session_for(self, guild: discord.Guild) -> GuildSession:
+        session = self._guilds.get(guild.id)
+        if session is None:
+            perf = PerfRecorder()
+            session = GuildSession(
+                guild_id=guild.id,
+                vad=self._vad_factory(),
+                memory=self._memory_factory(),
+                playback=PlaybackQueue(
+                    self._player,
+                    lambda: guild.voice_client,
+                    max_backlog=self._playback_max_backlog,
+                    max_age_seconds=self._playback_max_age_seconds,
+                    on_playback_start=lambda waited: perf.record("playback_start", waited),
+                ),
+                perf=perf,
+                history_budget=(
+                    HistoryBudget(self._gpt.summarize_history_async, budget_tokens=self._history_token_budget)
+                    if self._history_token_budget > 0
+                    else None
+                ),
+            )
+            self._guilds[guild.id] = session
+        return session
 
     async def join(self, interaction: discord.Interaction, history_channel: discord.TextChannel | None = None) -> str:
         if not interaction.user or not isinstance(interaction.user, discord.Member):
@@ -83,35 +157,139 @@ class VoiceHandler:
         history_channel: discord.TextChannel,
         voice_client: voice_recv.VoiceRecvClient | None = None,
     ) -> None:
-        if guild.id in self._sessions:
+        state = self.session_for(guild)
+        if state.listening:
             return
         vc = voice_client or guild.voice_client
         if not isinstance(vc, voice_recv.VoiceRecvClient):
             self._logger.warning("Voice client is not VoiceRecvClient; voice receive disabled.")
             return
 
-        async def _on_utterance(user_display_name: str, pcm48_stereo: bytes) -> None:
-            pcm16 = pcm48k_stereo_to_pcm16k_mono(pcm48_stereo)
-            wav = pcm16k_mono_to_wav(pcm16)
-            await self.process_user_audio(
-                guild=guild,
-                history_channel=history_channel,
-                user_display_name=user_display_name,
-                pcm16_mono=pcm16,
-                wav_bytes=wav,
-            )
+        async def _transcribe(utterance: CapturedUtterance) -> str:
+            if utterance.last_packet_at:
+                state.perf.record("capture", utterance.captured_at - utterance.last_packet_at)
+            with state.perf.time("resample"):
+                pcm16 = utterance.pcm16 or await asyncio.to_thread(pcm48k_stereo_to_pcm16k_mono, utterance.pcm)
+            with self._deadline(utterance.last_packet_at or utterance.captured_at):
+                return await self._transcribe(state, pcm16)
+
+        async def _commit(utterance: CapturedUtterance, transcript: str) -> None:
+            with state.perf.time("history_append"):
+                await self._history.append_line(history_channel, utterance.display_name, transcript)
+
+        async def _reply(utterance: CapturedUtterance, transcript: str, history_captured: Callable[[], None]) -> None:
+            turn_started = utterance.last_packet_at or utterance.captured_at
+            with self._deadline(turn_started):
+                await self._reply(
+                    guild, history_channel, utterance.display_name, transcript, turn_started, history_captured
+                )
+
+        state.utterances = UtteranceQueue(
+            transcribe=_transcribe,
+            commit=_commit,
+            reply=_reply,
+            max_depth=self._queue_max_depth,
+            policy=self._queue_policy,
+            stt_concurrency=self._stt_concurrency,
+            reply_concurrency=self._reply_concurrency,
+        )
+        state.utterances.start()
+        queue = state.utterances
+
+        def _on_utterance(utterance: CapturedUtterance) -> None:
+            queue.submit(utterance)
 
-        session = VoiceReceiveSession(guild=guild, on_utterance=_on_utterance)
-        await session.start(vc)
-        self._sessions[guild.id] = session
+        def _on_voice_activity(user_id: int) -> None:
+            self._handle_barge_in(guild, user_id)
+
+        receive = VoiceReceiveSession(
+            guild=guild,
+            on_utterance=_on_utterance,
+            on_voice_activity=_on_voice_activity if self._barge_in else None,
+            barge_in_min_speech_ms=self._barge_in_min_speech_ms,
+            silence_seconds=self._end_of_utterance_seconds,
+            min_silence_seconds=self._end_of_utterance_min_seconds,
+            max_silence_seconds=self._end_of_utterance_max_seconds,
+            adaptive=self._adaptive_endpointing,
+            packet_vad=self._vad_factory(),
+            max_utterance_seconds=self._max_utterance_seconds,
+            lazy_decode=self._lazy_opus_decode,
+        )
+        await receive.start(vc)
+        state.receive = receive
         self._logger.info("Voice receive started for guild=%s", guild.id)
 
     async def stop_listening(self, guild: discord.Guild) -> None:
-        session = self._sessions.pop(guild.id, None)
+        state = self._guilds.get(guild.id)
+        if state is None:
+            return
+        receive, state.receive = state.receive, None
         vc = guild.voice_client
-        if session and isinstance(vc, voice_recv.VoiceRecvClient):
-            await session.stop(vc)
+        if receive and isinstance(vc, voice_recv.VoiceRecvClient):
+            await receive.stop(vc)
             self._logger.info("Voice receive stopped for guild=%s", guild.id)
+        # Leaving must be quick: queued turns and unplayed replies are cancelled, not finished.
+        await state.stop()
+
+    def _handle_barge_in(self, guild: discord.Guild, user_id: int) -> None:
+        """A user started speaking: drop stale replies and cut the current playback."""
+        state = self.session_for(guild)
+        cancelled = state.utterances.cancel_replies() if state.utterances else 0
+        cleared = state.playback.clear()
+        voice_client = guild.voice_client
+        stopped = False
+        if voice_client and hasattr(voice_client, "is_playing") and voice_client.is_playing():
+            voice_client.stop()
+            stopped = True
+        if cancelled or cleared or stopped:
+            self._logger.info(
+                "Barge-in by user=%s in guild=%s (cancelled_replies=%s, cleared_queued=%s, stopped_playback=%s)",
+                user_id,
+                guild.id,
+                cancelled,
+                cleared,
+                stopped,
+            )
+
+    def queue_depth(self, guild_id: int) -> int:
+        state = self._guilds.get(guild_id)
+        return state.utterances.depth if state and state.utterances else 0
+
+    def playback_depth(self, guild_id: int) -> int:
+        state = self._guilds.get(guild_id)
+        return state.playback.depth if state else 0
+
+    def reset_history_summary(self, guild_id: int) -> None:
+        state = self._guilds.get(guild_id)
+        if state and state.history_budget:
+            state.history_budget.reset()
+
+    def perf_table(self, guild_id: int) -> str:
+        state = self._guilds.get(guild_id)
+        return state.perf.format_table() if state else ""
+
+    def tts_connection_stats(self) -> ConnectionStats | None:
+        return getattr(self._tts, "stats", None)
+
+    def tts_backends(self) -> list[VoiceVoxBackend]:
+        return list(getattr(self._tts, "backends", []))
+
+    def request_policy_stats(self) -> dict[str, PolicyStats]:
+        policies = (getattr(self._whisper, "policy", None), getattr(self._gpt, "policy", None))
+        return {p.name: p.stats for p in policies if isinstance(p, RequestPolicy)}
+
+    def prompt_cache_stats(self) -> PromptCacheStats | None:
+        stats = getattr(self._gpt, "prompt_cache", None)
+        return stats if isinstance(stats, PromptCacheStats) else None
+
+    def tts_cache_stats(self) -> dict[str, CacheStats]:
+        cache = getattr(self._tts, "cache", None)
+        return dict(cache.stats) if cache else {}
+
+    async def drain_playback(self, guild_id: int) -> None:
+        state = self._guilds.get(guild_id)
+        if state:
+            await state.playback.drain()
 
     async def process_user_audio(
         self,
@@ -122,41 +300,13 @@ class VoiceHandler:
         pcm16_mono: bytes,
         wav_bytes: bytes,
     ) -> str:
+        turn_started = time.monotonic()
         try:
-            if not self._vad.has_speech(pcm16_mono):
-                score = getattr(self._vad, "last_normalized", None)
-                self._logger.info(
-                    "VAD skipped audio as non-speech (bytes=%s, normalized=%s)",
-                    len(pcm16_mono),
-                    score,
-                )
-                return ""
-
-            transcript = self._whisper.transcribe_ja(wav_bytes)
-            if not transcript:
-                return ""
-
-            await self._history.append_line(history_channel, user_display_name, transcript)
-            history_lines = await self._history.fetch_recent_lines(history_channel)
-            memory_text = self._permanent_memory.cache.to_prompt_text()
-            reply = self._gpt.generate_reply(
-                user_name=user_display_name,
-                transcript=transcript,
-                history_lines=history_lines,
-                character_prompt=self.character_prompt,
-                permanent_memory_text=memory_text,
-            )
-            if not reply:
-                return ""
-
-            wav = self._tts.synthesize(reply)
-            async with self._playback_lock:
-                voice_client = guild.voice_client
-                is_playing = bool(voice_client and hasattr(voice_client, "is_playing") and voice_client.is_playing())
-                if voice_client and not is_playing:
-                    self._player.play_wav_bytes(guild.voice_client, wav)
-            await self._history.append_line(history_channel, "Bot", reply)
-            return reply
+            with self._deadline(turn_started):
+                transcript = await self._transcribe(self.session_for(guild), pcm16_mono, wav_bytes)
+                if not transcript:
+                    return ""
+                return await self._respond(guild, history_channel, user_display_name, transcript, turn_started)
         except Exception as exc:
             self._logger.exception("Failed to process user audio: %s", exc)
             return ""
@@ -172,27 +322,179 @@ class VoiceHandler:
         cleaned = text.strip()
         if not cleaned:
             return ""
+        turn_started = time.monotonic()
         try:
-            await self._history.append_line(history_channel, user_display_name, cleaned)
+            with self._deadline(turn_started):
+                return await self._respond(guild, history_channel, user_display_name, cleaned, turn_started)
+        except Exception as exc:
+            self._logger.exception("Failed to process user text: %s", exc)
+            return ""
+
+    def _deadline(self, turn_started: float) -> ContextManager[None]:
+        if self._turn_deadline_seconds is None:
+            return nullcontext()
+        return turn_deadline(turn_started + self._turn_deadline_seconds)
+
+    async def _transcribe(self, state: GuildSession, pcm16_mono: bytes, wav_bytes: bytes | None = None) -> str:
+        with state.perf.time("vad"):
+            vad_result = state.vad.analyze(pcm16_mono)
+        if not vad_result.has_speech:
+            self._logger.info(
+                "VAD skipped audio as non-speech (bytes=%s, speech_ratio=%.2f, level=%.4f, noise_floor=%.4f)",
+                len(pcm16_mono),
+                vad_result.speech_ratio,
+                vad_result.level,
+                getattr(state.vad, "noise_floor", 0.0),
+            )
+            return ""
+        if self._trim_silence:
+            trimmed, removed = trim_silence(pcm16_mono, vad_result.spans)
+            if removed > 0:
+                state.perf.count("trimmed_seconds", removed)
+                self._logger.debug("Trimmed %.2fs of non-speech before upload", removed)
+                pcm16_mono, wav_bytes = trimmed, None
+        with state.perf.time("whisper"):
+            if wav_bytes is None:
+                # Let the transcriber pick its (compressed) upload format.
+                return await self._whisper.transcribe_pcm16_ja_async(pcm16_mono)
+            return await self._whisper.transcribe_ja_async(wav_bytes)
+
+    async def _respond(
+        self,
+        guild: discord.Guild,
+        history_channel: discord.TextChannel,
+        user_display_name: str,
+        transcript: str,
+        turn_started: float,
+    ) -> str:
+        state = self.session_for(guild)
+        with state.perf.time("history_append"):
+            await self._history.append_line(history_channel, user_display_name, transcript)
+        return await self._reply(guild, history_channel, user_display_name, transcript, turn_started)
+
+    async def _reply(
+        self,
+        guild: discord.Guild,
+        history_channel: discord.TextChannel,
+        user_display_name: str,
+        transcript: str,
+        turn_started: float,
+        history_captured: Callable[[], None] | None = None,
+    ) -> str:
+        state = self.session_for(guild)
+        with state.perf.time("history_fetch"):
             history_lines = await self._history.fetch_recent_lines(history_channel)
-            memory_text = self._permanent_memory.cache.to_prompt_text()
-            reply = self._gpt.generate_reply(
-                user_name=user_display_name,
-                transcript=cleaned,
-                history_lines=history_lines,
-                character_prompt=self.character_prompt,
-                permanent_memory_text=memory_text,
+        if history_captured:
+            history_captured()
+        history_summary = None
+        if state.history_budget is not None:
+            history_summary, history_lines = state.history_budget.select(history_lines)
+        memory_text = state.memory.cache.to_prompt_text()
+        if self._stream_replies:
+            reply = await self._respond_streaming(
+                state, user_display_name, transcript, history_lines, memory_text, turn_started, history_summary
             )
+        else:
+            with state.perf.time("gpt"):
+                reply = await self._gpt.generate_reply_async(
+                    user_name=user_display_name,
+                    transcript=transcript,
+                    history_lines=history_lines,
+                    character_prompt=state.character_prompt,
+                    permanent_memory_text=memory_text,
+                    history_summary=history_summary,
+                )
             if not reply:
                 return ""
-            wav = self._tts.synthesize(reply)
-            async with self._playback_lock:
-                voice_client = guild.voice_client
-                is_playing = bool(voice_client and hasattr(voice_client, "is_playing") and voice_client.is_playing())
-                if voice_client and not is_playing:
-                    self._player.play_wav_bytes(guild.voice_client, wav)
-            await self._history.append_line(history_channel, "Bot", reply)
-            return reply
-        except Exception as exc:
-            self._logger.exception("Failed to process user text: %s", exc)
+            if self._pipeline_sentences:
+                await self._play_sentences(state, reply, turn_started)
+            else:
+                wav = await self._synthesize(state, reply)
+                async with state.playback_lock:
+                    state.playback.enqueue(wav)
+                state.perf.record("end_to_end", time.monotonic() - turn_started)
+        if not reply:
             return ""
+        with state.perf.time("history_append"):
+            await self._history.append_line(history_channel, BOT_SPEAKER, reply)
+        return reply
+
+    async def _synthesize(self, state: GuildSession, text: str) -> bytes:
+        with state.perf.time("tts"):
+            return await self._tts.synthesize_async(text)
+
+    async def _play_sentences(self, state: GuildSession, reply: str, turn_started: float) -> None:
+        """Queue each sentence clip as soon as it is synthesized, so playback starts before the rest is done."""
+        tts_started = time.perf_counter()
+        first = True
+        async with state.playback_lock:
+            queued = state.playback.open_reply()
+            try:
+                async for clip in self._tts.synthesize_sentences(reply):
+                    if first:
+                        # The tts stage is time to the first playable sentence here.
+                        state.perf.record("tts", time.perf_counter() - tts_started)
+                        state.perf.record("end_to_end", time.monotonic() - turn_started)
+                        first = False
+                    queued.add(clip)
+            finally:
+                queued.close()
+
+    async def _respond_streaming(
+        self,
+        state: GuildSession,
+        user_display_name: str,
+        transcript: str,
+        history_lines: list[str],
+        memory_text: str | None,
+        turn_started: float,
+        history_summary: str | None = None,
+    ) -> str:
+        """Stream GPT sentences into VOICEVOX and queue each clip as soon as it is ready."""
+        sentences: list[str] = []
+        clips: asyncio.Queue[asyncio.Task[bytes] | None] = asyncio.Queue()
+
+        async def _produce() -> None:
+            gpt_started = time.perf_counter()
+            try:
+                async for sentence in self._gpt.stream_reply_async(
+                    user_name=user_display_name,
+                    transcript=transcript,
+                    history_lines=history_lines,
+                    character_prompt=state.character_prompt,
+                    permanent_memory_text=memory_text,
+                    history_summary=history_summary,
+                ):
+                    if not sentences:
+                        # In streaming mode the GPT stage is time to the first complete sentence.
+                        state.perf.record("gpt", time.perf_counter() - gpt_started)
+                    sentences.append(sentence)
+                    # Synthesis starts right away so the next clip is ready while the previous one plays.
+                    await clips.put(asyncio.create_task(self._synthesize(state, sentence)))
+            finally:
+                await clips.put(None)
+
+        producer = asyncio.create_task(_produce())
+        pending: list[asyncio.Task[bytes]] = []
+        try:
+            # Holding the lock keeps replies from interleaving while this one is still synthesizing.
+            async with state.playback_lock:
+                queued = state.playback.open_reply()
+                try:
+                    while (task := await clips.get()) is not None:
+                        pending.append(task)
+                        queued.add(await task)
+                        if len(pending) == 1:
+                            state.perf.record("end_to_end", time.monotonic() - turn_started)
+                finally:
+                    queued.close()
+            await producer
+        finally:
+            producer.cancel()
+            for task in pending:
+                task.cancel()
+            while not clips.empty():
+                leftover = clips.get_nowait()
+                if leftover is not None:
+                    leftover.cancel()
+        return "".join(sentences)
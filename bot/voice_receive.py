@@ -1,111 +1,394 @@
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
 import logging
+import math
+import threading
 import time
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Callable
+from typing import Any, Awaitable, Callable
 
 import discord
 import discord.ext.voice_recv as voice_recv
+from discord.ext.voice_recv import rtp
+import numpy as np
+
+from audio.vad import VADSegmenter
+from audio.wav import StereoToMonoResampler
+
+# One 20 ms Opus frame decoded to 48 kHz stereo s16le.
+FRAME_BYTES = 3840
+SILENT_FRAME = bytes(FRAME_BYTES)
+
+
+@dataclass
+class CapturedUtterance:
+    user_id: int
+    display_name: str
+    pcm: bytes | memoryview
+    # 16 kHz mono copy converted while the utterance was being received; empty if not available.
+    pcm16: bytes | memoryview = b""
+    captured_at: float = field(default_factory=time.monotonic)
+    # Monotonic time of the last speech packet; the gap to captured_at is the end-of-speech wait.
+    last_packet_at: float = 0.0
 
 
 @dataclass
 class UserAudioBuffer:
-    chunks: list[bytes] = field(default_factory=list)
+    pcm: bytearray = field(default_factory=bytearray)
+    # 20 ms packets received for the open utterance (decoded or still Opus).
+    frames: int = 0
     last_seen: float = 0.0
+    last_speech: float = 0.0
     display_name: str = ""
+    # Recent pauses inside this speaker's utterances, used to adapt the endpoint delay.
+    pauses: deque[float] = field(default_factory=lambda: deque(maxlen=20))
+    timer: asyncio.TimerHandle | None = None
+    # Set on the receive thread when the endpoint timer is requested, so a burst of packets
+    # that arrives before the loop runs ``_arm`` still counts as one utterance start.
+    armed: bool = False
+    # Consecutive speech packets, and whether this utterance already reported voice activity.
+    speech_run: int = 0
+    activity_sent: bool = False
+    resampler: StereoToMonoResampler = field(default_factory=StereoToMonoResampler)
+    pcm16: bytearray = field(default_factory=bytearray)
+    # Lazy decoding: Opus packets not decoded yet, and this speaker's decoder.
+    opus: list[bytes] = field(default_factory=list)
+    decoder: Any = None
+
+    def append(self, pcm: bytes) -> None:
+        self.pcm += pcm
+        self.pcm16 += self.resampler.process(pcm)
 
-    def append(self, pcm: bytes, display_name: str) -> None:
-        self.chunks.append(pcm)
-        self.last_seen = time.monotonic()
-        if display_name:
-            self.display_name = display_name
+    def flush(self) -> memoryview:
+        # Hand the filled bytearray over as a view and start a fresh one: no join, no copy.
+        data, self.pcm = self.pcm, bytearray()
+        return memoryview(data)
 
-    def flush(self) -> bytes:
-        if not self.chunks:
-            return b""
-        data = b"".join(self.chunks)
-        self.chunks.clear()
-        return data
+    def flush_pcm16(self) -> memoryview:
+        self.pcm16 += self.resampler.flush()
+        data, self.pcm16 = self.pcm16, bytearray()
+        return memoryview(data)
 
 
 class VoiceReceiveSession:
-    """Collect per-user PCM and emit utterances after short silence."""
+    """Collect per-user PCM and emit an utterance once the speaker has paused.
+
+    Endpointing is event driven: each speech packet pushes back a per-user timer,
+    silent packets do not, and the timer closes the utterance when it fires. With
+    ``adaptive`` the delay follows each speaker's own pause pattern.
+
+    Utterances longer than ``max_utterance_seconds`` are cut at the cap, and buffers
+    of users who left or stayed quiet for ``idle_evict_seconds`` are dropped.
+
+    ``on_voice_activity`` fires once per utterance, after ``barge_in_min_speech_ms`` of
+    uninterrupted speech, so a cough or a click does not cut off the bot.
+
+    With ``lazy_decode`` the sink receives raw Opus. Speech is judged from the packet
+    size and the silence frame marker, and only packets that belong to an utterance
+    are decoded, in batches on a single worker thread so per-user order is kept.
+    """
 
     def __init__(
         self,
         *,
         guild: discord.Guild,
-        on_utterance: Callable[[str, bytes], "asyncio.Future[None] | asyncio.Task[None] | None"],
+        on_utterance: Callable[[CapturedUtterance], Awaitable[None] | None],
+        on_voice_activity: Callable[[int], None] | None = None,
+        barge_in_min_speech_ms: int = 200,
         silence_seconds: float = 0.8,
+        min_silence_seconds: float = 0.35,
+        max_silence_seconds: float = 1.5,
+        adaptive: bool = True,
+        packet_vad: VADSegmenter | None = None,
         min_pcm_bytes: int = 9600,
+        max_utterance_seconds: float = 30.0,
+        idle_evict_seconds: float = 300.0,
+        lazy_decode: bool = False,
+        min_speech_opus_bytes: int = 32,
+        decode_batch_packets: int = 10,
+        decoder_factory: Callable[[], Any] | None = None,
     ) -> None:
         self._logger = logging.getLogger(__name__)
         self.guild = guild
         self._on_utterance = on_utterance
+        self._on_voice_activity = on_voice_activity
+        self._barge_in_min_packets = max(1, barge_in_min_speech_ms // 20)
         self._silence_seconds = silence_seconds
+        self._min_silence_seconds = min(min_silence_seconds, silence_seconds)
+        self._max_silence_seconds = max(max_silence_seconds, silence_seconds)
+        self._adaptive = adaptive
+        self._packet_vad = packet_vad
         self._min_pcm_bytes = min_pcm_bytes
+        # 48 kHz * 2 channels * 2 bytes per second.
+        self._max_pcm_bytes = max(min_pcm_bytes, int(max_utterance_seconds * 192000))
+        self._idle_evict_seconds = idle_evict_seconds
+        self._lazy_decode = lazy_decode
+        self._min_speech_opus_bytes = min_speech_opus_bytes
+        self._decode_batch_packets = max(1, decode_batch_packets)
+        self._decoder_factory = decoder_factory or discord.opus.Decoder
+        self._decode_pool: concurrent.futures.ThreadPoolExecutor | None = None
         self._buffers: dict[int, UserAudioBuffer] = {}
+        self._lock = threading.Lock()
         self._sink: voice_recv.BasicSink | None = None
-        self._loop_task: asyncio.Task[None] | None = None
+        self._ready: asyncio.Queue[CapturedUtterance] = asyncio.Queue()
+        self._emit_task: asyncio.Task[None] | None = None
         self._running = False
+        self._loop: asyncio.AbstractEventLoop | None = None
 
     async def start(self, voice_client: voice_recv.VoiceRecvClient) -> None:
         self._running = True
-        self._sink = voice_recv.BasicSink(self._on_voice_data, decode=True)
+        self._loop = asyncio.get_running_loop()
+        if self._lazy_decode:
+            self._decode_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="opus-decode")
+        self._sink = _ReceiveSink(self, decode=not self._lazy_decode)
         voice_client.listen(self._sink)
-        self._loop_task = asyncio.create_task(self._flush_loop())
+        self._emit_task = asyncio.create_task(self._emit_loop())
         self._logger.info("Voice receive session started (guild=%s)", self.guild.id)
 
-    async def stop(self, voice_client: voice_recv.VoiceRecvClient) -> None:
+    async def stop(self, voice_client: voice_recv.VoiceRecvClient, *, handoff_timeout: float = 1.0) -> None:
+        """Stop receiving and hand the open utterances over, waiting at most ``handoff_timeout`` for that."""
         self._running = False
-        if self._loop_task:
-            self._loop_task.cancel()
+        if voice_client.is_listening():
+            voice_client.stop_listening()
+        with self._lock:
+            for user_id, buf in self._buffers.items():
+                if buf.timer:
+                    buf.timer.cancel()
+                    buf.timer = None
+                self._close_utterance(user_id, buf)
+            self._buffers.clear()
+        if self._decode_pool:
+            await asyncio.to_thread(self._decode_pool.shutdown, wait=True)
+            self._decode_pool = None
+        # Let the hand-offs scheduled above reach the queue before waiting on it.
+        await asyncio.sleep(0)
+        if self._emit_task:
+            try:
+                await asyncio.wait_for(self._ready.join(), handoff_timeout)
+            except asyncio.TimeoutError:
+                self._logger.warning("Utterance hand-off did not finish within %.1fs; dropping the rest", handoff_timeout)
+            self._emit_task.cancel()
             try:
-                await self._loop_task
+                await self._emit_task
             except asyncio.CancelledError:
                 pass
-        if voice_client.is_listening():
-            voice_client.stop_listening()
-        await self._flush_all()
         self._logger.info("Voice receive session stopped (guild=%s)", self.guild.id)
 
+    def endpoint_delay(self, buf: UserAudioBuffer) -> float:
+        """Seconds of silence after which this speaker's utterance is considered finished."""
+        if not self._adaptive or len(buf.pauses) < 3:
+            return self._silence_seconds
+        ordered = sorted(buf.pauses)
+        p90 = ordered[max(0, math.ceil(0.9 * len(ordered)) - 1)]
+        # Wait a little longer than the speaker's usual mid-sentence pause.
+        return min(self._max_silence_seconds, max(self._min_silence_seconds, p90 * 1.2 + 0.15))
+
     def _on_voice_data(self, user: discord.abc.User | None, data: voice_recv.VoiceData) -> None:
-        if user is None or user.bot:
-            return
-        if not data.pcm:
+        # Called on the voice receive thread.
+        if user is None or user.bot or not self._loop:
             return
-        buf = self._buffers.setdefault(user.id, UserAudioBuffer())
+        if self._lazy_decode:
+            payload = data.opus or rtp.OPUS_SILENCE
+            is_speech = self._is_speech_opus(payload)
+        else:
+            if not data.pcm:
+                return
+            payload = data.pcm
+            is_speech = self._is_speech_packet(payload)
         display_name = getattr(user, "display_name", "") or getattr(user, "name", "")
-        buf.append(data.pcm, display_name)
-
-    async def _flush_loop(self) -> None:
-        while self._running:
-            await asyncio.sleep(0.2)
-            now = time.monotonic()
-            for user_id, buf in list(self._buffers.items()):
-                if not buf.chunks:
-                    continue
-                if now - buf.last_seen < self._silence_seconds:
-                    continue
-                pcm = buf.flush()
-                if len(pcm) < self._min_pcm_bytes:
-                    continue
-                member = self.guild.get_member(user_id)
-                speaker_name = buf.display_name or (member.display_name if member else f"user-{user_id}")
-                self._logger.info("Voice utterance captured user=%s bytes=%s", speaker_name, len(pcm))
-                result = self._on_utterance(speaker_name, pcm)
-                if asyncio.iscoroutine(result):
-                    asyncio.create_task(result)
+        now = time.monotonic()
+        with self._lock:
+            buf = self._buffers.setdefault(user.id, UserAudioBuffer())
+            if not buf.frames and not is_speech:
+                # Leading silence/comfort noise does not open an utterance.
+                return
+            buf.last_seen = now
+            if display_name:
+                buf.display_name = display_name
+            buf.frames += 1
+            if self._lazy_decode:
+                buf.opus.append(payload)
+                if len(buf.opus) >= self._decode_batch_packets:
+                    batch, buf.opus = buf.opus, []
+                    self._submit_decode(self._decode_into, buf, batch)
+            else:
+                buf.append(payload)
+            if buf.frames * FRAME_BYTES >= self._max_pcm_bytes:
+                # Cap reached: hand the audio off now and keep the endpoint timer for the rest.
+                self._close_utterance(user.id, buf)
+            if not is_speech:
+                buf.speech_run = 0
+                return
+            if buf.last_speech and buf.armed:
+                gap = now - buf.last_speech
+                if gap >= 0.1:
+                    buf.pauses.append(gap)
+            starts_utterance = not buf.armed
+            buf.armed = True
+            buf.last_speech = now
+            buf.speech_run += 1
+            report_activity = (
+                self._on_voice_activity is not None
+                and not buf.activity_sent
+                and buf.speech_run >= self._barge_in_min_packets
+            )
+            if report_activity:
+                buf.activity_sent = True
+        if starts_utterance:
+            self._loop.call_soon_threadsafe(self._arm, user.id)
+        if report_activity:
+            assert self._on_voice_activity is not None
+            self._loop.call_soon_threadsafe(self._on_voice_activity, user.id)
+
+    def _is_speech_packet(self, pcm48_stereo: bytes) -> bool:
+        if self._packet_vad is None:
+            return bool(pcm48_stereo.strip(b"\0"))
+        # Left channel, every third sample: a cheap 16 kHz view that is good enough for an energy decision.
+        view = np.frombuffer(pcm48_stereo, dtype="<i2", count=len(pcm48_stereo) // 2)[0::6]
+        return self._packet_vad.analyze(view.tobytes()).has_speech
+
+    def _is_speech_opus(self, payload: bytes) -> bool:
+        # DTX/comfort-noise frames are a few bytes; voiced frames are typically 60+ bytes.
+        return payload != rtp.OPUS_SILENCE and len(payload) >= self._min_speech_opus_bytes
+
+    def _arm(self, user_id: int) -> None:
+        with self._lock:
+            buf = self._buffers.get(user_id)
+            if buf is None or buf.timer is not None or not self._loop:
+                return
+            buf.timer = self._loop.call_later(self.endpoint_delay(buf), self._on_endpoint, user_id)
+
+    def _on_endpoint(self, user_id: int) -> None:
+        assert self._loop is not None
+        with self._lock:
+            buf = self._buffers.get(user_id)
+            if buf is None:
+                return
+            remaining = buf.last_speech + self.endpoint_delay(buf) - time.monotonic()
+            if remaining > 0:
+                # More speech arrived since the timer was armed; wait for the rest of the pause.
+                buf.timer = self._loop.call_later(remaining, self._on_endpoint, user_id)
+                return
+            buf.timer = None
+            buf.armed = buf.activity_sent = False
+            buf.speech_run = 0
+            self._close_utterance(user_id, buf)
+            self._evict_idle(time.monotonic())
 
-    async def _flush_all(self) -> None:
-        for user_id, buf in list(self._buffers.items()):
-            pcm = buf.flush()
-            if len(pcm) < self._min_pcm_bytes:
+    def _on_member_left(self, user_id: int) -> None:
+        with self._lock:
+            buf = self._buffers.pop(user_id, None)
+            if buf is None:
+                return
+            if buf.timer:
+                buf.timer.cancel()
+            self._close_utterance(user_id, buf)
+
+    def _evict_idle(self, now: float) -> None:
+        # Caller holds self._lock.
+        idle = [
+            user_id
+            for user_id, buf in self._buffers.items()
+            if buf.timer is None and not buf.frames and now - buf.last_seen >= self._idle_evict_seconds
+        ]
+        for user_id in idle:
+            del self._buffers[user_id]
+
+    @property
+    def buffered_users(self) -> int:
+        return len(self._buffers)
+
+    def _close_utterance(self, user_id: int, buf: UserAudioBuffer) -> None:
+        # Caller holds self._lock; may run on the receive thread or the event loop.
+        if not buf.frames:
+            return
+        buf.frames = 0
+        name, last_speech = buf.display_name, buf.last_speech
+        if self._lazy_decode:
+            batch, buf.opus = buf.opus, []
+            self._submit_decode(self._finish_lazy, user_id, buf, batch, name, last_speech)
+            return
+        self._deliver(self._build_utterance(user_id, buf, name, last_speech))
+
+    def _build_utterance(
+        self, user_id: int, buf: UserAudioBuffer, name: str, last_speech: float
+    ) -> CapturedUtterance | None:
+        pcm = buf.flush()
+        pcm16 = buf.flush_pcm16()
+        if len(pcm) < self._min_pcm_bytes:
+            return None
+        member = self.guild.get_member(user_id)
+        speaker_name = name or (member.display_name if member else f"user-{user_id}")
+        self._logger.info("Voice utterance captured user=%s bytes=%s", speaker_name, len(pcm))
+        return CapturedUtterance(
+            user_id=user_id, display_name=speaker_name, pcm=pcm, pcm16=pcm16, last_packet_at=last_speech
+        )
+
+    def _deliver(self, utterance: CapturedUtterance | None) -> None:
+        if utterance and self._loop:
+            self._loop.call_soon_threadsafe(self._ready.put_nowait, utterance)
+
+    def _submit_decode(self, fn: Callable[..., None], *args: Any) -> None:
+        if self._decode_pool is None:
+            return
+        try:
+            future = self._decode_pool.submit(fn, *args)
+        except RuntimeError:
+            # Pool already shut down by stop(); late packets are dropped.
+            return
+        future.add_done_callback(self._log_decode_error)
+
+    def _log_decode_error(self, future: concurrent.futures.Future[None]) -> None:
+        exc = future.exception()
+        if exc is not None:
+            self._logger.error("Opus decode job failed: %s", exc, exc_info=exc)
+
+    def _decode_into(self, buf: UserAudioBuffer, packets: list[bytes]) -> None:
+        # Decode pool thread: the only place buf.pcm/pcm16 are touched in lazy mode.
+        if buf.decoder is None:
+            buf.decoder = self._decoder_factory()
+        for packet in packets:
+            if packet == rtp.OPUS_SILENCE:
+                buf.append(SILENT_FRAME)
                 continue
-            member = self.guild.get_member(user_id)
-            speaker_name = buf.display_name or (member.display_name if member else f"user-{user_id}")
-            result = self._on_utterance(speaker_name, pcm)
-            if asyncio.iscoroutine(result):
-                await result
+            try:
+                buf.append(buf.decoder.decode(packet, fec=False))
+            except discord.opus.OpusError as exc:
+                self._logger.debug("Dropping undecodable Opus packet: %s", exc)
+                buf.append(SILENT_FRAME)
+
+    def _finish_lazy(
+        self, user_id: int, buf: UserAudioBuffer, packets: list[bytes], name: str, last_speech: float
+    ) -> None:
+        self._decode_into(buf, packets)
+        self._deliver(self._build_utterance(user_id, buf, name, last_speech))
+
+    async def _emit_loop(self) -> None:
+        while True:
+            utterance = await self._ready.get()
+            try:
+                # The handler only enqueues (its overflow policy drops when full); coroutine callbacks are awaited.
+                result = self._on_utterance(utterance)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as exc:
+                self._logger.exception("Failed to hand off utterance: %s", exc)
+            finally:
+                self._ready.task_done()
+
+
+class _ReceiveSink(voice_recv.BasicSink):
+    """BasicSink that also tells the session when a member leaves the channel."""
+
+    def __init__(self, session: VoiceReceiveSession, *, decode: bool) -> None:
+        super().__init__(session._on_voice_data, decode=decode)
+        self._session = session
+
+    @voice_recv.AudioSink.listener()
+    def on_voice_member_disconnect(self, member: discord.Member, ssrc: int | None) -> None:
+        loop = self._session._loop
+        if loop:
+            loop.call_soon_threadsafe(self._session._on_member_left, member.id)
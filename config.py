@@ -30,6 +30,20 @@ def _env_float(name: str, default: float) -> float:
     return float(value)
 
 
+def _env_list(name: str, default: list[str]) -> list[str]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
 @dataclass(frozen=True)
 class Settings:
     discord_token: str
@@ -42,6 +56,44 @@ class Settings:
     vad_threshold: float
     gpt_model: str
     discord_guild_id: int
+    stream_replies: bool
+    utterance_queue_max: int
+    utterance_queue_policy: str
+    stt_concurrency: int
+    reply_concurrency: int
+    barge_in: bool
+    barge_in_min_speech_ms: int
+    playback_max_backlog: int
+    playback_max_age_seconds: float
+    end_of_utterance_seconds: float
+    end_of_utterance_min_seconds: float
+    end_of_utterance_max_seconds: float
+    adaptive_endpointing: bool
+    max_utterance_seconds: float
+    lazy_opus_decode: bool
+    trim_silence: bool
+    whisper_upload_format: str
+    stt_backend: str
+    stt_local_model: str
+    stt_local_compute_type: str
+    stt_local_workers: int
+    voicevox_output_48k: bool
+    voicevox_max_connections: int
+    voicevox_keepalive_seconds: float
+    voicevox_urls: tuple[str, ...]
+    voicevox_health_interval_seconds: float
+    tts_sentence_fanout: int
+    tts_sentence_gap_seconds: float
+    tts_warmup: bool
+    tts_warmup_phrases: tuple[str, ...]
+    turn_deadline_seconds: float
+    request_hedging: bool
+    request_retries: int
+    history_token_budget: int
+    tts_cache: bool
+    tts_cache_memory_mb: int
+    tts_cache_dir: str
+    tts_cache_disk_mb: int
 
     @classmethod
     def from_env(cls) -> "Settings":
@@ -56,6 +108,47 @@ class Settings:
             vad_threshold=_env_float("VAD_THRESHOLD", 0.5),
             gpt_model=_env_str("GPT_MODEL", "gpt-4o-mini"),
             discord_guild_id=_env_int("DISCORD_GUILD_ID", 0),
+            stream_replies=_env_bool("STREAM_REPLIES", False),
+            utterance_queue_max=_env_int("UTTERANCE_QUEUE_MAX", 8),
+            utterance_queue_policy=_env_str("UTTERANCE_QUEUE_POLICY", "drop_oldest"),
+            stt_concurrency=_env_int("STT_CONCURRENCY", 2),
+            reply_concurrency=_env_int("REPLY_CONCURRENCY", 1),
+            barge_in=_env_bool("BARGE_IN", True),
+            barge_in_min_speech_ms=_env_int("BARGE_IN_MIN_SPEECH_MS", 200),
+            playback_max_backlog=_env_int("PLAYBACK_MAX_BACKLOG", 8),
+            playback_max_age_seconds=_env_float("PLAYBACK_MAX_AGE_SECONDS", 30.0),
+            end_of_utterance_seconds=_env_float("END_OF_UTTERANCE_SECONDS", 0.8),
+            end_of_utterance_min_seconds=_env_float("END_OF_UTTERANCE_MIN_SECONDS", 0.35),
+            end_of_utterance_max_seconds=_env_float("END_OF_UTTERANCE_MAX_SECONDS", 1.5),
+            adaptive_endpointing=_env_bool("ADAPTIVE_ENDPOINTING", True),
+            max_utterance_seconds=_env_float("MAX_UTTERANCE_SECONDS", 30.0),
+            lazy_opus_decode=_env_bool("LAZY_OPUS_DECODE", False),
+            trim_silence=_env_bool("TRIM_SILENCE", True),
+            whisper_upload_format=_env_str("WHISPER_UPLOAD_FORMAT", "auto"),
+            stt_backend=_env_str("STT_BACKEND", "openai"),
+            stt_local_model=_env_str("STT_LOCAL_MODEL", "small"),
+            stt_local_compute_type=_env_str("STT_LOCAL_COMPUTE_TYPE", "int8"),
+            stt_local_workers=_env_int("STT_LOCAL_WORKERS", 2),
+            voicevox_output_48k=_env_bool("VOICEVOX_OUTPUT_48K", False),
+            voicevox_max_connections=_env_int("VOICEVOX_MAX_CONNECTIONS", 10),
+            voicevox_keepalive_seconds=_env_float("VOICEVOX_KEEPALIVE_SECONDS", 30.0),
+            # Several engines spread TTS load; a single VOICEVOX_URL stays the default.
+            voicevox_urls=tuple(
+                _env_list("VOICEVOX_URLS", []) or [_env_str("VOICEVOX_URL", "http://localhost:50021")]
+            ),
+            voicevox_health_interval_seconds=_env_float("VOICEVOX_HEALTH_INTERVAL_SECONDS", 15.0),
+            tts_sentence_fanout=_env_int("TTS_SENTENCE_FANOUT", 3),
+            tts_sentence_gap_seconds=_env_float("TTS_SENTENCE_GAP_SECONDS", 0.1),
+            tts_warmup=_env_bool("TTS_WARMUP", True),
+            tts_warmup_phrases=tuple(_env_list("TTS_WARMUP_PHRASES", ["こんにちは！", "うんうん。", "なるほど。"])),
+            turn_deadline_seconds=_env_float("TURN_DEADLINE_SECONDS", 15.0),
+            request_hedging=_env_bool("REQUEST_HEDGING", True),
+            request_retries=_env_int("REQUEST_RETRIES", 2),
+            history_token_budget=_env_int("HISTORY_TOKEN_BUDGET", 1200),
+            tts_cache=_env_bool("TTS_CACHE", True),
+            tts_cache_memory_mb=_env_int("TTS_CACHE_MEMORY_MB", 32),
+            tts_cache_dir=_env_str("TTS_CACHE_DIR", ".cache/tts"),
+            tts_cache_disk_mb=_env_int("TTS_CACHE_DISK_MB", 256),
         )
 
     def validation_errors(self) -> list[str]:
@@ -70,8 +163,46 @@ class Settings:
             errors.append("PERMANENT_MEMORY_CHANNEL_ID は正の整数で設定してください。")
         if not self.voicevox_url.startswith(("http://", "https://")):
             errors.append("VOICEVOX_URL は http(s):// から始まる必要があります。")
+        if any(not url.startswith(("http://", "https://")) for url in self.voicevox_urls):
+            errors.append("VOICEVOX_URLS はすべて http(s):// から始まる必要があります。")
         if self.history_limit <= 0:
             errors.append("HISTORY_LIMIT は正の整数で設定してください。")
         if not (0.0 <= self.vad_threshold <= 1.0):
             errors.append("VAD_THRESHOLD は 0.0〜1.0 の範囲で設定してください。")
+        if self.utterance_queue_max <= 0:
+            errors.append("UTTERANCE_QUEUE_MAX は正の整数で設定してください。")
+        if self.utterance_queue_policy not in ("drop_oldest", "drop_newest", "merge"):
+            errors.append("UTTERANCE_QUEUE_POLICY は drop_oldest / drop_newest / merge のいずれかで設定してください。")
+        if self.stt_concurrency <= 0 or self.reply_concurrency <= 0:
+            errors.append("STT_CONCURRENCY / REPLY_CONCURRENCY は正の整数で設定してください。")
+        if self.barge_in_min_speech_ms < 20:
+            errors.append("BARGE_IN_MIN_SPEECH_MS は 20 以上で設定してください。")
+        if self.playback_max_backlog <= 0:
+            errors.append("PLAYBACK_MAX_BACKLOG は正の整数で設定してください。")
+        if not (0.0 < self.end_of_utterance_min_seconds <= self.end_of_utterance_seconds <= self.end_of_utterance_max_seconds):
+            errors.append(
+                "END_OF_UTTERANCE_MIN_SECONDS <= END_OF_UTTERANCE_SECONDS <= END_OF_UTTERANCE_MAX_SECONDS となる正の値で設定してください。"
+            )
+        if self.max_utterance_seconds <= 0:
+            errors.append("MAX_UTTERANCE_SECONDS は正の値で設定してください。")
+        if self.whisper_upload_format not in ("auto", "ogg", "flac", "wav"):
+            errors.append("WHISPER_UPLOAD_FORMAT は auto / ogg / flac / wav のいずれかで設定してください。")
+        if self.stt_backend not in ("openai", "local"):
+            errors.append("STT_BACKEND は openai / local のいずれかで設定してください。")
+        if self.stt_local_workers <= 0:
+            errors.append("STT_LOCAL_WORKERS は正の整数で設定してください。")
+        if self.voicevox_max_connections <= 0:
+            errors.append("VOICEVOX_MAX_CONNECTIONS は正の整数で設定してください。")
+        if self.voicevox_health_interval_seconds <= 0:
+            errors.append("VOICEVOX_HEALTH_INTERVAL_SECONDS は正の値で設定してください。")
+        if self.turn_deadline_seconds <= 0:
+            errors.append("TURN_DEADLINE_SECONDS は正の値で設定してください。")
+        if self.request_retries < 0:
+            errors.append("REQUEST_RETRIES は 0 以上で設定してください。")
+        if self.history_token_budget < 0:
+            errors.append("HISTORY_TOKEN_BUDGET は 0 以上で設定してください（0 で無効）。")
+        if self.tts_sentence_fanout <= 0:
+            errors.append("TTS_SENTENCE_FANOUT は正の整数で設定してください（1 で文分割なし）。")
+        if self.tts_sentence_gap_seconds < 0:
+            errors.append("TTS_SENTENCE_GAP_SECONDS は 0 以上で設定してください。")
         return errors
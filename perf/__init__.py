@@ -0,0 +1 @@
+"""Measurement helpers shared by the bot, AI and audio layers."""
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+
+
+class RollingHistogram:
+    """Keep the last ``window`` samples and answer percentile queries over them."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        # Nearest-rank percentile.
+        rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+        return ordered[rank - 1]
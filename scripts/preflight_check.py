@@ -44,10 +44,12 @@ async def main() -> int:
         return 1
 
     ok_openai, msg_openai = check_openai(settings.openai_api_key)
-    ok_voicevox, msg_voicevox = await check_voicevox(settings.voicevox_url)
+    voicevox_results = await asyncio.gather(*(check_voicevox(url) for url in settings.voicevox_urls))
+    ok_voicevox = all(ok for ok, _ in voicevox_results)
 
     print(("OK" if ok_openai else "NG") + f": {msg_openai}")
-    print(("OK" if ok_voicevox else "NG") + f": {msg_voicevox}")
+    for url, (ok, msg) in zip(settings.voicevox_urls, voicevox_results):
+        print(("OK" if ok else "NG") + f": {msg} ({url})")
 
     return 0 if (ok_openai and ok_voicevox) else 1
 
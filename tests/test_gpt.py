@@ -1,3 +1,5 @@
+import types
+
 from ai.gpt import GPTResponder
 
 
@@ -14,3 +16,66 @@ def test_sanitize_reply_removes_name_prefix_japanese_colon():
 def test_sanitize_reply_keeps_normal_sentence():
     text = "今いくよ。ちょっと待ってね。"
     assert GPTResponder._sanitize_reply(text) == text
+
+
+class _FakeStream:
+    def __init__(self, deltas):
+        self._deltas = list(deltas)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._deltas:
+            raise StopAsyncIteration
+        delta = self._deltas.pop(0)
+        if isinstance(delta, types.SimpleNamespace):
+            return types.SimpleNamespace(choices=[], usage=delta)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=delta))])
+
+
+async def test_stream_reply_sanitizes_first_sentence_only():
+    responder = GPTResponder(api_key="test", model="gpt-4o-mini")
+
+    async def _create(**kwargs):
+        assert kwargs["stream"] is True
+        return _FakeStream(["ずんたろう：", "うん、", "いいよ。", "じゃあ: ", "行こう！"])
+
+    responder._async_client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=_create))
+    )
+    sentences = [
+        s
+        async for s in responder.stream_reply_async(
+            user_name="alice",
+            transcript="遊ぼう",
+            history_lines=[],
+            character_prompt="",
+            permanent_memory_text=None,
+        )
+    ]
+    assert sentences == ["うん、いいよ。", "じゃあ: 行こう！"]
+
+
+async def test_stream_reply_records_cached_prompt_tokens():
+    responder = GPTResponder(api_key="test", model="gpt-4o-mini")
+    usage = types.SimpleNamespace(
+        prompt_tokens=2000, prompt_tokens_details=types.SimpleNamespace(cached_tokens=1536)
+    )
+
+    async def _create(**kwargs):
+        assert kwargs["stream_options"] == {"include_usage": True}
+        return _FakeStream(["うん。", usage])
+
+    responder._async_client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=_create))
+    )
+    sentences = [
+        s
+        async for s in responder.stream_reply_async(
+            user_name="alice", transcript="遊ぼう", history_lines=[], character_prompt="", permanent_memory_text=None
+        )
+    ]
+    assert sentences == ["うん。"]
+    assert responder.prompt_cache.cached_tokens == 1536
+    assert responder.prompt_cache.cached_ratio == 0.768
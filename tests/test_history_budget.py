@@ -0,0 +1,110 @@
+import asyncio
+
+from ai.history_budget import HistoryBudget, estimate_tokens, line_tokens
+
+
+def _lines(start, count):
+    return [
+        f"[2024-01-01 10:00:{i:02d}] bot: [2024-01-01 10:00:{i:02d}] alice: 発話{i}です。"
+        for i in range(start, start + count)
+    ]
+
+
+def test_estimate_tokens_counts_wide_characters_individually():
+    assert estimate_tokens("こんにちは") == 5
+    assert estimate_tokens("hello world!") == 3
+
+
+async def test_old_lines_are_folded_in_the_background_and_prompt_stays_bounded():
+    calls = []
+    release = asyncio.Event()
+
+    async def _summarize(previous, lines):
+        calls.append((previous, list(lines)))
+        await release.wait()
+        return f"要約{len(calls)}"
+
+    line = line_tokens(_lines(0, 1)[0])
+    budget = HistoryBudget(_summarize, budget_tokens=4 * line, fold_batch_tokens=2 * line)
+    lines = _lines(0, 10)
+
+    summary, recent = budget.select(lines)
+    assert summary is None
+    assert recent == lines[-4:]
+    # The reply does not wait for the summarizer.
+    await asyncio.sleep(0)
+    assert calls == [(None, lines[:8])]
+
+    # A second turn while the fold is running does not start another one.
+    budget.select(lines)
+    release.set()
+    await budget.wait_idle()
+    assert len(calls) == 1
+
+    more = _lines(0, 14)
+    summary, recent = budget.select(more)
+    assert summary == "要約1"
+    assert recent[0] > more[7]
+    assert sum(line_tokens(line) for line in recent) + estimate_tokens(summary) <= 4 * line
+    await budget.wait_idle()
+    # Only lines newer than the last fold are sent to the summarizer.
+    previous, folded = calls[1]
+    assert previous == "要約1"
+    assert folded[0] == more[8]
+
+
+async def test_folds_wait_for_a_batch_and_survive_the_window_sliding():
+    calls = []
+
+    async def _summarize(previous, lines):
+        calls.append(list(lines))
+        return "要約"
+
+    line = line_tokens(_lines(0, 1)[0])
+    budget = HistoryBudget(_summarize, budget_tokens=4 * line, fold_batch_tokens=2 * line)
+
+    # One line beyond the headroom is not worth a summarizer call yet; nothing is dropped.
+    assert budget.select(_lines(0, 3)) == (None, _lines(0, 3))
+    await budget.wait_idle()
+    assert calls == []
+
+    budget.select(_lines(0, 4))
+    await budget.wait_idle()
+    assert calls == [_lines(0, 2)]
+
+    # The fetched window slides past line 0; folded lines are neither resent nor refolded.
+    summary, recent = budget.select(_lines(1, 5))
+    assert summary == "要約" and recent[0] > _lines(1, 1)[0]
+    await budget.wait_idle()
+    assert calls[1] == _lines(2, 3)
+
+
+async def test_summarizer_failure_keeps_previous_summary():
+    async def _fail(previous, lines):
+        raise RuntimeError("boom")
+
+    budget = HistoryBudget(_fail, budget_tokens=1)
+    budget.select(_lines(0, 3))
+    await budget.wait_idle()
+    assert budget.summary is None
+
+
+async def test_reset_drops_the_summary_and_a_fold_in_flight():
+    release = asyncio.Event()
+
+    async def _summarize(previous, lines):
+        await release.wait()
+        return "古い要約"
+
+    line = line_tokens(_lines(0, 1)[0])
+    budget = HistoryBudget(_summarize, budget_tokens=4 * line, fold_batch_tokens=2 * line)
+    budget.select(_lines(0, 10))
+    await asyncio.sleep(0)
+
+    # The history was cleared while the fold was running; its result must not come back.
+    budget.reset()
+    release.set()
+    await budget.wait_idle()
+    await asyncio.sleep(0)
+    assert budget.summary is None
+    assert budget.select(_lines(20, 2)) == (None, _lines(20, 2))
@@ -0,0 +1,39 @@
+from bot.perf import PerfRecorder
+from perf.histogram import RollingHistogram
+
+
+def test_rolling_histogram_percentiles():
+    hist = RollingHistogram(window=100)
+    for value in range(1, 101):
+        hist.add(float(value))
+    assert hist.percentile(50) == 50.0
+    assert hist.percentile(95) == 95.0
+    assert hist.percentile(99) == 99.0
+
+
+def test_rolling_histogram_keeps_only_window():
+    hist = RollingHistogram(window=3)
+    for value in (100.0, 1.0, 2.0, 3.0):
+        hist.add(value)
+    assert hist.count == 3
+    assert hist.percentile(99) == 3.0
+
+
+def test_perf_recorder_orders_stages_by_pipeline():
+    perf = PerfRecorder()
+    perf.record("tts", 0.2)
+    perf.record("whisper", 0.5)
+    with perf.time("gpt"):
+        pass
+    assert list(perf.summary()) == ["whisper", "gpt", "tts"]
+    assert perf.summary()["whisper"][0] == 500.0
+    assert "whisper" in perf.format_table()
+
+
+def test_perf_recorder_counters_are_listed_after_stages():
+    perf = PerfRecorder()
+    perf.record("whisper", 0.5)
+    perf.count("trimmed_seconds", 1.25)
+    perf.count("trimmed_seconds", 0.5)
+    assert perf.counters == {"trimmed_seconds": 1.75}
+    assert perf.format_table().splitlines()[-1].split() == ["trimmed_seconds", "1.8"]
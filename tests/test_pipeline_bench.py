@@ -0,0 +1,21 @@
+from benchmarks.fakes import LatencyProfile
+from benchmarks.pipeline_bench import BenchmarkConfig, run_benchmark
+
+
+async def test_offline_benchmark_runs_every_utterance_through_the_pipeline():
+    config = BenchmarkConfig(
+        speakers=2,
+        utterances=1,
+        utterance_seconds=0.5,
+        gap_seconds=0.0,
+        end_of_utterance_seconds=0.2,
+        history_send_latency=0.0,
+        timeout_seconds=20.0,
+        latency=LatencyProfile(whisper=0.01, chat=0.01, chat_token=0.0, audio_query=0.0, synthesis=0.01),
+    )
+    result = await run_benchmark(config)
+
+    assert result.replies == 2
+    assert result.stages_ms["end_to_end"][3] == 2
+    assert result.endpoints["transcriptions"]["requests"] == 2
+    assert result.endpoints["synthesis"]["requests"] == 2
@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from audio.playback_queue import PlaybackQueue
+
+
+async def test_backlog_drops_oldest_clip_when_full():
+    gate = asyncio.Event()
+
+    async def _play(voice_client, wav):
+        await gate.wait()
+
+    player = Mock(play_wav_bytes_async=AsyncMock(side_effect=_play))
+    queue = PlaybackQueue(player, lambda: object(), max_backlog=2)
+
+    queue.enqueue(b"1")
+    await asyncio.sleep(0)  # clip 1 starts playing
+    for wav in (b"2", b"3", b"4"):
+        queue.enqueue(wav)
+    assert queue.depth == 2
+    assert queue.dropped == 1
+
+    gate.set()
+    await queue.drain()
+    played = [c.args[1] for c in player.play_wav_bytes_async.await_args_list]
+    assert played == [b"1", b"3", b"4"]
+
+
+async def test_stale_clips_are_skipped():
+    player = Mock(play_wav_bytes_async=AsyncMock())
+    queue = PlaybackQueue(player, lambda: object(), max_age_seconds=0.0)
+
+    queue.enqueue(b"old")
+    await asyncio.sleep(0.01)
+    await queue.drain()
+
+    player.play_wav_bytes_async.assert_not_awaited()
+    assert queue.expired == 1
+
+
+async def test_reply_clips_share_one_backlog_slot_and_are_dropped_together():
+    gate = asyncio.Event()
+
+    async def _play(voice_client, wav):
+        await gate.wait()
+
+    player = Mock(play_wav_bytes_async=AsyncMock(side_effect=_play))
+    queue = PlaybackQueue(player, lambda: object(), max_backlog=2)
+
+    queue.enqueue(b"playing")
+    await asyncio.sleep(0)
+    first = queue.open_reply()
+    for wav in (b"a1", b"a2", b"a3"):
+        first.add(wav)
+    first.close()
+    second = queue.open_reply()
+    second.add(b"b1")
+    assert queue.depth == 2 and queue.dropped == 0
+
+    queue.enqueue(b"c1")  # backlog full: the whole oldest reply goes
+    second.add(b"b2")
+    second.close()
+    assert queue.dropped == 1
+
+    gate.set()
+    await queue.drain()
+    played = [c.args[1] for c in player.play_wav_bytes_async.await_args_list]
+    assert played == [b"playing", b"b1", b"b2", b"c1"]
+
+
+async def test_clips_added_while_a_reply_plays_are_not_expired():
+    player = Mock(play_wav_bytes_async=AsyncMock())
+    queue = PlaybackQueue(player, lambda: object(), max_age_seconds=0.05)
+
+    reply = queue.open_reply()
+    reply.add(b"s1")
+    await asyncio.sleep(0.1)  # older than max_age, but the reply already started
+    reply.add(b"s2")
+    reply.close()
+    await queue.drain()
+
+    played = [c.args[1] for c in player.play_wav_bytes_async.await_args_list]
+    assert played == [b"s1", b"s2"]
+    assert queue.expired == 0
+
+
+async def test_clear_stops_the_rest_of_the_current_reply():
+    gate = asyncio.Event()
+
+    async def _play(voice_client, wav):
+        await gate.wait()
+
+    player = Mock(play_wav_bytes_async=AsyncMock(side_effect=_play))
+    queue = PlaybackQueue(player, lambda: object())
+    reply = queue.open_reply()
+    reply.add(b"s1")
+    await asyncio.sleep(0)
+    reply.add(b"s2")
+
+    queue.clear()
+    gate.set()
+    reply.add(b"s3")
+    await queue.drain()
+
+    played = [c.args[1] for c in player.play_wav_bytes_async.await_args_list]
+    assert played == [b"s1"]
@@ -0,0 +1,52 @@
+import io
+import wave
+
+import numpy as np
+
+from audio.player import MemoryPCMSource, VoicePlayer
+
+
+def _wav(samples: np.ndarray, rate: int, channels: int = 1) -> bytes:
+    with io.BytesIO() as buff:
+        with wave.open(buff, "wb") as wf:
+            wf.setnchannels(channels)
+            wf.setsampwidth(2)
+            wf.setframerate(rate)
+            wf.writeframes(samples.astype("<i2").tobytes())
+        return buff.getvalue()
+
+
+class _VoiceClient:
+    def __init__(self):
+        self.source = None
+
+    def play(self, source, *, after=None):
+        self.source = source
+        self.after = after
+
+
+def test_voicevox_wav_is_played_from_memory_at_48k_stereo():
+    tone = 8000 * np.sin(2 * np.pi * 440 * np.arange(2400) / 24000)  # 100 ms at 24 kHz
+    vc = _VoiceClient()
+
+    VoicePlayer().play_wav_bytes(vc, _wav(tone, 24000))
+
+    assert isinstance(vc.source, MemoryPCMSource)
+    frames = []
+    while frame := vc.source.read():
+        frames.append(frame)
+    assert [len(f) for f in frames] == [3840] * 5
+    pcm = np.frombuffer(b"".join(frames), "<i2").reshape(-1, 2)
+    assert (pcm[:, 0] == pcm[:, 1]).all()
+    expected = 8000 * np.sin(2 * np.pi * 440 * np.arange(4800) / 48000)
+    assert np.abs(pcm[200:-200, 0] - expected[200:-200]).max() < 60
+
+
+def test_48k_stereo_wav_passes_through_unchanged():
+    samples = np.arange(-960, 960, dtype=np.int16)  # 960 stereo frames
+    vc = _VoiceClient()
+
+    VoicePlayer().play_wav_bytes(vc, _wav(samples, 48000, channels=2))
+
+    assert vc.source.read() == samples.astype("<i2").tobytes()
+    assert vc.source.read() == b""
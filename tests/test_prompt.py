@@ -1,4 +1,4 @@
-from ai.prompt import build_system_prompt
+from ai.prompt import build_chat_messages, build_stable_system_prompt, build_system_prompt
 
 
 def test_build_system_prompt_contains_required_sections():
@@ -11,3 +11,45 @@ def test_build_system_prompt_contains_required_sections():
     assert "## キャラクター設定" in text
     assert "## 会話履歴" in text
     assert "- user1: こんにちは" in text
+
+
+def test_chat_messages_put_stable_segments_first_and_history_as_turns():
+    messages = build_chat_messages(
+        character_prompt="フレンドリーに話す",
+        memory_text="メモ",
+        history_lines=[
+            "[2024-01-01 10:00:00] bot: [2024-01-01 10:00:00] alice: こんにちは",
+            "[2024-01-01 10:00:01] bot: [2024-01-01 10:00:01] Bot: やっほー",
+            "[2024-01-01 10:00:02] bot: [2024-01-01 10:00:02] alice: 元気？",
+        ],
+        user_name="alice",
+        transcript="元気？",
+    )
+    system = messages[0]["content"]
+    assert system.index("## 応答ルール") < system.index("## キャラクター設定") < system.index("## 永続記憶")
+    assert "会話履歴" not in system
+    assert messages[1:] == [
+        {"role": "user", "content": "alice: こんにちは"},
+        {"role": "assistant", "content": "やっほー"},
+        {"role": "user", "content": "alice: 元気？"},
+    ]
+
+
+def test_stable_system_prompt_is_memoized_per_version():
+    first = build_stable_system_prompt("キャラ", "記憶")
+    assert build_stable_system_prompt("キャラ", "記憶") is first
+    assert build_stable_system_prompt("キャラ", "記憶2") != first
+
+
+def test_history_summary_follows_the_cacheable_system_prompt():
+    messages = build_chat_messages(
+        character_prompt="キャラ",
+        memory_text=None,
+        history_lines=[],
+        user_name="alice",
+        transcript="続きは？",
+        history_summary="- aliceは旅行の話をした",
+    )
+    assert messages[0]["content"] == build_stable_system_prompt("キャラ", None)
+    assert messages[1] == {"role": "system", "content": "## これまでの会話の要約\n- aliceは旅行の話をした"}
+    assert messages[-1] == {"role": "user", "content": "alice: 続きは？"}
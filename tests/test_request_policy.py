@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+from ai.request_policy import RequestPolicy, remaining_budget, turn_deadline
+
+
+def _policy(**kwargs):
+    defaults = dict(min_samples=3, min_hedge_delay=0.01, backoff_seconds=0.001)
+    defaults.update(kwargs)
+    return RequestPolicy("test", **defaults)
+
+
+async def test_slow_primary_is_hedged_and_cancelled():
+    policy = _policy()
+    for _ in range(3):
+        assert await policy.run(lambda timeout: asyncio.sleep(0.01, result="ok")) == "ok"
+
+    cancelled = []
+    calls = 0
+
+    async def _attempt(timeout):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return "hedge"
+
+    started = time.monotonic()
+    assert await policy.run(_attempt) == "hedge"
+    assert time.monotonic() - started < 1.0
+    await asyncio.sleep(0)
+    assert cancelled == [True]
+    assert policy.stats.hedges == 1 and policy.stats.hedge_wins == 1
+    assert policy.stats.hedge_rate == pytest.approx(0.25)
+
+
+async def test_retries_transient_errors_but_not_client_errors():
+    policy = _policy(retries=2, hedge=False)
+    failures = [openai.APITimeoutError(request=None), asyncio.TimeoutError()]
+
+    async def _flaky(timeout):
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    assert await policy.run(_flaky) == "ok"
+    assert policy.stats.retries == 2
+
+    async def _bad(timeout):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await policy.run(_bad)
+    assert policy.stats.retries == 2
+
+
+async def test_spent_turn_budget_stops_retries_and_caps_timeout():
+    policy = _policy(retries=3, hedge=False, timeout=10.0, min_timeout=0.5)
+    timeouts = []
+
+    async def _failing(timeout):
+        timeouts.append(timeout)
+        raise asyncio.TimeoutError()
+
+    with turn_deadline(time.monotonic() + 0.3):
+        assert remaining_budget() <= 0.3
+        with pytest.raises(asyncio.TimeoutError):
+            await policy.run(_failing)
+
+    assert timeouts == [0.5]
+    assert policy.stats.budget_exhausted == 1
+    assert remaining_budget() is None
@@ -0,0 +1,17 @@
+from ai.sentences import SentenceChunker, split_sentences
+
+
+def test_split_sentences_on_japanese_punctuation():
+    assert split_sentences("こんにちは！元気？うん。") == ["こんにちは！", "元気？", "うん。"]
+
+
+def test_split_sentences_keeps_closing_bracket_and_tail():
+    assert split_sentences("「そうだね。」次は") == ["「そうだね。」", "次は"]
+
+
+def test_chunker_waits_for_trailing_punctuation():
+    chunker = SentenceChunker()
+    assert chunker.feed("本当") == []
+    assert chunker.feed("？") == []
+    assert chunker.feed("！すごい") == ["本当？！"]
+    assert chunker.flush() == "すごい"
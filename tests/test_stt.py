@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import types
+
+import numpy as np
+import pytest
+
+import audio.stt
+from audio.stt import LocalWhisperTranscriber, create_transcriber
+from audio.wav import pcm16k_mono_to_wav
+from audio.whisper import WhisperTranscriber
+from benchmarks.fakes import silent_wav
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+
+    def transcribe(self, samples, **kwargs):
+        self.calls.append((samples, kwargs))
+        self.threads.add(threading.current_thread().name)
+        return iter([types.SimpleNamespace(text=" こん"), types.SimpleNamespace(text="にちは ")]), None
+
+
+async def test_local_backend_transcribes_float_samples_in_worker_pool():
+    model = FakeModel()
+    loads = []
+    stt = LocalWhisperTranscriber(workers=2, model_factory=lambda: loads.append(1) or model)
+
+    pcm = np.array([0, 16384, -32768], dtype="<i2").tobytes()
+    results = await asyncio.gather(
+        stt.transcribe_pcm16_ja_async(pcm), stt.transcribe_ja_async(pcm16k_mono_to_wav(pcm))
+    )
+    stt.close()
+
+    assert results == ["こんにちは", "こんにちは"]
+    assert loads == [1]
+    samples, kwargs = model.calls[0]
+    assert samples.dtype == np.float32 and samples.tolist() == [0.0, 0.5, -1.0]
+    assert kwargs["language"] == "ja"
+    assert all(name.startswith("stt") for name in model.threads)
+
+
+async def test_local_backend_rejects_non_16k_wav():
+    stt = LocalWhisperTranscriber(model_factory=FakeModel)
+    with pytest.raises(ValueError):
+        await stt.transcribe_ja_async(silent_wav(0.1, sample_rate=48000, channels=2))
+    stt.close()
+
+
+def test_create_transcriber_selects_backend(monkeypatch):
+    assert isinstance(create_transcriber("openai", api_key="key", upload_format="wav"), WhisperTranscriber)
+    monkeypatch.setattr(audio.stt, "faster_whisper", None)
+    with pytest.raises(RuntimeError):
+        create_transcriber("local", api_key="key")
+    with pytest.raises(ValueError):
+        create_transcriber("azure", api_key="key")
@@ -0,0 +1,134 @@
+import io
+import time
+import wave
+
+import pytest
+
+from ai.sync_bridge import run_sync
+from audio.tts import VoiceVoxTTS
+from audio.tts_cache import TTSCache
+from benchmarks.fakes import FakeVoiceVoxServer, LatencyProfile
+
+
+async def test_async_client_is_pooled_and_reuse_is_counted():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as server:
+        tts = VoiceVoxTTS(server.url, 3, max_connections=2)
+        for _ in range(3):
+            assert (await tts.synthesize_async("こんにちは"))[:4] == b"RIFF"
+        await tts.aclose()
+
+    assert tts.stats.requests == 6
+    assert tts.stats.new_connections == 1
+    assert tts.stats.reused == 5
+
+
+
+def test_sync_synthesize_wraps_the_async_path_and_keeps_its_connection():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as server:
+        tts = VoiceVoxTTS(server.url, 3)
+        for _ in range(2):
+            assert tts.synthesize("こんにちは")[:4] == b"RIFF"
+        run_sync(tts.aclose())
+
+    assert tts.stats.new_connections == 1
+
+
+async def test_sync_synthesize_refuses_to_block_a_running_loop():
+    tts = VoiceVoxTTS("http://127.0.0.1:9", 3)
+    with pytest.raises(RuntimeError, match="_async"):
+        tts.synthesize("こんにちは")
+
+async def test_synthesis_can_request_discord_native_format():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as server:
+        tts = VoiceVoxTTS(server.url, 3, output_48k_stereo=True)
+        wav = await tts.synthesize_async("あ")
+        await tts.aclose()
+
+    # fmt chunk: channels at byte 22, sample rate at byte 24.
+    assert int.from_bytes(wav[22:24], "little") == 2
+    assert int.from_bytes(wav[24:28], "little") == 48000
+
+
+async def test_cache_serves_repeats_and_reuses_audio_query_on_partial_hit():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as server:
+        cache = TTSCache()
+        tts = VoiceVoxTTS(server.url, 3, cache=cache)
+        first = await tts.synthesize_async("なるほど")
+        assert await tts.synthesize_async(" なるほど ") == first
+        assert server.stats["synthesis"].requests == 1
+
+        # Same text in another output format: only /synthesis runs again.
+        native = VoiceVoxTTS(server.url, 3, cache=cache, output_48k_stereo=True)
+        await native.synthesize_async("なるほど")
+        await tts.aclose()
+        await native.aclose()
+
+    assert server.stats["audio_query"].requests == 1
+    assert server.stats["synthesis"].requests == 2
+    assert cache.stats["query"].memory_hits == 1
+
+
+async def test_cache_key_is_normalized_but_engine_gets_original_text():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as server:
+        tts = VoiceVoxTTS(server.url, 3, cache=TTSCache())
+        sent = []
+        audio_query = tts._audio_query
+
+        async def _spy(base_url, text):
+            sent.append(text)
+            return await audio_query(base_url, text)
+
+        tts._audio_query = _spy
+        await tts.synthesize_async("ＡＢＣ　です")
+        await tts.synthesize_async("ABC です")
+        await tts.aclose()
+
+    assert sent == ["ＡＢＣ　です"]
+
+
+async def test_sentences_are_synthesized_concurrently_and_stitched_in_order():
+    latency = LatencyProfile(audio_query=0.0, synthesis=0.2)
+    with FakeVoiceVoxServer(latency) as server:
+        tts = VoiceVoxTTS(server.url, 3, sentence_fanout=3, sentence_gap_seconds=0.1)
+        started = time.monotonic()
+        wav = await tts.synthesize_async("おはよう。今日は晴れ。散歩しよう！")
+        elapsed = time.monotonic() - started
+        await tts.aclose()
+
+    assert server.stats["synthesis"].requests == 3
+    assert elapsed < 0.5
+    with wave.open(io.BytesIO(wav), "rb") as wf:
+        frames = wf.getnframes()
+    speech = sum(int(len(t) * FakeVoiceVoxServer.SECONDS_PER_CHAR * 24000) for t in ("おはよう。", "今日は晴れ。", "散歩しよう！"))
+    # Two 0.1 s gaps at the fake engine's 24 kHz.
+    assert frames == speech + 2 * 2400
+
+
+async def test_first_sentence_is_yielded_before_the_rest_finish():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as server:
+        tts = VoiceVoxTTS(server.url, 3, sentence_fanout=2)
+        clips = []
+        async for clip in tts.synthesize_sentences("一つ目。二つ目。三つ目。"):
+            clips.append(clip)
+        await tts.aclose()
+
+    assert len(clips) == 3
+    # Later clips carry the inter-sentence gap up front.
+    assert len(clips[1]) > len(clips[0])
+
+
+async def test_warm_up_initializes_every_engine_and_prefills_cache():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as a, FakeVoiceVoxServer(
+        LatencyProfile(audio_query=0.0, synthesis=0.0)
+    ) as b:
+        tts = VoiceVoxTTS([a.url, b.url], 3, cache=TTSCache())
+        await tts.warm_up(["こんにちは！"])
+        synth_before = a.stats["synthesis"].requests + b.stats["synthesis"].requests
+        await tts.synthesize_async("こんにちは！")
+        await tts.aclose()
+
+    assert a.stats["initialize_speaker"].requests == 1
+    assert b.stats["initialize_speaker"].requests == 1
+    # One throwaway synthesis per engine plus the prefilled phrase; the repeat is a cache hit.
+    assert synth_before == 3
+    assert a.stats["synthesis"].requests + b.stats["synthesis"].requests == 3
@@ -0,0 +1,45 @@
+import os
+
+from audio.tts_cache import TTSCache, cache_key, normalize_text
+
+
+def test_normalized_text_shares_a_key():
+    assert normalize_text(" なるほど　 ね ") == "なるほど ね"
+    assert cache_key(text=normalize_text("ＡＢＣ"), speaker=3) == cache_key(speaker=3, text="ABC")
+
+
+def test_memory_tier_is_a_byte_bounded_lru():
+    cache = TTSCache(memory_max_bytes=10)
+    cache.put("wav", "a", b"aaaa")
+    cache.put("wav", "b", b"bbbb")
+    assert cache.get("wav", "a") == b"aaaa"  # a is now most recent
+    cache.put("wav", "c", b"cccc")
+
+    assert cache.get("wav", "b") is None
+    assert cache.get("wav", "c") == b"cccc"
+    stats = cache.stats["wav"]
+    assert (stats.memory_hits, stats.disk_hits, stats.misses) == (2, 0, 1)
+
+
+def test_disk_tier_survives_restart_and_evicts(tmp_path):
+    cache = TTSCache(memory_max_bytes=1024, disk_dir=tmp_path, disk_max_bytes=25)
+    for age, key in enumerate("abc"):
+        cache.put("wav", key, key.encode() * 10)
+        os.utime(tmp_path / "wav" / key, (1000 + age, 1000 + age))
+
+    reopened = TTSCache(disk_dir=tmp_path, disk_max_bytes=25)
+    assert reopened.get("wav", "c") == b"c" * 10
+    assert reopened.get("wav", "a") is None
+    assert reopened.stats["wav"].disk_hits == 1
+    assert sum(p.stat().st_size for p in tmp_path.glob("*/*")) <= 25
+
+
+def test_disk_overwrite_counts_the_entry_once(tmp_path):
+    cache = TTSCache(memory_max_bytes=1024, disk_dir=tmp_path, disk_max_bytes=100)
+    for _ in range(3):
+        cache.put("wav", "a", b"a" * 10)
+    cache.put("wav", "b", b"b" * 20)
+
+    assert cache._disk_bytes == 30
+    # No temp files left behind.
+    assert sorted(p.name for p in (tmp_path / "wav").iterdir()) == ["a", "b"]
@@ -0,0 +1,135 @@
+import asyncio
+
+from bot.utterance_queue import UtteranceQueue
+from bot.voice_receive import CapturedUtterance
+
+
+def _utt(user_id: int, pcm: bytes) -> CapturedUtterance:
+    return CapturedUtterance(user_id=user_id, display_name=f"u{user_id}", pcm=pcm)
+
+
+async def test_commits_in_capture_order_even_if_transcription_finishes_out_of_order():
+    committed = []
+    replied = []
+
+    async def transcribe(utterance):
+        # The first utterance is the slowest to transcribe.
+        await asyncio.sleep(0.03 if utterance.pcm == b"a" else 0.0)
+        return utterance.pcm.decode()
+
+    async def commit(utterance, transcript):
+        committed.append(transcript)
+
+    async def reply(utterance, transcript, history_captured):
+        replied.append(transcript)
+
+    queue = UtteranceQueue(transcribe=transcribe, commit=commit, reply=reply, stt_concurrency=3)
+    queue.start()
+    for pcm in (b"a", b"b", b"c"):
+        queue.submit(_utt(1, pcm))
+    await asyncio.sleep(0.1)
+    await queue.close()
+
+    assert committed == ["a", "b", "c"]
+    assert replied == ["a", "b", "c"]
+
+
+async def test_next_transcript_waits_until_reply_has_read_history():
+    log = []
+    captured = asyncio.Event()
+
+    async def transcribe(utterance):
+        return utterance.pcm.decode()
+
+    async def commit(utterance, transcript):
+        log.append(f"commit {transcript}")
+
+    async def reply(utterance, transcript, history_captured):
+        if transcript == "a":
+            await captured.wait()
+        log.append(f"history {transcript}")
+        history_captured()
+        await asyncio.sleep(0.05 if transcript == "a" else 0)
+
+    queue = UtteranceQueue(transcribe=transcribe, commit=commit, reply=reply, reply_concurrency=2)
+    queue.start()
+    queue.submit(_utt(1, b"a"))
+    queue.submit(_utt(1, b"b"))
+    await asyncio.sleep(0.01)
+    assert log == ["commit a"]
+
+    captured.set()
+    await asyncio.sleep(0.01)
+    await queue.close()
+    assert log == ["commit a", "history a", "commit b", "history b"]
+
+
+async def test_drop_newest_rejects_when_full():
+    gate = asyncio.Event()
+
+    async def transcribe(utterance):
+        await gate.wait()
+        return utterance.pcm.decode()
+
+    async def noop(*_):
+        return None
+
+    queue = UtteranceQueue(transcribe=transcribe, commit=noop, reply=noop, max_depth=2, policy="drop_newest")
+    assert queue.submit(_utt(1, b"a")) is True
+    assert queue.submit(_utt(1, b"b")) is True
+    assert queue.submit(_utt(1, b"c")) is False
+    assert queue.depth == 2
+    assert queue.dropped == 1
+    await queue.close()
+
+
+async def test_merge_appends_audio_to_queued_job_of_same_user():
+    seen = []
+
+    async def transcribe(utterance):
+        seen.append(utterance.pcm)
+        return "ok"
+
+    async def noop(*_):
+        return None
+
+    queue = UtteranceQueue(
+        transcribe=transcribe, commit=noop, reply=noop, max_depth=1, policy="merge", stt_concurrency=1
+    )
+    queue.start()
+    # Both submits happen before the transcription task gets a chance to start.
+    queue.submit(_utt(7, b"ab"))
+    assert queue.submit(_utt(7, b"cd")) is True
+    await asyncio.sleep(0.01)
+    await queue.close()
+
+    assert seen == [b"abcd"]
+    assert queue.merged == 1
+
+
+async def test_cancel_replies_stops_in_flight_reply():
+    started = asyncio.Event()
+    finished = []
+
+    async def transcribe(utterance):
+        return "hi"
+
+    async def commit(*_):
+        return None
+
+    async def reply(utterance, transcript, history_captured):
+        started.set()
+        await asyncio.sleep(10)
+        finished.append(transcript)
+
+    queue = UtteranceQueue(transcribe=transcribe, commit=commit, reply=reply)
+    queue.start()
+    queue.submit(_utt(1, b"a"))
+    await asyncio.wait_for(started.wait(), 1)
+
+    assert queue.cancel_replies() == 1
+    await asyncio.sleep(0)
+    assert queue.cancel_replies() == 0
+    assert finished == []
+    await queue.close()
+
@@ -30,3 +30,50 @@ def test_vad_allows_long_near_threshold_chunk():
     vad = VADSegmenter(threshold=0.5)
     near = _pcm_s16le_from_constant(120, 20000)
     assert vad.has_speech(near) is True
+
+
+def test_vad_rejects_long_silence_with_short_cough():
+    vad = VADSegmenter(threshold=0.5)
+    pcm = _pcm_s16le_from_constant(0, 16000 * 3) + _pcm_s16le_from_constant(8000, 16000 // 10)
+    pcm += _pcm_s16le_from_constant(0, 16000 * 2)
+    result = vad.analyze(pcm)
+    assert result.has_speech is False
+    assert 0.0 < result.speech_ratio < 0.1
+
+
+def test_vad_accepts_quiet_short_sentence():
+    vad = VADSegmenter(threshold=0.5)
+    # Below the absolute threshold (0.005) but well above the quiet room's noise floor.
+    quiet = _pcm_s16le_from_constant(100, 16000 // 2)
+    assert vad.has_speech(quiet) is True
+
+
+def test_vad_reports_speech_spans():
+    vad = VADSegmenter(threshold=0.5)
+    pcm = (
+        _pcm_s16le_from_constant(0, 3200)
+        + _pcm_s16le_from_constant(5000, 6400)
+        + _pcm_s16le_from_constant(0, 3200)
+    )
+    result = vad.analyze(pcm)
+    assert result.spans == [(3200, 9600)]
+    assert result.speech_samples == 6400
+
+
+def test_vad_noise_floor_adapts_to_noisy_room():
+    vad = VADSegmenter(threshold=0.5)
+    hum = _pcm_s16le_from_constant(150, 3200)
+    for _ in range(100):
+        vad.analyze(hum)
+    assert vad.has_speech(hum) is False
+    assert vad.has_speech(_pcm_s16le_from_constant(3000, 3200)) is True
+
+
+def test_vad_noise_floor_does_not_creep_up_during_continuous_speech():
+    vad = VADSegmenter(threshold=0.5)
+    floor = vad.noise_floor
+    packet = _pcm_s16le_from_constant(3000, 320)  # one 20 ms frame of speech per call
+    for _ in range(200):
+        vad.analyze(packet)
+    assert vad.noise_floor == floor
+    assert vad.has_speech(_pcm_s16le_from_constant(300, 3200)) is True
@@ -1,9 +1,13 @@
+import asyncio
 import types
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 
+from audio.vad import VADResult
+from bot.utterance_queue import UtteranceQueue
 from bot.voice_handler import VoiceHandler
+from bot.voice_receive import CapturedUtterance
 
 
 class DummyHistory:
@@ -24,16 +28,16 @@ class DummyMemoryStore:
 
 @pytest.mark.asyncio
 async def test_process_user_audio_pipeline_runs():
-    vad = Mock(has_speech=Mock(return_value=True))
-    whisper = Mock(transcribe_ja=Mock(return_value="こんにちは"))
-    gpt = Mock(generate_reply=Mock(return_value="やっほー"))
-    tts = Mock(synthesize=Mock(return_value=b"wav"))
-    player = Mock(play_wav_bytes=Mock())
+    vad = Mock(analyze=Mock(return_value=VADResult(has_speech=True, speech_ratio=1.0)))
+    whisper = Mock(transcribe_ja_async=AsyncMock(return_value="こんにちは"))
+    gpt = Mock(generate_reply_async=AsyncMock(return_value="やっほー"))
+    tts = Mock(synthesize_async=AsyncMock(return_value=b"wav"))
+    player = Mock(play_wav_bytes_async=AsyncMock())
     history = DummyHistory()
     memory = DummyMemoryStore()
 
-    handler = VoiceHandler(vad, whisper, gpt, tts, player, history, memory)
-    guild = types.SimpleNamespace(voice_client=object())
+    handler = VoiceHandler(lambda: vad, whisper, gpt, tts, player, history, lambda: memory)
+    guild = types.SimpleNamespace(id=1, voice_client=object())
     channel = object()
 
     reply = await handler.process_user_audio(
@@ -45,23 +49,24 @@ async def test_process_user_audio_pipeline_runs():
     )
 
     assert reply == "やっほー"
-    player.play_wav_bytes.assert_called_once()
+    await handler.drain_playback(guild.id)
+    player.play_wav_bytes_async.assert_awaited_once()
     assert history.rows[0] == ("alice", "こんにちは")
     assert history.rows[-1] == ("Bot", "やっほー")
 
 
 @pytest.mark.asyncio
 async def test_process_user_audio_skips_when_vad_false():
-    vad = Mock(has_speech=Mock(return_value=False))
-    whisper = Mock(transcribe_ja=Mock())
-    gpt = Mock(generate_reply=Mock())
-    tts = Mock(synthesize=Mock())
-    player = Mock(play_wav_bytes=Mock())
+    vad = Mock(analyze=Mock(return_value=VADResult(has_speech=False, speech_ratio=0.0)))
+    whisper = Mock(transcribe_ja_async=AsyncMock())
+    gpt = Mock(generate_reply_async=AsyncMock())
+    tts = Mock(synthesize_async=AsyncMock())
+    player = Mock(play_wav_bytes_async=AsyncMock())
     history = DummyHistory()
     memory = DummyMemoryStore()
 
-    handler = VoiceHandler(vad, whisper, gpt, tts, player, history, memory)
-    guild = types.SimpleNamespace(voice_client=object())
+    handler = VoiceHandler(lambda: vad, whisper, gpt, tts, player, history, lambda: memory)
+    guild = types.SimpleNamespace(id=1, voice_client=object())
     channel = object()
 
     reply = await handler.process_user_audio(
@@ -72,21 +77,21 @@ async def test_process_user_audio_skips_when_vad_false():
         wav_bytes=b"",
     )
     assert reply == ""
-    whisper.transcribe_ja.assert_not_called()
+    whisper.transcribe_ja_async.assert_not_awaited()
 
 
 @pytest.mark.asyncio
 async def test_process_user_text_pipeline_runs():
-    vad = Mock(has_speech=Mock(return_value=True))
-    whisper = Mock(transcribe_ja=Mock(return_value="こんにちは"))
-    gpt = Mock(generate_reply=Mock(return_value="了解です"))
-    tts = Mock(synthesize=Mock(return_value=b"wav"))
-    player = Mock(play_wav_bytes=Mock())
+    vad = Mock(analyze=Mock(return_value=VADResult(has_speech=True, speech_ratio=1.0)))
+    whisper = Mock(transcribe_ja_async=AsyncMock(return_value="こんにちは"))
+    gpt = Mock(generate_reply_async=AsyncMock(return_value="了解です"))
+    tts = Mock(synthesize_async=AsyncMock(return_value=b"wav"))
+    player = Mock(play_wav_bytes_async=AsyncMock())
     history = DummyHistory()
     memory = DummyMemoryStore()
 
-    handler = VoiceHandler(vad, whisper, gpt, tts, player, history, memory)
-    guild = types.SimpleNamespace(voice_client=types.SimpleNamespace(is_playing=lambda: False))
+    handler = VoiceHandler(lambda: vad, whisper, gpt, tts, player, history, lambda: memory)
+    guild = types.SimpleNamespace(id=1, voice_client=types.SimpleNamespace(is_playing=lambda: False))
     channel = object()
 
     reply = await handler.process_user_text(
@@ -97,4 +102,150 @@ async def test_process_user_text_pipeline_runs():
     )
 
     assert reply == "了解です"
-    player.play_wav_bytes.assert_called_once()
+    await handler.drain_playback(guild.id)
+    player.play_wav_bytes_async.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_process_user_text_streams_sentences_in_order():
+    async def _stream_reply_async(**kwargs):
+        for sentence in ["うん。", "いいよ！"]:
+            yield sentence
+
+    vad = Mock(analyze=Mock(return_value=VADResult(has_speech=True, speech_ratio=1.0)))
+    whisper = Mock(transcribe_ja_async=AsyncMock())
+    gpt = Mock(stream_reply_async=_stream_reply_async)
+    tts = Mock(synthesize_async=AsyncMock(side_effect=lambda text: text.encode()))
+    player = Mock(play_wav_bytes_async=AsyncMock())
+    history = DummyHistory()
+    memory = DummyMemoryStore()
+
+    handler = VoiceHandler(lambda: vad, whisper, gpt, tts, player, history, lambda: memory, stream_replies=True)
+    guild = types.SimpleNamespace(id=1, voice_client=types.SimpleNamespace(is_playing=lambda: False))
+
+    reply = await handler.process_user_text(
+        guild=guild,
+        history_channel=object(),
+        user_display_name="alice",
+        text="遊ぼう",
+    )
+
+    assert reply == "うん。いいよ！"
+    await handler.drain_playback(guild.id)
+    played = [c.args[1] for c in player.play_wav_bytes_async.await_args_list]
+    assert played == ["うん。".encode(), "いいよ！".encode()]
+    assert history.rows[-1] == ("Bot", "うん。いいよ！")
+
+
+@pytest.mark.asyncio
+async def test_pipelined_reply_queues_each_sentence_clip():
+    async def _synthesize_sentences(text):
+        for sentence in ["うん。", "いいよ！"]:
+            yield sentence.encode()
+
+    gpt = Mock(generate_reply_async=AsyncMock(return_value="うん。いいよ！"))
+    tts = Mock(synthesize_sentences=_synthesize_sentences, synthesize_async=AsyncMock())
+    player = Mock(play_wav_bytes_async=AsyncMock())
+    handler = VoiceHandler(
+        Mock, Mock(), gpt, tts, player, DummyHistory(), DummyMemoryStore, pipeline_sentences=True
+    )
+    guild = types.SimpleNamespace(id=1, voice_client=types.SimpleNamespace(is_playing=lambda: False))
+
+    reply = await handler.process_user_text(guild=guild, history_channel=object(), user_display_name="alice", text="遊ぼう")
+
+    assert reply == "うん。いいよ！"
+    await handler.drain_playback(guild.id)
+    played = [c.args[1] for c in player.play_wav_bytes_async.await_args_list]
+    assert played == ["うん。".encode(), "いいよ！".encode()]
+    tts.synthesize_async.assert_not_awaited()
+
+
+def test_barge_in_stops_current_playback():
+    voice_client = Mock(is_playing=Mock(return_value=True), stop=Mock())
+    handler = VoiceHandler(Mock, Mock(), Mock(), Mock(), Mock(), DummyHistory(), DummyMemoryStore)
+    guild = types.SimpleNamespace(id=1, voice_client=voice_client)
+
+    handler._handle_barge_in(guild, user_id=42)
+
+    voice_client.stop.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_reply_is_queued_while_audio_is_playing():
+    vad = Mock(analyze=Mock(return_value=VADResult(has_speech=True, speech_ratio=1.0)))
+    gpt = Mock(generate_reply_async=AsyncMock(side_effect=["一つ目", "二つ目"]))
+    tts = Mock(synthesize_async=AsyncMock(side_effect=lambda text: text.encode()))
+    player = Mock(play_wav_bytes_async=AsyncMock())
+    handler = VoiceHandler(lambda: vad, Mock(), gpt, tts, player, DummyHistory(), DummyMemoryStore)
+    guild = types.SimpleNamespace(id=1, voice_client=types.SimpleNamespace(is_playing=lambda: True))
+
+    for text in ("a", "b"):
+        await handler.process_user_text(guild=guild, history_channel=object(), user_display_name="alice", text=text)
+    assert handler.playback_depth(guild.id) >= 1
+    await handler.drain_playback(guild.id)
+
+    played = [c.args[1] for c in player.play_wav_bytes_async.await_args_list]
+    assert played == ["一つ目".encode(), "二つ目".encode()]
+    assert handler.playback_depth(guild.id) == 0
+
+
+def test_guild_sessions_do_not_share_state():
+    handler = VoiceHandler(Mock, Mock(), Mock(), Mock(), Mock(), DummyHistory(), DummyMemoryStore)
+    guild_a = types.SimpleNamespace(id=1, voice_client=None)
+    guild_b = types.SimpleNamespace(id=2, voice_client=None)
+
+    handler.session_for(guild_a).character_prompt = "丁寧語で話す"
+
+    a, b = handler.session_for(guild_a), handler.session_for(guild_b)
+    assert b.character_prompt != "丁寧語で話す"
+    assert a.vad is not b.vad
+    assert a.memory is not b.memory
+    assert a.playback_lock is not b.playback_lock
+    assert handler.session_for(guild_a) is a
+
+
+@pytest.mark.asyncio
+async def test_process_user_audio_uploads_only_speech_spans():
+    pcm16 = b"\x01\x00" * 32000  # 2 s
+    vad = Mock(analyze=Mock(return_value=VADResult(has_speech=True, speech_ratio=0.2, spans=[(8000, 12800)])))
+    whisper = Mock(transcribe_pcm16_ja_async=AsyncMock(return_value=""))
+    handler = VoiceHandler(lambda: vad, whisper, Mock(), Mock(), Mock(), DummyHistory(), DummyMemoryStore)
+    guild = types.SimpleNamespace(id=1, voice_client=object())
+
+    await handler.process_user_audio(
+        guild=guild,
+        history_channel=object(),
+        user_display_name="alice",
+        pcm16_mono=pcm16,
+        wav_bytes=b"untrimmed",
+    )
+
+    uploaded = whisper.transcribe_pcm16_ja_async.await_args.args[0]
+    assert len(uploaded) < len(pcm16) // 2
+    assert handler.session_for(guild).perf.counters["trimmed_seconds"] > 1.0
+
+
+@pytest.mark.asyncio
+async def test_stop_listening_cancels_backlog_instead_of_finishing_it():
+    gate = asyncio.Event()
+
+    async def _blocked(*_):
+        await gate.wait()
+
+    player = Mock(play_wav_bytes_async=AsyncMock(side_effect=_blocked))
+    handler = VoiceHandler(Mock, Mock(), Mock(), Mock(), player, DummyHistory(), DummyMemoryStore)
+    guild = types.SimpleNamespace(id=1, voice_client=object())
+    state = handler.session_for(guild)
+    state.utterances = UtteranceQueue(transcribe=_blocked, commit=_blocked, reply=_blocked)
+    state.utterances.start()
+    for user_id in range(3):
+        state.utterances.submit(CapturedUtterance(user_id=user_id, display_name="u", pcm=b"x"))
+    for wav in (b"1", b"2"):
+        state.playback.enqueue(wav)
+    await asyncio.sleep(0)
+
+    await asyncio.wait_for(handler.stop_listening(guild), 1)
+
+    assert state.utterances is None
+    assert handler.playback_depth(guild.id) == 0
+    assert player.play_wav_bytes_async.await_count == 1
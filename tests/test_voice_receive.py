@@ -0,0 +1,214 @@
+import asyncio
+import types
+
+from discord.ext.voice_recv import rtp
+
+from audio.wav import pcm48k_stereo_to_pcm16k_mono
+from bot.voice_receive import UserAudioBuffer, VoiceReceiveSession
+
+SPEECH = b"\x10\x20" * 1920  # one 20 ms 48 kHz stereo packet
+SILENCE = b"\0" * 3840
+
+
+class _VoiceClient:
+    def __init__(self):
+        self.receiver = None
+
+    def listen(self, sink):
+        self.receiver = sink
+
+    def is_listening(self):
+        return self.receiver is not None
+
+    def stop_listening(self):
+        self.receiver = None
+
+
+def _session(received, **kwargs):
+    guild = types.SimpleNamespace(id=1, get_member=lambda _id: None)
+    return VoiceReceiveSession(guild=guild, on_utterance=received.append, min_pcm_bytes=0, **kwargs)
+
+
+def _feed(session, pcm, user_id=7):
+    user = types.SimpleNamespace(id=user_id, bot=False, display_name="Alice")
+    session._on_voice_data(user, types.SimpleNamespace(pcm=pcm))
+
+
+async def test_utterance_is_emitted_after_silence_without_polling():
+    received = []
+    session = _session(received, silence_seconds=0.05, adaptive=False)
+    vc = _VoiceClient()
+    await session.start(vc)
+
+    _feed(session, SILENCE)  # leading silence is not buffered
+    _feed(session, SPEECH)
+    _feed(session, SILENCE)
+    await asyncio.sleep(0.02)
+    assert received == []
+    await asyncio.sleep(0.1)
+
+    assert len(received) == 1
+    assert received[0].pcm == SPEECH + SILENCE
+    assert received[0].pcm16 == pcm48k_stereo_to_pcm16k_mono(SPEECH + SILENCE)
+    assert received[0].captured_at - received[0].last_packet_at >= 0.05
+    await session.stop(vc)
+
+
+async def test_speech_pushes_back_the_endpoint():
+    received = []
+    session = _session(received, silence_seconds=0.08, adaptive=False)
+    vc = _VoiceClient()
+    await session.start(vc)
+
+    for _ in range(4):
+        _feed(session, SPEECH)
+        await asyncio.sleep(0.04)
+    assert received == []
+    await asyncio.sleep(0.12)
+
+    assert len(received) == 1
+    assert received[0].pcm == SPEECH * 4
+    await session.stop(vc)
+
+
+async def test_stop_flushes_pending_audio():
+    received = []
+    session = _session(received, silence_seconds=5.0, adaptive=False)
+    vc = _VoiceClient()
+    await session.start(vc)
+
+    _feed(session, SPEECH)
+    await asyncio.sleep(0)
+    await session.stop(vc)
+
+    assert [u.pcm for u in received] == [SPEECH]
+
+
+def test_adaptive_delay_follows_speaker_pauses():
+    session = _session([], silence_seconds=0.8, min_silence_seconds=0.3, max_silence_seconds=1.5)
+    buf = UserAudioBuffer()
+    assert session.endpoint_delay(buf) == 0.8
+
+    buf.pauses.extend([0.1, 0.12, 0.15, 0.1])
+    assert abs(session.endpoint_delay(buf) - 0.33) < 1e-9
+
+    buf.pauses.extend([2.0] * 10)
+    assert session.endpoint_delay(buf) == 1.5
+
+
+async def test_long_utterance_is_cut_at_the_cap():
+    received = []
+    # 0.05 s cap == 2.5 packets, so the third packet forces a flush.
+    session = _session(received, silence_seconds=5.0, adaptive=False, max_utterance_seconds=0.05)
+    vc = _VoiceClient()
+    await session.start(vc)
+
+    for _ in range(4):
+        _feed(session, SPEECH)
+    await asyncio.sleep(0.01)
+    assert [len(u.pcm) for u in received] == [len(SPEECH) * 3]
+
+    await session.stop(vc)
+    assert [len(u.pcm) for u in received] == [len(SPEECH) * 3, len(SPEECH)]
+
+
+async def test_idle_and_departed_users_are_evicted():
+    received = []
+    session = _session(received, silence_seconds=0.02, adaptive=False, idle_evict_seconds=0.0)
+    vc = _VoiceClient()
+    await session.start(vc)
+
+    _feed(session, SPEECH, user_id=1)
+    await asyncio.sleep(0.06)
+    assert session.buffered_users == 0
+    assert len(received) == 1
+
+    _feed(session, SPEECH, user_id=2)
+    vc.receiver.on_voice_member_disconnect(types.SimpleNamespace(id=2), None)
+    await asyncio.sleep(0.01)
+    assert session.buffered_users == 0
+    assert len(received) == 2
+    await session.stop(vc)
+
+
+class _CountingDecoder:
+    decoded = 0
+
+    def decode(self, packet, *, fec):
+        _CountingDecoder.decoded += 1
+        return SPEECH
+
+
+async def test_lazy_decode_skips_silence_and_decodes_utterances_only():
+    received = []
+    _CountingDecoder.decoded = 0
+    session = _session(
+        received,
+        silence_seconds=0.03,
+        adaptive=False,
+        lazy_decode=True,
+        decode_batch_packets=2,
+        decoder_factory=_CountingDecoder,
+    )
+    vc = _VoiceClient()
+    await session.start(vc)
+    assert vc.receiver.wants_opus()
+    user = types.SimpleNamespace(id=7, bot=False, display_name="Alice")
+    voiced = b"\x78" + b"\x01" * 80
+
+    def _packet(opus):
+        return types.SimpleNamespace(pcm=b"", opus=opus)
+
+    for opus in (rtp.OPUS_SILENCE, b"\x78\x01", rtp.OPUS_SILENCE):  # silence and comfort noise
+        session._on_voice_data(user, _packet(opus))
+    for opus in (voiced, voiced, voiced, rtp.OPUS_SILENCE):
+        session._on_voice_data(user, _packet(opus))
+    await asyncio.sleep(0.1)
+
+    assert _CountingDecoder.decoded == 3
+    assert len(received) == 1
+    assert received[0].pcm == SPEECH * 3 + bytes(len(SPEECH))
+    await session.stop(vc)
+
+
+async def test_voice_activity_needs_sustained_speech_and_fires_once():
+    received = []
+    activity = []
+    session = _session(
+        received, silence_seconds=0.05, adaptive=False, on_voice_activity=activity.append, barge_in_min_speech_ms=60
+    )
+    vc = _VoiceClient()
+    await session.start(vc)
+
+    _feed(session, SPEECH)  # a click
+    _feed(session, SILENCE)
+    await asyncio.sleep(0)
+    assert activity == []
+
+    # A burst lands before the loop gets to run any scheduled callback.
+    for _ in range(6):
+        _feed(session, SPEECH)
+    await asyncio.sleep(0)
+    assert activity == [7]
+
+    await asyncio.sleep(0.1)  # endpoint closes the utterance
+    for _ in range(3):
+        _feed(session, SPEECH)
+    await asyncio.sleep(0)
+    assert activity == [7, 7]
+    await session.stop(vc)
+
+
+async def test_stop_bounds_the_final_hand_off():
+    gate = asyncio.Event()
+
+    async def _stuck(utterance):
+        await gate.wait()
+
+    guild = types.SimpleNamespace(id=1, get_member=lambda _id: None)
+    session = VoiceReceiveSession(guild=guild, on_utterance=_stuck, min_pcm_bytes=0, silence_seconds=0.05)
+    vc = _VoiceClient()
+    await session.start(vc)
+    _feed(session, SPEECH)
+
+    await asyncio.wait_for(session.stop(vc, handoff_timeout=0.05), 1)
@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+import pytest
+
+from audio.tts import VoiceVoxTTS
+from audio.voicevox_pool import VoiceVoxPool
+from benchmarks.fakes import FakeVoiceVoxServer, LatencyProfile
+
+DEAD_URL = "http://127.0.0.1:1"
+
+
+async def test_concurrent_requests_spread_across_backends():
+    latency = LatencyProfile(audio_query=0.0, synthesis=0.1)
+    with FakeVoiceVoxServer(latency) as a, FakeVoiceVoxServer(latency) as b:
+        tts = VoiceVoxTTS([a.url, b.url], 3)
+        await asyncio.gather(*(tts.synthesize_async(f"テスト{i}") for i in range(4)))
+        await tts.aclose()
+
+    assert a.stats["synthesis"].requests == 2
+    assert b.stats["synthesis"].requests == 2
+    assert all(backend.in_flight == 0 and backend.ewma_seconds > 0 for backend in tts.backends)
+
+
+async def test_fails_over_and_marks_dead_backend_unhealthy():
+    with FakeVoiceVoxServer(LatencyProfile(audio_query=0.0, synthesis=0.0)) as server:
+        tts = VoiceVoxTTS([DEAD_URL, server.url], 3)
+        assert (await tts.synthesize_async("こんにちは"))[:4] == b"RIFF"
+        dead, alive = tts.backends
+        assert not dead.healthy and dead.failures == 1
+        # The unhealthy engine is skipped until a probe succeeds.
+        await tts.synthesize_async("こんにちは")
+        assert dead.failures == 1 and alive.requests == 2
+        await tts.aclose()
+
+
+async def test_probe_updates_health_and_version():
+    with FakeVoiceVoxServer(LatencyProfile()) as server:
+        pool = VoiceVoxPool([server.url, DEAD_URL])
+        async with httpx.AsyncClient() as client:
+            await pool.probe_all(client)
+
+    alive, dead = pool.backends
+    assert alive.healthy and alive.version == "0.0.0-bench"
+    assert not dead.healthy
+
+
+async def test_client_errors_do_not_fail_over():
+    pool = VoiceVoxPool(["http://a", "http://b"])
+    calls = []
+
+    async def bad_request(url):
+        calls.append(url)
+        request = httpx.Request("POST", url)
+        raise httpx.HTTPStatusError("422", request=request, response=httpx.Response(422, request=request))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await pool.call(bad_request)
+    assert len(calls) == 1
+    assert all(backend.healthy for backend in pool.backends)
@@ -1,4 +1,20 @@
-from audio.wav import pcm16k_mono_to_wav, pcm48k_stereo_to_pcm16k_mono
+import ctypes
+
+import numpy as np
+import pytest
+
+from audio.wav import (
+    StereoToMonoResampler,
+    concat_wavs,
+    encode_upload,
+    ogg_crc,
+    pcm16k_mono_to_ogg_opus,
+    pcm16k_mono_to_wav,
+    pcm48k_stereo_to_pcm16k_mono,
+    resolve_upload_format,
+    trim_silence,
+)
+from benchmarks.fakes import silent_wav
 
 
 def test_pcm48_stereo_to_pcm16_mono_converts_size():
@@ -16,3 +32,105 @@ def test_pcm16_to_wav_has_header():
     wav = pcm16k_mono_to_wav(pcm)
     assert wav[:4] == b"RIFF"
     assert b"WAVE" in wav[:16]
+
+
+def test_resampler_matches_audioop_and_streams_consistently():
+    audioop = pytest.importorskip("audioop")
+    t = np.arange(48000) / 48000
+    left = 8000 * np.sin(2 * np.pi * 300 * t) + 3000 * np.sin(2 * np.pi * 1200 * t)
+    pcm48 = np.stack([left, left * 0.5], axis=1).astype("<i2").tobytes()
+
+    expected, _ = audioop.ratecv(audioop.tomono(pcm48, 2, 0.5, 0.5), 2, 1, 48000, 16000, None)
+    out = pcm48k_stereo_to_pcm16k_mono(pcm48)
+    assert len(out) == len(expected)
+    # audioop does no anti-alias filtering, so only compare away from the stream edges.
+    diff = np.abs(np.frombuffer(out, "<i2").astype(int) - np.frombuffer(expected, "<i2"))
+    assert diff[32:-32].max() <= 4
+
+    resampler = StereoToMonoResampler()
+    chunked = b"".join(resampler.process(pcm48[i : i + 1234]) for i in range(0, len(pcm48), 1234))
+    assert chunked + resampler.flush() == out
+
+
+def test_trim_silence_drops_edges_and_collapses_long_pauses():
+    pcm = b"\x01\x00" * 32000  # 2 s at 16 kHz
+    # Speech at 0.5-0.8 s and 1.5-1.6 s: 0.7 s pause in between.
+    spans = [(8000, 12800), (24000, 25600)]
+    trimmed, removed = trim_silence(pcm, spans, pad_ms=100, max_pause_ms=200)
+
+    # 0.1 pad + 0.3 speech + 0.2 pause + 0.1 speech + 0.1 pad
+    assert len(trimmed) // 2 == 12800
+    assert abs(removed - 1.2) < 1e-9
+
+
+def test_trim_silence_without_spans_is_a_no_op():
+    pcm = b"\x01\x00" * 160
+    assert trim_silence(pcm, []) == (pcm, 0.0)
+
+
+class _FakeOpusEncoder:
+    def encode(self, pcm, frame_size):
+        assert len(pcm) == frame_size * 2
+        return b"\x08" * 300  # longer than one lacing segment
+
+
+def _ogg_pages(data):
+    pages = []
+    while data:
+        assert data[:4] == b"OggS"
+        segments = data[26]
+        body = 27 + segments + sum(data[27 : 27 + segments])
+        page = bytearray(data[:body])
+        crc = int.from_bytes(page[22:26], "little")
+        page[22:26] = b"\0\0\0\0"
+        assert ogg_crc(bytes(page)) == crc
+        pages.append(data[:body])
+        data = data[body:]
+    return pages
+
+
+def test_ogg_crc_check_value():
+    assert ogg_crc(b"123456789") == 0x89A1897F
+
+
+def test_ogg_opus_container_is_well_formed():
+    pcm = b"\0\0" * 16000 * 3  # 3 s -> 150 packets
+    data = pcm16k_mono_to_ogg_opus(pcm, encoder_factory=_FakeOpusEncoder)
+    pages = _ogg_pages(data)
+
+    assert pages[0][28:36] == b"OpusHead"
+    assert pages[1][28:36] == b"OpusTags"
+    assert pages[0][5] == 0x02 and pages[-1][5] == 0x04
+    assert int.from_bytes(pages[-1][6:14], "little") == 312 + 48000 * 3
+    assert len(data) < len(pcm16k_mono_to_wav(pcm))
+
+
+class _CastingOpusEncoder:
+    def encode(self, pcm, frame_size):
+        # Same pointer conversion as discord.opus.Encoder.encode.
+        ctypes.cast(pcm, ctypes.POINTER(ctypes.c_int16))
+        return b"\x08"
+
+
+def test_ogg_opus_accepts_memoryview_input():
+    pcm = memoryview(bytearray(b"\1\0" * 1000))
+    data = pcm16k_mono_to_ogg_opus(pcm, encoder_factory=_CastingOpusEncoder)
+    assert data[:4] == b"OggS"
+
+
+def test_encode_upload_falls_back_to_wav():
+    assert resolve_upload_format("wav") == "wav"
+    assert resolve_upload_format("auto") in ("ogg", "flac", "wav")
+    payload, name = encode_upload(b"\0\0" * 160, "wav")
+    assert name == "audio.wav" and payload[:4] == b"RIFF"
+
+
+def test_concat_wavs_inserts_gaps_and_rejects_mixed_formats():
+    a = pcm16k_mono_to_wav(b"\1\0" * 100)
+    b = pcm16k_mono_to_wav(b"\2\0" * 50)
+    joined = concat_wavs([a, b], gap_seconds=0.01)
+    assert joined[44:] == b"\1\0" * 100 + b"\0\0" * 160 + b"\2\0" * 50
+    assert concat_wavs([a], lead_seconds=0.01)[44:] == b"\0\0" * 160 + b"\1\0" * 100
+    with pytest.raises(ValueError):
+        concat_wavs([a, silent_wav(0.01, sample_rate=48000, channels=2)])
+
@@ -0,0 +1,18 @@
+import types
+from unittest.mock import AsyncMock
+
+from audio.whisper import WhisperTranscriber
+
+
+async def test_pcm_upload_uses_configured_format_and_falls_back_to_wav(monkeypatch):
+    transcriber = WhisperTranscriber("key", upload_format="wav")
+    create = AsyncMock(return_value=types.SimpleNamespace(text=" こんにちは "))
+    monkeypatch.setattr(transcriber._async_client.audio.transcriptions, "create", create)
+
+    transcriber.upload_format = "flac"
+    monkeypatch.setattr("audio.whisper.encode_upload", lambda pcm, fmt: (_ for _ in ()).throw(RuntimeError("no flac")))
+    assert await transcriber.transcribe_pcm16_ja_async(b"\0\0" * 1600) == "こんにちは"
+
+    upload = create.await_args.kwargs["file"]
+    assert upload.name == "audio.wav"
+    assert upload.getvalue()[:4] == b"RIFF"